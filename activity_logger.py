@@ -0,0 +1,94 @@
+# activity_logger.py
+
+import asyncio
+from collections import deque
+from datetime import datetime
+
+
+class ActivityLogQueue:
+    """
+    In-process queue for activity log entries.
+    Handlers submit entries without waiting on any I/O; a background task writes them
+    out in batches once `batch_size` entries are waiting or `window` seconds have passed,
+    whichever comes first. At most `max_pending` entries are held in memory; beyond that
+    the oldest are dropped (and counted) rather than letting memory grow without bound.
+    """
+
+    def __init__(self, write_batch, batch_size: int = 50, window: float = 5.0, max_pending: int = 5000):
+        self.write_batch = write_batch  # Blocking callable that persists a list of entries
+        self.batch_size = batch_size
+        self.window = window
+        self.max_pending = max_pending
+        self.dropped = 0
+
+        self._pending = deque()
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task = None
+
+    def __len__(self):
+        return len(self._pending)
+
+    def submit(self, letter_type: str, recipient_name: str, recipient_email: str, sent_by: str, status: str):
+        """Queues one entry. Must be called from the event loop thread; never blocks."""
+        if len(self._pending) >= self.max_pending:
+            self._pending.popleft()
+            self.dropped += 1
+            print(f"Activity log queue is full, dropped the oldest entry ({self.dropped} dropped so far).")
+        self._pending.append({
+            'timestamp': datetime.now().isoformat(),
+            'letter_type': letter_type,
+            'recipient_name': recipient_name,
+            'recipient_email': recipient_email,
+            'sent_by': sent_by,
+            'status': status
+        })
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    def _take_batch(self) -> list:
+        return [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+
+    def flush(self) -> int:
+        """Writes everything still queued, blocking until done. Used on shutdown."""
+        written = 0
+        while self._pending:
+            batch = self._take_batch()
+            self.write_batch(batch)
+            written += len(batch)
+        return written
+
+    def start(self):
+        """Starts the background flusher on the running event loop."""
+        if self._task is None or self._task.done():
+            self._stopping = False
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """
+        Stops the background flusher and writes whatever is left. The flusher is asked to stop
+        rather than cancelled, so a batch it is writing is finished once instead of being cut off.
+        """
+        if self._task is not None:
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await asyncio.to_thread(self.flush)
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.window)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            while self._pending:
+                batch = self._take_batch()
+                try:
+                    await asyncio.to_thread(self.write_batch, batch)
+                except Exception as e:
+                    print(f"Failed to write {len(batch)} activity log entries: {e}")
+                    # Put the batch back so it is retried on the next window.
+                    self._pending.extendleft(reversed(batch))
+                    break
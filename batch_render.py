@@ -0,0 +1,300 @@
+# batch_render.py
+"""
+Renders letters in bulk from a CSV or JSONL file of recipients, without the Telegram bot.
+
+Each row needs a letter type (ca / intern / offer, or the full names used by the bot) and
+the fields that letter needs: name for every letter, month and domain for internships,
+training_date (DD-MM-YYYY) for offer letters. email is carried through but not used here.
+
+    python batch_render.py recipients.csv -o letters/
+    python batch_render.py recipients.jsonl -o letters.zip --workers 8
+
+Finished rows are recorded in a manifest next to the output, so re-running the same
+command after an interruption only renders what is missing. Letters for a zip are staged
+in a "<output>.parts" folder and packed into the zip when the run ends.
+"""
+
+import argparse
+import csv
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import pdf_generator
+from template_registry import get_registry
+
+# Accepted spellings of each letter type -> letter kind
+LETTER_KINDS = {
+    "ca": "ca", "campus ambassador": "ca", "campus ambassador letter": "ca",
+    "intern": "intern", "internship": "intern", "internship acceptance": "intern",
+    "internship acceptance letter": "intern",
+    "offer": "offer", "offer letter": "offer",
+}
+# Letter kind -> the letter_type name used in emails and the activity log
+LETTER_TYPE_NAMES = {"ca": "Campus Ambassador", "intern": "Internship Acceptance", "offer": "Offer Letter"}
+# Letter kind -> fields that must be present
+REQUIRED_FIELDS = {"ca": ("name",), "intern": ("name", "month", "domain"), "offer": ("name", "training_date")}
+# Letter kind -> prefix used for output file names
+FILE_PREFIXES = {"ca": "CA_Letter", "intern": "Internship_Letter", "offer": "Offer_Letter"}
+
+
+# --- LOADING AND VALIDATING RECIPIENTS ---
+def parse_records(text: str, file_format: str) -> list:
+    """Parses CSV or JSONL text into a list of dicts with lower-cased, stripped keys."""
+    if file_format == "jsonl":
+        rows = [json.loads(line) for line in text.splitlines() if line.strip()]
+    elif file_format == "csv":
+        rows = list(csv.DictReader(io.StringIO(text)))
+    else:
+        raise ValueError(f"Unsupported recipients format: '{file_format}'")
+    return [{str(k).strip().lower(): (v.strip() if isinstance(v, str) else v) for k, v in row.items() if k}
+            for row in rows]
+
+
+def load_records(path: str) -> list:
+    file_format = "jsonl" if path.lower().endswith((".jsonl", ".json")) else "csv"
+    with open(path, "r", encoding="utf-8-sig") as f:
+        return parse_records(f.read(), file_format)
+
+
+def normalize_record(row: dict) -> dict:
+    """
+    Checks one recipient row and returns it as {kind, name, email, month, domain, training_date}.
+    Raises ValueError describing what is wrong.
+    """
+    kind = LETTER_KINDS.get(' '.join(str(row.get("letter_type") or "").lower().split()))
+    if not kind:
+        raise ValueError(f"unknown letter type '{row.get('letter_type')}'")
+    record = {"kind": kind}
+    for field in ("name", "email", "month", "domain", "training_date"):
+        record[field] = str(row.get(field) or "").strip()
+    missing = [field for field in REQUIRED_FIELDS[kind] if not record[field]]
+    if missing:
+        raise ValueError(f"missing {', '.join(missing)}")
+    if kind == "intern":
+        get_registry().internship_template_for(record["domain"])  # Raises for unknown domains
+        try:
+            datetime.strptime(record["month"], "%B")
+        except ValueError:
+            raise ValueError(f"invalid month '{record['month']}'")
+    if kind == "offer":
+        try:
+            datetime.strptime(record["training_date"], "%d-%m-%Y")
+        except ValueError:
+            raise ValueError(f"invalid training date '{record['training_date']}' (use DD-MM-YYYY)")
+    return record
+
+
+def record_key(index: int, record: dict) -> str:
+    """Identifies a row across runs: its position plus a hash of its content."""
+    digest = hashlib.sha1(json.dumps(record, sort_keys=True).encode()).hexdigest()[:12]
+    return f"{index}:{digest}"
+
+
+def output_file_name(index: int, record: dict) -> str:
+    safe_name = "".join(c if c.isalnum() or c in "-_" else "_" for c in record["name"].replace(" ", "_"))
+    return f"{index + 1:05d}_{FILE_PREFIXES[record['kind']]}_{safe_name}.pdf"
+
+
+# --- RENDERING ---
+def render_record(record: dict) -> bytes:
+    """Renders one letter (PDF only, no preview)."""
+    if record["kind"] == "ca":
+        return pdf_generator.generate_campus_ambassador_pdf(record["name"])
+    if record["kind"] == "intern":
+        return pdf_generator.generate_internship_acceptance_pdf(record["name"], record["month"], record["domain"])
+    return pdf_generator.generate_offer_letter_pdf(record["name"], record["training_date"])
+
+
+def _init_worker():
+    get_registry()
+
+
+def _render_job(index: int, record: dict):
+    try:
+        return index, render_record(record), None
+    except Exception as e:
+        return index, None, str(e)
+
+
+class _OutputWriter:
+    """
+    Writes PDFs into a directory, or into a zip when the output path ends in .zip, and records
+    each finished file in a manifest.
+
+    A zip is only readable once its central directory is written on close, so letters for a
+    zip are first written to a staging folder next to it and packed into the zip by close().
+    That way every letter in the manifest is on disk as soon as its line is written, and an
+    interrupted run can be resumed from the staging folder.
+    """
+
+    def __init__(self, output: str):
+        self.is_zip = output.lower().endswith(".zip")
+        self.output = output
+        self.folder = f"{output}.parts" if self.is_zip else output
+        os.makedirs(self.folder, exist_ok=True)
+        self._manifest = None
+
+    @property
+    def manifest_path(self) -> str:
+        return f"{self.output}.manifest.jsonl" if self.is_zip else os.path.join(self.output, "_manifest.jsonl")
+
+    def resume(self) -> set:
+        """
+        Returns the keys of the rows whose letters are actually stored, and rewrites the
+        manifest to list only those, so anything lost in an interruption is rendered again.
+        """
+        stored = set(os.listdir(self.folder))
+        if self.is_zip and os.path.exists(self.output):
+            try:
+                with zipfile.ZipFile(self.output) as archive:
+                    stored.update(archive.namelist())
+            except zipfile.BadZipFile:
+                print(f"{self.output} is not a readable zip (interrupted while packing?); "
+                      f"its letters will be rendered again.")
+                os.remove(self.output)
+        entries = [entry for entry in _load_manifest(self.manifest_path) if entry.get("file") in stored]
+        temp_path = f"{self.manifest_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(entry) + "\n" for entry in entries)
+        os.replace(temp_path, self.manifest_path)
+        self._manifest = open(self.manifest_path, "a", encoding="utf-8")
+        return {entry["key"] for entry in entries}
+
+    def write(self, key: str, file_name: str, data: bytes):
+        # Written under a temporary name first, so a file under its real name is always complete.
+        path = os.path.join(self.folder, file_name)
+        with open(f"{path}.tmp", "wb") as f:
+            f.write(data)
+        os.replace(f"{path}.tmp", path)
+        self._manifest.write(json.dumps({"key": key, "file": file_name}) + "\n")
+        self._manifest.flush()
+
+    def close(self):
+        if self._manifest is not None:
+            self._manifest.close()
+            self._manifest = None
+        if self.is_zip:
+            self._pack()
+
+    def _pack(self):
+        """Moves the staged letters into the zip (alongside any it already holds), then removes the staging folder."""
+        staged = sorted(name for name in os.listdir(self.folder) if name.endswith(".pdf"))
+        if not staged and os.path.exists(self.output):
+            shutil.rmtree(self.folder, ignore_errors=True)
+            return
+        temp_path = f"{self.output}.tmp"
+        # PDFs are already deflated, so the zip stores them as-is.
+        with zipfile.ZipFile(temp_path, "w", compression=zipfile.ZIP_STORED) as packed:
+            if os.path.exists(self.output):
+                with zipfile.ZipFile(self.output) as previous:
+                    for info in previous.infolist():
+                        if info.filename not in staged:
+                            packed.writestr(info, previous.read(info))
+            for name in staged:
+                packed.write(os.path.join(self.folder, name), name)
+        os.replace(temp_path, self.output)
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+
+def _load_manifest(path: str) -> list:
+    entries = []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    pass  # Blank, or cut short by an interruption
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+def run_batch(records: list, output: str, workers: int = None, max_in_flight: int = None) -> dict:
+    """
+    Renders every valid record into `output` using a pool of worker processes.
+    Rows already listed in the manifest are skipped. Returns the run statistics.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or workers * 4
+    stats = {"total": len(records), "rendered": 0, "skipped": 0, "invalid": 0, "failed": 0, "bytes": 0}
+
+    writer = _OutputWriter(output)
+    done = writer.resume()
+    jobs = []
+    for index, row in enumerate(records):
+        try:
+            record = normalize_record(row)
+        except ValueError as e:
+            print(f"Row {index + 1}: skipped, {e}")
+            stats["invalid"] += 1
+            continue
+        if record_key(index, record) in done:
+            stats["skipped"] += 1
+            continue
+        jobs.append((index, record))
+
+    started = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                    mp_context=multiprocessing.get_context("spawn")) as executor:
+            pending = {}
+            queue = iter(jobs)
+            while True:
+                # Keep a bounded number of jobs in flight so memory stays flat on huge inputs.
+                for index, record in queue:
+                    pending[executor.submit(_render_job, index, record)] = record
+                    if len(pending) >= max_in_flight:
+                        break
+                if not pending:
+                    break
+                future = next(as_completed(pending))
+                record = pending.pop(future)
+                index, pdf_bytes, error = future.result()
+                if error:
+                    print(f"Row {index + 1}: failed, {error}")
+                    stats["failed"] += 1
+                    continue
+                writer.write(record_key(index, record), output_file_name(index, record), pdf_bytes)
+                stats["rendered"] += 1
+                stats["bytes"] += len(pdf_bytes)
+    finally:
+        writer.close()
+    stats["seconds"] = time.perf_counter() - started
+    return stats
+
+
+def print_stats(stats: dict):
+    seconds = stats["seconds"]
+    rate = stats["rendered"] / seconds if seconds else 0.0
+    print("------------------------------------------------------")
+    print(f"Rendered: {stats['rendered']}  Skipped (already done): {stats['skipped']}  "
+          f"Invalid: {stats['invalid']}  Failed: {stats['failed']}  (of {stats['total']} rows)")
+    print(f"Time: {seconds:.2f}s  Throughput: {rate:.1f} letters/s  Output: {stats['bytes'] / 1e6:.1f} MB")
+    print("------------------------------------------------------")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Render letters in bulk from a CSV or JSONL file of recipients.")
+    parser.add_argument("recipients", help="CSV or JSONL file of recipients")
+    parser.add_argument("-o", "--output", required=True, help="Output directory, or a .zip file")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Worker processes (default: one per core)")
+    args = parser.parse_args(argv)
+
+    records = load_records(args.recipients)
+    stats = run_batch(records, args.output, workers=args.workers)
+    print_stats(stats)
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,297 @@
+# benchmarks.py
+"""
+Offline microbenchmarks for the letter pipeline.
+
+    python benchmarks.py                                  # run everything, print a table
+    python benchmarks.py --save results.json              # also save the results
+    python benchmarks.py --baseline baseline.json         # compare and flag regressions
+    python benchmarks.py --filter status_cache --quick
+
+Covers each generator in pdf_generator, the preview paths, building the letter email and
+sending it through the SMTP connection pool to a local sink, and the database_handler
+status read/write paths with 10, 1k and 100k users. Nothing leaves the machine: the SMTP
+server is smtp_sink, and the status benchmarks use a throwaway cache file and database.
+
+Before timing anything, every generator's composite preview is checked pixel for pixel against
+a full render of its PDF, with ASCII and accented names; a mismatch fails the run.
+
+Each benchmark reports the median and best time per operation over several repeats.
+With --baseline, a benchmark whose median is more than --threshold (default 20%) slower
+than the baseline is flagged as a regression and the exit code is 1.
+"""
+
+import argparse
+import atexit
+import contextlib
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# The status benchmarks must never touch the bot's real cache file or database,
+# and database_handler opens both on import, so move into a scratch folder first.
+_ORIGINAL_CWD = os.getcwd()
+_WORKDIR = tempfile.mkdtemp(prefix="letter-bench-")
+atexit.register(shutil.rmtree, _WORKDIR, ignore_errors=True)
+os.environ["DATABASE_FILE"] = os.path.join(_WORKDIR, "bench.db")
+os.chdir(_WORKDIR)
+
+import fitz  # PyMuPDF  # noqa: E402
+
+import database_handler  # noqa: E402
+import email_sender  # noqa: E402
+import pdf_generator  # noqa: E402
+from local_store import LocalStore  # noqa: E402
+from preview_engine import get_preview_engine  # noqa: E402
+from smtp_pool import SMTPConnectionPool  # noqa: E402
+from smtp_sink import SMTPSink  # noqa: E402
+from status_cache import StatusCache  # noqa: E402
+from template_registry import get_registry  # noqa: E402
+
+STATUS_CACHE_SIZES = (10, 1_000, 100_000)
+DEFAULT_THRESHOLD = 0.20
+
+RECIPIENT = {"name": "Asha Rao", "email": "asha@example.com", "domain": "Data Science",
+             "letter_type": "Internship Acceptance"}
+
+
+def measure(func, number: int, repeats: int) -> dict:
+    """Runs func() `number` times per repeat and returns per-operation timings in seconds."""
+    func()  # Warm-up: first-use caches, imports, connections
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - started) / number)
+    return {"median": statistics.median(samples), "min": min(samples), "number": number, "repeats": repeats}
+
+
+@contextlib.contextmanager
+def _quiet():
+    """Hides the handlers' per-call prints, which would otherwise dominate the timings."""
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+# --- BENCHMARKS ---
+# Each returns {name: (callable, operations per repeat)} and does its setup up front.
+
+def generator_benchmarks() -> dict:
+    return {
+        "generate_campus_ambassador_pdf": (lambda: pdf_generator.generate_campus_ambassador_pdf("Asha Rao"), 20),
+        "generate_campus_ambassador_pdf_with_preview":
+            (lambda: pdf_generator.generate_campus_ambassador_pdf_with_preview("Asha Rao"), 10),
+        "generate_internship_acceptance_pdf":
+            (lambda: pdf_generator.generate_internship_acceptance_pdf("Asha Rao", "July", "Data Science"), 20),
+        "generate_internship_acceptance_pdf_with_preview":
+            (lambda: pdf_generator.generate_internship_acceptance_pdf_with_preview("Asha Rao", "July", "Data Science"), 10),
+        "generate_offer_letter_pdf": (lambda: pdf_generator.generate_offer_letter_pdf("Asha Rao", "01-08-2026"), 20),
+        "generate_offer_letter_pdf_with_preview":
+            (lambda: pdf_generator.generate_offer_letter_pdf_with_preview("Asha Rao", "01-08-2026"), 10),
+    }
+
+
+def preview_benchmarks() -> dict:
+    pdf_bytes = pdf_generator.generate_offer_letter_pdf("Asha Rao", "01-08-2026")
+    fields = [((91, 293), "Asha Rao", 10)]
+    template_doc = get_registry().open("offer_letter")
+    pdf_generator._insert_fields(template_doc[0], fields)
+    engine = get_preview_engine()
+    pix = template_doc[0].get_pixmap(dpi=engine.dpi, alpha=False)
+    bands = engine.png_bands("offer_letter")
+    dirty_bands = range(10, 13)  # About what one text field touches
+    return {
+        "_create_preview_from_pdf": (lambda: pdf_generator._create_preview_from_pdf(pdf_bytes), 5),
+        "_create_preview (composite)":
+            (lambda: pdf_generator._create_preview("offer_letter", template_doc[0], fields, pdf_bytes), 10),
+        "png encode, whole page (Pixmap.tobytes)": (lambda: pix.tobytes("png"), 5),
+        "png encode, 3 changed bands (PngBands)": (lambda: bands.encode(pix, dirty_bands), 20),
+    }
+
+
+def email_benchmarks() -> dict:
+    pdf_bytes = pdf_generator.generate_internship_acceptance_pdf("Asha Rao", "July", "Data Science")
+    sink = SMTPSink().start()
+    host, port = sink.address
+    email_sender.use_pool("bench", SMTPConnectionPool(host, port, "bench@example.com", "secret", use_starttls=False))
+    sender_email = "bench@example.com"
+    return {
+        "render_message": (lambda: email_sender.render_message(pdf_bytes, RECIPIENT, sender_email), 200),
+        "get_email_templates": (lambda: email_sender.get_email_templates("Internship Acceptance", "Asha Rao",
+                                                                         "Data Science"), 2000),
+        "send_personalized_email (local sink)":
+            (lambda: email_sender.send_personalized_email(pdf_bytes, RECIPIENT, "bench"), 50),
+    }
+
+
+def status_cache_benchmarks() -> dict:
+    benchmarks = {}
+    for size in STATUS_CACHE_SIZES:
+        tag = f"{size:,}".replace(",", "_")
+        cache = StatusCache(os.path.join(_WORKDIR, f"cache_{tag}.json"), max_size=size, flush_interval=3600)
+        store = LocalStore(os.path.join(_WORKDIR, f"store_{tag}.db"))
+        user_data = {"status": "active", "expiry_date": "2030-01-01"}
+        for user_id in range(size):
+            cache.set(user_id, dict(user_data))
+        with store._lock, store._conn:
+            store._conn.executemany(
+                "INSERT OR REPLACE INTO users (user_id, subscription_status, subscription_expiry_date) VALUES (?, ?, ?)",
+                [(user_id, "active", "2030-01-01") for user_id in range(size)])
+        ids = [random.randrange(size) for _ in range(1000)]
+        next_id = iter(ids * 1000).__next__
+
+        def use(cache=cache, store=store):
+            database_handler._status_cache = cache
+            database_handler._store = store
+
+        def read_hit(use=use, next_id=next_id):
+            use()
+            database_handler._get_local_status(next_id())
+
+        def read_from_database(use=use, cache=cache, next_id=next_id):
+            use()
+            user_id = next_id()
+            cache.invalidate(user_id)
+            database_handler._get_local_status(user_id)
+
+        def write(use=use, next_id=next_id):
+            use()
+            database_handler._handle_status_response(next_id(), {"status": "success", "data": dict(user_data)})
+
+        benchmarks[f"status read, memory hit ({size:,} users)"] = (read_hit, 2000)
+        benchmarks[f"status read, database hit ({size:,} users)"] = (read_from_database, 500)
+        benchmarks[f"status write ({size:,} users)"] = (write, 500)
+        benchmarks[f"status cache flush ({size:,} users)"] = (lambda cache=cache: (cache.set(0, user_data), cache.flush()), 3)
+    return benchmarks
+
+
+# The composite preview has to match a full render for these, accents and all
+PREVIEW_CHECK_NAMES = ["Asha Rao", "Ångström Example Name", "Zoë Łukasz-Dvořák"]
+
+
+def check_previews() -> list:
+    """Returns (letter, name) for every composite preview that differs from a full render of its PDF."""
+    mismatches = []
+    for name in PREVIEW_CHECK_NAMES:
+        letters = {
+            "campus ambassador": (pdf_generator.generate_campus_ambassador_pdf_with_preview, (name,)),
+            "internship acceptance": (pdf_generator.generate_internship_acceptance_pdf_with_preview,
+                                      (name, "July", "Data Science")),
+            "offer letter": (pdf_generator.generate_offer_letter_pdf_with_preview, (name, "01-08-2026")),
+        }
+        for letter, (generate, args) in letters.items():
+            pdf_bytes, preview = generate(*args)
+            full = pdf_generator._create_preview_from_pdf(pdf_bytes)
+            if fitz.Pixmap(preview).samples != fitz.Pixmap(full).samples:
+                mismatches.append((letter, name))
+    return mismatches
+
+
+SUITES = {
+    "generators": generator_benchmarks,
+    "previews": preview_benchmarks,
+    "email": email_benchmarks,
+    "status_cache": status_cache_benchmarks,
+}
+
+
+def run(filter_text: str = "", quick: bool = False) -> dict:
+    results = {}
+    repeats = 3 if quick else 7
+    for suite_name, make_benchmarks in SUITES.items():
+        with _quiet():
+            benchmarks = make_benchmarks()
+        for name, (func, number) in benchmarks.items():
+            full_name = f"{suite_name}: {name}"
+            if filter_text and filter_text not in full_name:
+                continue
+            if quick:
+                number = max(1, number // 5)
+            with _quiet():
+                results[full_name] = measure(func, number, repeats)
+            print(f"{full_name:<70} {_format_time(results[full_name]['median']):>12}")
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Returns (name, baseline_median, current_median, change) for every benchmark slower than allowed."""
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        change = result["median"] / previous["median"] - 1
+        if change > threshold:
+            regressions.append((name, previous["median"], result["median"], change))
+    return regressions
+
+
+def _format_time(seconds: float) -> str:
+    if seconds >= 1:
+        return f"{seconds:.2f} s"
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.2f} ms"
+    return f"{seconds * 1e6:.1f} us"
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Offline microbenchmarks for the letter pipeline.")
+    parser.add_argument("--save", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON results from an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed slowdown before a benchmark counts as a regression (default 0.2 = 20%%)")
+    parser.add_argument("--filter", default="", help="Only run benchmarks whose name contains this text")
+    parser.add_argument("--quick", action="store_true", help="Fewer iterations, for a fast sanity check")
+    args = parser.parse_args(argv)
+
+    # Paths on the command line are relative to where the command was run, not the scratch folder.
+    save_path = os.path.join(_ORIGINAL_CWD, args.save) if args.save else None
+    baseline_path = os.path.join(_ORIGINAL_CWD, args.baseline) if args.baseline else None
+
+    with _quiet():
+        mismatches = check_previews()
+    for letter, name in mismatches:
+        print(f"Composite preview differs from a full render: {letter} for {name!r}")
+    if mismatches:
+        return 1
+
+    results = run(args.filter, args.quick)
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "pymupdf": fitz.VersionBind,
+            "quick": args.quick,
+        },
+        "results": results,
+    }
+    if save_path:
+        with open(save_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved {len(results)} results to {save_path}")
+
+    if not baseline_path:
+        return 0
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+    regressions = compare(results, baseline, args.threshold)
+    print("------------------------------------------------------")
+    if not regressions:
+        print(f"No regressions against {baseline_path} (threshold {args.threshold:.0%}).")
+        return 0
+    print(f"{len(regressions)} regression(s) against {baseline_path} (threshold {args.threshold:.0%}):")
+    for name, before, after, change in regressions:
+        print(f"  {name}: {_format_time(before)} -> {_format_time(after)} (+{change:.0%})")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
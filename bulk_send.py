@@ -0,0 +1,134 @@
+# bulk_send.py
+
+import asyncio
+import re
+import time
+
+from batch_render import LETTER_TYPE_NAMES, normalize_record
+
+# Good enough to catch typos and empty cells; the mail server has the final say.
+EMAIL_PATTERN = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+# Letter kind -> (domain shown in the email, sender account), as in the single-letter flows
+LETTER_SENDERS = {"ca": ("Community", "default"), "intern": (None, "default"), "offer": ("General", "hr")}
+
+
+def validate_rows(rows: list) -> tuple[list, list]:
+    """
+    Checks every uploaded row before anything is rendered.
+    Returns (records, errors); errors are "Row N: problem" strings, numbered as in the file.
+    """
+    records, errors = [], []
+    for index, row in enumerate(rows):
+        try:
+            record = normalize_record(row)
+            if not EMAIL_PATTERN.match(record["email"]):
+                raise ValueError(f"invalid email '{record['email']}'")
+        except ValueError as e:
+            errors.append(f"Row {index + 2}: {e}")  # +2: header line, 1-based numbering
+            continue
+        records.append(record)
+    return records, errors
+
+
+def render_kwargs(record: dict) -> dict:
+    """Arguments for RenderService.render() for one validated record."""
+    if record["kind"] == "intern":
+        return {"name": record["name"], "month": record["month"], "domain": record["domain"]}
+    if record["kind"] == "offer":
+        return {"name": record["name"], "training_from": record["training_date"]}
+    return {"name": record["name"]}
+
+
+class BulkSend:
+    """
+    Renders and emails a batch of validated records as a pipeline.
+    Letters are rendered in the render service's worker processes, as background jobs that
+    wait for room rather than fail when the service is busy, and handed to the email
+    delivery service as soon as each one is ready, so rendering and sending overlap. At most
+    `max_in_flight` letters are rendered but not yet delivered, which keeps memory flat for
+    large batches. `on_progress(batch)` is awaited as letters finish, at most once every
+    `progress_interval` seconds, and once more at the end.
+    """
+
+    def __init__(self, records: list, renderer, delivery, on_progress=None, max_in_flight: int = 8,
+                 progress_interval: float = 3.0):
+        self.records = records
+        self.renderer = renderer
+        self.delivery = delivery
+        self.on_progress = on_progress
+        self.max_in_flight = max_in_flight
+        self.progress_interval = progress_interval
+
+        self.sent = 0
+        self.failed = []  # (record, error) pairs
+        self.started_at = None
+        self.finished_at = None
+
+        self._slots = None
+        self._finished = None
+        self._tasks = set()  # Keeps the per-record tasks alive until they finish
+        self._last_progress = 0.0
+
+    @property
+    def total(self) -> int:
+        return len(self.records)
+
+    @property
+    def done(self) -> int:
+        return self.sent + len(self.failed)
+
+    async def run(self):
+        """Sends the whole batch and returns once every letter is sent or has failed."""
+        self.started_at = time.monotonic()
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        self._finished = asyncio.Event()
+        if not self.records:
+            self._finished.set()
+        for record in self.records:
+            await self._slots.acquire()
+            task = asyncio.get_running_loop().create_task(self._process(record))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        await self._finished.wait()
+        self.finished_at = time.monotonic()
+        await self._report(force=True)
+
+    async def _process(self, record: dict):
+        try:
+            pdf_bytes, _ = await self.renderer.render(record["kind"], preview=False, background=True,
+                                                     **render_kwargs(record))
+            domain, sender_account = LETTER_SENDERS[record["kind"]]
+            recipient_data = {"name": record["name"], "email": record["email"],
+                              "domain": domain or record["domain"], "letter_type": LETTER_TYPE_NAMES[record["kind"]]}
+
+            async def on_delivery_done(job):
+                await self._finish(record, None if job.status == "sent" else job.error)
+
+            await self.delivery.submit(pdf_bytes, recipient_data, sender_account=sender_account,
+                                       on_done=on_delivery_done)
+        except Exception as e:
+            await self._finish(record, e)
+
+    async def _finish(self, record: dict, error):
+        if error is None:
+            self.sent += 1
+        else:
+            self.failed.append((record, error))
+        self._slots.release()
+        if self.done >= self.total:
+            self._finished.set()
+        else:
+            await self._report()
+
+    async def _report(self, force: bool = False):
+        if self.on_progress is None:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_progress < self.progress_interval:
+            return
+        self._last_progress = now
+        try:
+            await self.on_progress(self)
+        except Exception as e:
+            print(f"Bulk send progress update failed: {e}")
@@ -0,0 +1,124 @@
+# client_directory.py
+
+import asyncio
+import time
+
+from name_index import TrigramIndex, normalize_name
+
+# sync_state key holding the change cursor returned by the client's sheet
+CURSOR_KEY = 'client_students_cursor'
+
+
+class ClientDirectory:
+    """
+    Local mirror of the client's onboarding sheet.
+    Students are kept in the client_students table and in an in-memory dict keyed by
+    normalized name, so lookups are a single dict access, plus a trigram index for
+    suggesting close matches when a name is mistyped. A background task pulls only
+    the rows changed since the last sync; a name we don't know triggers a forced refresh.
+
+    `fetch_changes(since)` returns (students, cursor), or None on failure; `since` is None
+    for a full import. `fetch_one(name)` returns a single student or None. Both are async.
+    """
+
+    def __init__(self, store, fetch_changes, fetch_one, refresh_interval: float = 300,
+                 forced_refresh_interval: float = 30):
+        self.store = store
+        self.fetch_changes = fetch_changes
+        self.fetch_one = fetch_one
+        self.refresh_interval = refresh_interval
+        self.forced_refresh_interval = forced_refresh_interval
+
+        self._students = {}
+        self._index = TrigramIndex()
+        self._loaded = False
+        self._last_forced_refresh = 0.0
+        self._sync_lock = asyncio.Lock()
+        self._task = None
+
+    def __len__(self):
+        return len(self._students)
+
+    def _add(self, students: list):
+        for student in students:
+            record = {key: student.get(key) for key in ('name', 'email', 'month', 'domain')}
+            self._students[normalize_name(record['name'])] = record
+            self._index.add(record['name'])
+
+    def load(self):
+        """Loads the mirrored students from the local database into memory."""
+        self._add(self.store.load_students())
+        self._loaded = True
+
+    def lookup(self, name: str):
+        """Returns the student with this name from the local mirror, or None. Never touches the network."""
+        if not self._loaded:
+            self.load()
+        student = self._students.get(normalize_name(name))
+        return dict(student) if student else None
+
+    def suggest(self, name: str, k: int = 5) -> list:
+        """Returns up to `k` mirrored student names that approximately match `name`, best first."""
+        if not self._loaded:
+            self.load()
+        return [match for match, _ in self._index.search(name, k)]
+
+    async def sync(self, full: bool = False) -> int:
+        """Pulls changed rows (or everything, when `full` or on first run). Returns the number of rows applied."""
+        async with self._sync_lock:
+            since = None if full else self.store.get_state(CURSOR_KEY)
+            result = await self.fetch_changes(since)
+            if result is None:
+                return 0
+            students, cursor = result
+            if students:
+                await asyncio.to_thread(self.store.save_students, students)
+                self._add(students)
+            if cursor:
+                self.store.set_state(CURSOR_KEY, cursor)
+            if students:
+                print(f"Client directory synced {len(students)} student(s) ({'full' if since is None else 'incremental'}).")
+            return len(students)
+
+    async def find(self, name: str):
+        """
+        Looks a student up locally. If the name is missing, forces an incremental sync
+        (at most once per `forced_refresh_interval`) and finally asks the sheet directly.
+        """
+        student = self.lookup(name)
+        if student:
+            return student
+
+        if time.monotonic() - self._last_forced_refresh >= self.forced_refresh_interval:
+            self._last_forced_refresh = time.monotonic()
+            await self.sync()
+            student = self.lookup(name)
+            if student:
+                return student
+
+        student = await self.fetch_one(name)
+        if student:
+            await asyncio.to_thread(self.store.save_students, [student])
+            self._add([student])
+            return self.lookup(student['name'])
+        return None
+
+    def start(self):
+        """Starts the periodic sync on the running event loop."""
+        if not self._loaded:
+            self.load()
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.sync()
+            except Exception as e:
+                print(f"Client directory sync failed: {e}")
+            await asyncio.sleep(self.refresh_interval)
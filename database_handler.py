@@ -2,31 +2,87 @@
 
 import os
 import json
+import time
+import asyncio
+import httpx
 import requests
-from datetime import datetime
 from dotenv import load_dotenv
 
+import local_store
+from activity_logger import ActivityLogQueue
+from client_directory import ClientDirectory
+from expiry_scheduler import ExpiryScheduler
+from http_client import DEFAULT_HEADERS, get_client
+from local_store import LocalStore, SheetSync
+from single_flight import SingleFlight
+from status_cache import NegativeCache, create_status_cache
+from metrics import (SHEET_REQUEST_SECONDS, SHEET_REQUEST_ERRORS, STATUS_LOOKUPS_TOTAL, STATUS_REVALIDATIONS_TOTAL,
+                     SUBSCRIPTIONS_EXPIRED_TOTAL)
+
 load_dotenv()
 
 # Your Google Apps Script Web App URL
 SCRIPT_URL = os.getenv('GOOGLE_SCRIPT_URL')
-# The local JSON file for caching user statuses
+# The local JSON file the in-memory status cache is snapshotted to
 CACHE_FILE = 'user_status_cache.json'
-
-
-def _load_cache():
-    """Loads the user status cache from the JSON file."""
+# The SQLite database that serves subscription reads and the activity log locally
+DATABASE_FILE = os.getenv('DATABASE_FILE', local_store.DATABASE_FILE)
+# The client's onboarding sheet (Apps Script) used by the Internship Acceptance flow
+CLIENT_SCRIPT_URL = os.getenv("CLIENT_SCRIPT_URL")
+# Default per-call timeouts (seconds) for the two Apps Script endpoints
+SHEET_TIMEOUT = float(os.getenv('SHEET_TIMEOUT', 15))
+CLIENT_SHEET_TIMEOUT = float(os.getenv('CLIENT_SHEET_TIMEOUT', 15))
+# How often (seconds) queued changes are replicated to the Google Sheet
+SHEET_SYNC_INTERVAL = float(os.getenv('SHEET_SYNC_INTERVAL', 10))
+# Failed syncs are retried with exponential backoff; an operation that fails this many times is dead-lettered
+SHEET_SYNC_MAX_ATTEMPTS = int(os.getenv('SHEET_SYNC_MAX_ATTEMPTS', 5))
+# Activity logs are written in batches of this many entries, or every ACTIVITY_LOG_WINDOW seconds
+ACTIVITY_LOG_BATCH_SIZE = int(os.getenv('ACTIVITY_LOG_BATCH_SIZE', 50))
+ACTIVITY_LOG_WINDOW = float(os.getenv('ACTIVITY_LOG_WINDOW', 5))
+# How often (seconds) changed rows are pulled from the client's onboarding sheet
+CLIENT_SYNC_INTERVAL = float(os.getenv('CLIENT_SYNC_INTERVAL', 300))
+# How long (seconds) a "not found" / failed status lookup is reused before asking the Sheet again
+NOT_FOUND_CACHE_TTL = float(os.getenv('NOT_FOUND_CACHE_TTL', 60))
+ERROR_CACHE_TTL = float(os.getenv('ERROR_CACHE_TTL', 10))
+# Stale-while-revalidate for known users: a status older than the soft TTL (seconds) is still served
+# but refreshed from the Sheet in the background; only one older than the hard TTL waits for the Sheet.
+STATUS_SOFT_TTL = float(os.getenv('STATUS_SOFT_TTL', 300))
+STATUS_HARD_TTL = float(os.getenv('STATUS_HARD_TTL', 24 * 3600))
+# Renewal reminders: how long (seconds) before expiry they go out, and how fast (per batch / seconds between batches)
+RENEWAL_REMINDER_LEAD = float(os.getenv('RENEWAL_REMINDER_LEAD', 3 * 86400))
+RENEWAL_REMINDER_BATCH_SIZE = int(os.getenv('RENEWAL_REMINDER_BATCH_SIZE', 20))
+RENEWAL_REMINDER_INTERVAL = float(os.getenv('RENEWAL_REMINDER_INTERVAL', 1.0))
+
+# Lookups are served from memory; the file is only written periodically and on shutdown.
+_status_cache = create_status_cache(CACHE_FILE)
+# The Sheet is a reporting mirror: local writes are queued here and pushed by _sheet_sync.
+_store = LocalStore(DATABASE_FILE)
+# Users the Sheet didn't know or couldn't answer for; at most one Sheet call per user per TTL window
+_negative_cache = NegativeCache(ttl=NOT_FOUND_CACHE_TTL, error_ttl=ERROR_CACHE_TTL)
+# Concurrent cache misses for the same user share one getUserStatus call
+_status_fetches = SingleFlight()
+
+
+def flush_cache():
+    """Writes any unsaved cache changes to disk. Call this on shutdown."""
+    _status_cache.flush()
+
+
+def _decode_sheet_response(response) -> dict:
+    """
+    A robust check for valid JSON. Works for both requests and httpx responses.
+    If the response is not JSON, we print the raw text to see the error.
+    """
     try:
-        with open(CACHE_FILE, 'r') as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return {}
-
-
-def _save_cache(cache_data):
-    """Saves the user status cache to the JSON file."""
-    with open(CACHE_FILE, 'w') as f:
-        json.dump(cache_data, f, indent=4)
+        return response.json()
+    except json.JSONDecodeError:
+        print("--- FATAL ERROR: RESPONSE FROM GOOGLE WAS NOT JSON ---")
+        print(f"Status Code: {response.status_code}")
+        print("Response Headers:", response.headers)
+        print("Final URL after redirects:", response.url)
+        print("Response Text (first 500 chars):", response.text[:500])
+        print("------------------------------------------------------")
+        return {"status": "error", "message": "The server returned a non-JSON response."}
 
 
 def _fetch_from_sheet(params: dict):
@@ -34,120 +90,360 @@ def _fetch_from_sheet(params: dict):
     Generic function to make a request to the Google Apps Script.
     This version is corrected to properly handle Google's redirects.
     """
-    # Define browser-like headers to ensure the request is not blocked
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    }
+    action = params.get('action', 'unknown')
+    with SHEET_REQUEST_SECONDS.time(action=action):
+        try:
+            # Make the request, explicitly allowing redirects (which is default but good to be clear)
+            response = requests.get(
+                SCRIPT_URL,
+                params=params,
+                headers=DEFAULT_HEADERS,
+                allow_redirects=True, # This is crucial
+                timeout=SHEET_TIMEOUT
+            )
+
+            # Check if the final response is successful
+            response.raise_for_status()
+            result = _decode_sheet_response(response)
+
+        except requests.RequestException as e:
+            print(f"HTTP Request to Google Sheet failed: {e}")
+            result = {"status": "error", "message": str(e)}
+    if result.get("status") == "error":
+        SHEET_REQUEST_ERRORS.inc(action=action)
+    return result
+
+
+async def _fetch_from_sheet_async(params: dict, timeout: float = None):
+    """Async version of _fetch_from_sheet that uses the shared connection pool instead of blocking the event loop."""
+    action = params.get('action', 'unknown')
+    with SHEET_REQUEST_SECONDS.time(action=action):
+        try:
+            response = await get_client().get(SCRIPT_URL, params=params, timeout=timeout or SHEET_TIMEOUT)
+            response.raise_for_status()
+            result = _decode_sheet_response(response)
+
+        except httpx.HTTPError as e:
+            print(f"HTTP Request to Google Sheet failed: {e}")
+            result = {"status": "error", "message": str(e)}
+    if result.get("status") == "error":
+        SHEET_REQUEST_ERRORS.inc(action=action)
+    return result
 
-    try:
-        # Make the request, explicitly allowing redirects (which is default but good to be clear)
-        response = requests.get(
-            SCRIPT_URL,
-            params=params,
-            headers=headers,
-            allow_redirects=True, # This is crucial
-            timeout=15
-        )
-
-        # Check if the final response is successful
-        response.raise_for_status()
 
-        # This is the most important part: a robust check for valid JSON.
-        # If the response is not JSON, we will print the raw text to see the error.
+def _push_batch_to_sheet(operations: list) -> bool:
+    """
+    Replicates a batch of queued local writes to the Sheet in a single POST. Returns False if the
+    script rejected them; raises if the script couldn't be reached or didn't run.
+    """
+    with SHEET_REQUEST_SECONDS.time(action='batch'):
         try:
-            return response.json()
-        except json.JSONDecodeError:
-            print("--- FATAL ERROR: RESPONSE FROM GOOGLE WAS NOT JSON ---")
-            print(f"Status Code: {response.status_code}")
-            print("Response Headers:", response.headers)
-            print("Final URL after redirects:", response.url)
-            print("Response Text (first 500 chars):", response.text[:500])
-            print("------------------------------------------------------")
-            return {"status": "error", "message": "The server returned a non-JSON response."}
+            response = requests.post(
+                SCRIPT_URL,
+                json={'action': 'batch', 'operations': operations},
+                headers=DEFAULT_HEADERS,
+                allow_redirects=True,
+                timeout=30
+            )
+            response.raise_for_status()
+        except requests.RequestException:
+            SHEET_REQUEST_ERRORS.inc(action='batch')
+            raise
+    try:
+        result = response.json()
+    except json.JSONDecodeError:
+        # An error page from Apps Script itself: the operations never reached the script
+        raise ValueError(f"non-JSON response: {response.text[:200]}") from None
+    if result.get("status") != "success":
+        print(f"Sheet sync rejected by script: {result.get('message')}")
+        return False
+    return True
+
+
+_sheet_sync = SheetSync(_store, _push_batch_to_sheet, interval=SHEET_SYNC_INTERVAL,
+                        max_attempts=SHEET_SYNC_MAX_ATTEMPTS)
+_activity_queue = ActivityLogQueue(_store.log_activity_batch, batch_size=ACTIVITY_LOG_BATCH_SIZE,
+                                   window=ACTIVITY_LOG_WINDOW)
+
+
+def start_background_sync():
+    """
+    Starts replicating local writes to the Google Sheet and the batched activity logger.
+    Operations dead-lettered before the restart get another round of attempts.
+    Call this once on startup, from the running event loop.
+    """
+    replay_dead_letters()
+    _sheet_sync.start()
+    _activity_queue.start()
+    _client_directory.start()
+
 
-    except requests.RequestException as e:
-        print(f"HTTP Request to Google Sheet failed: {e}")
-        return {"status": "error", "message": str(e)}
+def replay_dead_letters() -> int:
+    """Puts every dead-lettered Sheet operation back in the outbox. Returns how many there were."""
+    replayed = _store.replay_dead_letters()
+    if replayed:
+        print(f"Replaying {replayed} dead-lettered Sheet operation(s).")
+        _sheet_sync.wake()
+    return replayed
+
+
+async def shutdown():
+    """Writes queued activity logs, pushes pending writes to the Sheet and saves the cache. Call this on shutdown."""
+    _expiry_scheduler.stop()
+    _client_directory.stop()
+    await _activity_queue.stop()
+    _sheet_sync.stop()
+    flush_cache()
 
 
 def clear_user_cache(user_id: int):
     """Removes a single user from the local cache, forcing a refresh on next check."""
-    cache = _load_cache()
-    if str(user_id) in cache:
-        del cache[str(user_id)]
-        _save_cache(cache)
+    if not _store.forget_user(user_id):
+        # The Sheet hasn't caught up with this user's local changes yet; push them now.
+        _sheet_sync.wake()
+    _negative_cache.invalidate(user_id)
+    if _status_cache.invalidate(user_id):
         print(f"Cache cleared for user_id: {user_id}")
 
 
-def get_user_status(user_id: int):
+def _remember_status(user_id: int, user_data: dict, stored_at: float = None) -> dict:
     """
-    Checks user status. First checks the local JSON cache, then falls back to the Google Sheet.
+    Puts a status in the in-memory cache and hands active subscriptions to the expiry scheduler.
+    This is the only place an expiry date is parsed; a subscription already past it is cached as expired.
     """
-    cache = _load_cache()
-    user_id_str = str(user_id)
+    if user_data['status'] == 'active':
+        if _expiry_scheduler.track(int(user_id), user_data['expiry_date']) <= time.time():
+            user_data = dict(user_data, status='expired')
+    else:
+        _expiry_scheduler.untrack(int(user_id))
+    _status_cache.set(str(user_id), user_data, stored_at=stored_at)
+    return user_data
+
+
+def _expire_subscriptions(expired: list):
+    """Called by the expiry scheduler the moment subscriptions lapse: flips them to expired locally."""
+    for user_id, expiry_date in expired:
+        entry = _status_cache.get_entry(user_id)
+        if entry is not None and entry[0]['status'] == 'active' and entry[0]['expiry_date'] == expiry_date:
+            _status_cache.set(str(user_id), dict(entry[0], status='expired'), stored_at=entry[1])
+    _store.mark_expired(expired)
+    SUBSCRIPTIONS_EXPIRED_TOTAL.inc(len(expired))
+    print(f"{len(expired)} subscription(s) expired.")
 
-    if user_id_str in cache:
-        cached_data = cache[user_id_str]
-        # Perform local expiry check first - it's fast and saves an API call
-        expiry_date = datetime.strptime(cached_data['expiry_date'], "%Y-%m-%d")
-        if datetime.now() > expiry_date and cached_data['status'] != 'expired':
-            cached_data['status'] = 'expired'
-            cache[user_id_str] = cached_data
-            _save_cache(cache)
 
-        print(f"Cache hit for user {user_id_str}. Status: {cached_data['status']}")
-        return cached_data
+# Flips statuses to expired when they lapse and sends renewal reminders, on the bot's job queue
+_expiry_scheduler = ExpiryScheduler(_expire_subscriptions, reminder_lead=RENEWAL_REMINDER_LEAD,
+                                    reminder_batch_size=RENEWAL_REMINDER_BATCH_SIZE,
+                                    reminder_interval=RENEWAL_REMINDER_INTERVAL)
 
-    # If not in cache, fetch from the source of truth (Google Sheet)
-    print(f"Cache miss for user {user_id_str}. Fetching from Google Sheet...")
-    params = {'action': 'getUserStatus', 'user_id': user_id_str}
-    response = _fetch_from_sheet(params)
 
+def start_expiry_scheduler(job_queue, send_reminder):
+    """
+    Loads every active subscription into the expiry scheduler and starts it on the bot's job queue.
+    `send_reminder(bot, user_id, expiry_date)` sends one renewal reminder. Call this once on startup.
+    """
+    active = _store.active_subscriptions()
+    for user_id, expiry_date, reminded_for in active:
+        _expiry_scheduler.track(user_id, expiry_date, reminded_for)
+    _expiry_scheduler.start(job_queue, send_reminder, on_reminded=_store.mark_reminded)
+    print(f"Expiry scheduler tracking {len(active)} active subscription(s).")
+
+
+def _get_local_entry(user_id: int):
+    """
+    Returns (status data, checked_at) from the in-memory cache or the local database, or None if
+    neither has it. checked_at is when the status was last confirmed by the Sheet or written locally.
+    """
+    user_id_str = str(user_id)
+
+    entry = _status_cache.get_entry(user_id_str)
+    if entry is not None:
+        STATUS_LOOKUPS_TOTAL.inc(source='memory')
+    else:
+        entry = _store.get_user_entry(user_id)
+        if entry is not None:
+            STATUS_LOOKUPS_TOTAL.inc(source='database')
+            cached_data, checked_at = entry
+            if checked_at is None:
+                # Saved before statuses were timestamped: serve it, but refresh it soon
+                checked_at = time.time() - STATUS_SOFT_TTL
+            entry = (_remember_status(user_id, cached_data, stored_at=checked_at), checked_at)
+    if entry is not None:
+        # No expiry check needed: the expiry scheduler flips cached statuses the moment they lapse
+        print(f"Cache hit for user {user_id_str}. Status: {entry[0]['status']}")
+    return entry
+
+
+def _get_local_status(user_id: int):
+    """Returns the user's status from the in-memory cache or the local database, or None if neither has it."""
+    entry = _get_local_entry(user_id)
+    return entry[0] if entry is not None else None
+
+
+def _get_negative_status(user_id: int):
+    """Returns a recent `not_found` / `error` result for the user, or None."""
+    result = _negative_cache.get(user_id)
+    if result is not None:
+        STATUS_LOOKUPS_TOTAL.inc(source='negative')
+        print(f"Negative cache hit for user {user_id}. Status: {result['status']}")
+    return result
+
+
+def _handle_status_response(user_id: int, response: dict, fetched_at: float = None):
+    """
+    Turns a getUserStatus response into the status dict returned to the bot. Successful lookups
+    are cached; `not_found` and errors are remembered briefly in the negative cache.
+    For a user we already have locally, the local copy wins over anything but a successful
+    lookup, and over that too while local changes are still waiting to reach the Sheet or were
+    made after the request was sent at `fetched_at`.
+    """
     if response.get("status") == "success":
         user_data = response["data"]
-        # Update the cache with the fresh data
-        cache[user_id_str] = user_data
-        _save_cache(cache)
-        return user_data
-    elif response.get("status") == "not_found":
-        return {"status": "not_found"}
+        # Keep a local copy so later reads never leave the process
+        if _store.save_user(user_id, user_data, fetched_at=fetched_at):
+            return _remember_status(user_id, user_data)
+    local_data = _store.get_user(user_id)
+    if local_data is not None:
+        if response.get("status") != "success":
+            print(f"Could not refresh the status of user {user_id} ({response.get('status')}); keeping the local copy.")
+        return local_data
+    if response.get("status") == "not_found":
+        result = {"status": "not_found"}
+    else:
+        result = {"status": "error", "message": response.get("message", "Unknown error from script")}
+    _negative_cache.set(user_id, result)
+    return result
+
+
+def get_user_status(user_id: int):
+    """
+    Checks user status. First checks the in-memory cache, then the local database,
+    and only falls back to the Google Sheet for users we have never seen or whose
+    status is older than STATUS_HARD_TTL.
+    """
+    entry = _get_local_entry(user_id)
+    if entry is not None and time.time() - entry[1] < STATUS_HARD_TTL:
+        return entry[0]
+    negative = _get_negative_status(user_id)
+    if negative is not None:
+        return negative
+
+    # If not in cache (or too old), fetch from the source of truth (Google Sheet)
+    if entry is None:
+        STATUS_LOOKUPS_TOTAL.inc(source='sheet')
+        print(f"Cache miss for user {user_id}. Fetching from Google Sheet...")
     else:
-        # Return the error but don't cache it
-        return {"status": "error", "message": response.get("message", "Unknown error from script")}
+        STATUS_REVALIDATIONS_TOTAL.inc(mode='blocking')
+        print(f"Status of user {user_id} is out of date. Fetching from Google Sheet...")
+    params = {'action': 'getUserStatus', 'user_id': str(user_id)}
+    fetched_at = time.time()
+    return _handle_status_response(user_id, _fetch_from_sheet(params), fetched_at)
+
+
+async def get_user_status_async(user_id: int, timeout: float = None):
+    """
+    Async version of get_user_status for the bot handlers, with stale-while-revalidate: a status
+    older than STATUS_SOFT_TTL is returned straight away and refreshed in the background; only one
+    older than STATUS_HARD_TTL waits for the Sheet. Concurrent misses for the same user wait for
+    a single Sheet call instead of each making their own.
+    """
+    entry = _get_local_entry(user_id)
+    if entry is not None:
+        cached_data, checked_at = entry
+        age = time.time() - checked_at
+        if age < STATUS_SOFT_TTL:
+            return cached_data
+        if age < STATUS_HARD_TTL:
+            if not _status_fetches.in_flight(user_id):
+                STATUS_REVALIDATIONS_TOTAL.inc(mode='background')
+                print(f"Status of user {user_id} is stale. Refreshing it in the background...")
+                refresh = _status_fetches.start(user_id, lambda: _fetch_user_status_async(user_id, timeout))
+                refresh.add_done_callback(lambda done: _log_failed_refresh(user_id, done))
+            return cached_data
+        STATUS_REVALIDATIONS_TOTAL.inc(mode='blocking')
+        print(f"Status of user {user_id} is out of date. Fetching from Google Sheet...")
+        return await _status_fetches.do(user_id, lambda: _fetch_user_status_async(user_id, timeout))
+    negative = _get_negative_status(user_id)
+    if negative is not None:
+        return negative
+
+    if _status_fetches.in_flight(user_id):
+        STATUS_LOOKUPS_TOTAL.inc(source='coalesced')
+        print(f"Cache miss for user {user_id}. Waiting for the lookup already in flight...")
+    else:
+        STATUS_LOOKUPS_TOTAL.inc(source='sheet')
+        print(f"Cache miss for user {user_id}. Fetching from Google Sheet...")
+    return await _status_fetches.do(user_id, lambda: _fetch_user_status_async(user_id, timeout))
+
+
+def _log_failed_refresh(user_id: int, refresh: asyncio.Future):
+    """Logs a background revalidation that raised; nobody else may be waiting to see the error."""
+    if not refresh.cancelled() and refresh.exception() is not None:
+        print(f"[ERROR] Background refresh of the status of user {user_id} failed: {refresh.exception()}")
+
+
+async def _fetch_user_status_async(user_id: int, timeout: float = None):
+    """Reads the user's status from the Sheet and stores it locally. Shared by lookups and revalidations."""
+    params = {'action': 'getUserStatus', 'user_id': str(user_id)}
+    # A payment applied while the request is out must not be overwritten by the older response
+    fetched_at = time.time()
+    return _handle_status_response(user_id, await _fetch_from_sheet_async(params, timeout), fetched_at)
 
 
 def register_new_user(user_id: int, username: str):
-    """Registers a new user via the web app. No caching needed here."""
-    params = {'action': 'registerNewUser', 'user_id': user_id, 'username': username}
-    return _fetch_from_sheet(params)
+    """Registers a new user locally; the registration reaches the Sheet with the next sync."""
+    user_data = _remember_status(user_id, _store.register_user(user_id, username))
+    _negative_cache.invalidate(user_id)
+    return {"status": "success", "data": user_data}
+
+
+async def register_new_user_async(user_id: int, username: str):
+    """Async version of register_new_user; the database write runs off the event loop."""
+    return await asyncio.to_thread(register_new_user, user_id, username)
 
 
 def log_activity(letter_type: str, recipient_name: str, recipient_email: str, sent_by: str, status: str):
-    """Logs an activity via the web app. This is a 'fire-and-forget' action."""
-    params = {
-        'action': 'logActivity',
-        'letter_type': letter_type,
-        'recipient_name': recipient_name,
-        'recipient_email': recipient_email,
-        'sent_by': sent_by,
-        'status': status
-    }
-    response = _fetch_from_sheet(params)
-    return response.get("status") == "success"
-
-
-def update_user_subscription(user_id: int):
-    """
-    Updates a user's subscription in the Google Sheet and clears the local cache for that user.
-    This should be called by your Razorpay webhook handler.
-    """
-    params = {'action': 'updateSubscription', 'user_id': user_id}
-    response = _fetch_from_sheet(params)
-    if response.get("status") == "success":
-        # Important: Clear the old cached data to force a refresh on the next check
-        clear_user_cache(user_id)
-        return True
-    return False
+    """Logs an activity locally. The Sheet's dashboard receives it with the next batched sync."""
+    _store.log_activity(letter_type, recipient_name, recipient_email, sent_by, status)
+    return True
+
+
+async def log_activity_async(letter_type: str, recipient_name: str, recipient_email: str, sent_by: str, status: str):
+    """
+    Async version of log_activity. The entry is only queued; the background logger
+    writes it with the next batch, so this adds no latency to the caller.
+    """
+    _activity_queue.submit(letter_type, recipient_name, recipient_email, sent_by, status)
+    return True
+
+
+def update_user_subscription(user_id: int, payment_id: str = None):
+    """
+    Activates a user's subscription locally and queues the update for the Google Sheet.
+    Called by the Razorpay webhook (razorpay_webhook.py) with the payment's id; returns False
+    if that payment had already been applied.
+    """
+    user_data = _store.activate_subscription(user_id, payment_id=payment_id)
+    if user_data is None:
+        return False
+    # Replace the old cached data so the next check sees the new expiry straight away
+    _remember_status(user_id, user_data)
+    _sheet_sync.wake()
+    return True
+
+
+async def update_user_subscription_async(user_id: int, payment_id: str = None):
+    """Async version of update_user_subscription; the database write runs off the event loop."""
+    return await asyncio.to_thread(update_user_subscription, user_id, payment_id)
+
+
+def _handle_student_response(data: dict):
+    """Returns the client sheet's findStudent response if it found the student, otherwise None."""
+    if data.get("status") == "success":
+        return data  # Return the full JSON object as is
+    else:
+        print(f"Client's Sheet API Error: {data.get('message')}")
+        return None
 
 
 def fetch_student_from_client_sheet(name: str):
@@ -155,22 +451,74 @@ def fetch_student_from_client_sheet(name: str):
     Fetches student info from the client's Google Sheet via Apps Script.
     Returns the JSON object if found, otherwise None.
     """
-    CLIENT_SCRIPT_URL = os.getenv("CLIENT_SCRIPT_URL")  # Make sure this env variable is set
-
     try:
         params = {'action': 'findStudent', 'name': name}
-        response = requests.get(CLIENT_SCRIPT_URL, params=params)
+        with SHEET_REQUEST_SECONDS.time(action='findStudent'):
+            response = requests.get(CLIENT_SCRIPT_URL, params=params, headers=DEFAULT_HEADERS, timeout=CLIENT_SHEET_TIMEOUT)
         response.raise_for_status()
-        data = response.json()
+        return _handle_student_response(response.json())
 
-        if data.get("status") == "success":
-            return data  # Return the full JSON object as is
-        else:
-            print(f"Client's Sheet API Error: {data.get('message')}")
-            return None
+    except Exception as e:
+        SHEET_REQUEST_ERRORS.inc(action='findStudent')
+        print(f"HTTP Request to client's sheet failed: {e}")
+        return None
+
+
+async def fetch_student_from_client_sheet_async(name: str, timeout: float = None):
+    """Async version of fetch_student_from_client_sheet that uses the shared connection pool."""
+    try:
+        params = {'action': 'findStudent', 'name': name}
+        with SHEET_REQUEST_SECONDS.time(action='findStudent'):
+            response = await get_client().get(CLIENT_SCRIPT_URL, params=params, timeout=timeout or CLIENT_SHEET_TIMEOUT)
+        response.raise_for_status()
+        return _handle_student_response(response.json())
 
     except Exception as e:
+        SHEET_REQUEST_ERRORS.inc(action='findStudent')
+        print(f"HTTP Request to client's sheet failed: {e}")
+        return None
+
+
+async def _fetch_client_changes_async(since: str = None):
+    """
+    Pulls students from the client's sheet: every row when `since` is None,
+    otherwise only rows changed after that cursor. Returns (students, cursor) or None.
+    """
+    params = {'action': 'listStudents'}
+    if since:
+        params['updated_since'] = since
+    try:
+        with SHEET_REQUEST_SECONDS.time(action='listStudents'):
+            response = await get_client().get(CLIENT_SCRIPT_URL, params=params, timeout=CLIENT_SHEET_TIMEOUT)
+        response.raise_for_status()
+        data = _decode_sheet_response(response)
+    except httpx.HTTPError as e:
+        SHEET_REQUEST_ERRORS.inc(action='listStudents')
         print(f"HTTP Request to client's sheet failed: {e}")
         return None
 
+    if data.get("status") != "success":
+        print(f"Client's Sheet API Error: {data.get('message')}")
+        return None
+    return data.get("students", []), data.get("server_time")
+
+
+# Local mirror of the client's onboarding sheet, kept fresh by incremental syncs
+_client_directory = ClientDirectory(_store, _fetch_client_changes_async, fetch_student_from_client_sheet_async,
+                                    refresh_interval=CLIENT_SYNC_INTERVAL)
+
+
+async def find_student_async(name: str):
+    """
+    Finds a student for the Internship Acceptance flow. Served from the local mirror;
+    only names we don't have yet go to the client's sheet.
+    Returns a dict with name, email, month and domain, otherwise None.
+    """
+    return await _client_directory.find(name)
+
+
+def suggest_students(name: str, k: int = 5) -> list:
+    """Returns up to `k` known student names that approximately match `name`, best match first."""
+    return _client_directory.suggest(name, k)
+
 # print(fetch_student_from_client_sheet('Wuis'))
\ No newline at end of file
@@ -0,0 +1,168 @@
+# delivery.py
+
+import asyncio
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+from email_sender import deliver_email, is_transient_error
+from metrics import EMAILS_TOTAL
+
+
+class DeliveryJob:
+    """One email to deliver, plus its outcome once the service is done with it."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, pdf_bytes: bytes, recipient_data: dict, sender_account: str, on_done=None):
+        self.job_id = next(self._ids)
+        self.pdf_bytes = pdf_bytes
+        self.recipient_data = recipient_data
+        self.sender_account = sender_account
+        self.on_done = on_done  # async callable(job), awaited once the job is sent or has failed for good
+        self.attempts = 0
+        self.status = "queued"  # queued -> sending -> sent | failed
+        self.error = None
+
+
+class DeliveryService:
+    """
+    Asynchronous email delivery.
+    Jobs go into an asyncio queue; `workers` tasks take them off and run the blocking
+    SMTP send on a pool of the same number of threads, so the event loop never waits on SMTP.
+    Transient failures are retried with exponential backoff (base_delay * 2^n, capped at
+    max_delay) without holding a worker while waiting. The job's on_done callback is awaited
+    when it finishes either way; jobs the service is stopped before sending are finished as
+    failed, and a send already in progress at shutdown is waited for.
+    """
+
+    def __init__(self, send=deliver_email, workers: int = 4, max_attempts: int = 4,
+                 base_delay: float = 2.0, max_delay: float = 60.0, max_queued: int = 1000):
+        self.send = send
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_queued = max_queued
+
+        self._queue = None
+        self._executor = None
+        self._tasks = []
+        self._retrying = {}  # Pending retry timer or re-queue task -> its job
+
+    def start(self):
+        """Starts the worker tasks on the running event loop."""
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queued)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="email-delivery")
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def submit(self, pdf_bytes: bytes, recipient_data: dict, sender_account: str = 'default',
+                     on_done=None) -> DeliveryJob:
+        """Queues an email and returns immediately with its job."""
+        job = DeliveryJob(pdf_bytes, recipient_data, sender_account, on_done)
+        await self._queue.put(job)
+        return job
+
+    async def stop(self, timeout: float = 60):
+        """Waits (up to `timeout` seconds) for queued jobs to finish, then stops the workers."""
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(self._drain(), timeout)
+        except asyncio.TimeoutError:
+            print(f"Stopping email delivery with {self._queue.qsize()} job(s) still queued.")
+        unsent = list(self._retrying.values())
+        for pending in self._retrying:
+            pending.cancel()
+        self._retrying.clear()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        while not self._queue.empty():
+            unsent.append(self._queue.get_nowait())
+            self._queue.task_done()
+        for job in unsent:
+            job.status, job.error = "failed", RuntimeError("email delivery stopped before the job was sent")
+            EMAILS_TOTAL.inc(result="failed")
+            await self._notify(job)
+        self._executor.shutdown(wait=False)
+
+    async def _drain(self):
+        await self._queue.join()
+        while self._retrying:
+            await asyncio.sleep(0.1)
+            await self._queue.join()
+
+    def _schedule_retry(self, job: DeliveryJob, delay: float):
+        loop = asyncio.get_running_loop()
+
+        def requeue():
+            del self._retrying[handle]
+            task = loop.create_task(self._requeue(job))
+            self._retrying[task] = job
+
+        handle = loop.call_later(delay, requeue)
+        self._retrying[handle] = job
+
+    async def _requeue(self, job: DeliveryJob):
+        # put() rather than put_nowait() so a full queue delays the retry instead of losing it
+        await self._queue.put(job)
+        del self._retrying[asyncio.current_task()]
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._attempt(loop, job)
+            finally:
+                self._queue.task_done()
+
+    async def _attempt(self, loop, job: DeliveryJob):
+        job.attempts += 1
+        job.status = "sending"
+        sending = loop.run_in_executor(self._executor, self.send, job.pdf_bytes, job.recipient_data,
+                                       job.sender_account)
+        try:
+            await asyncio.shield(sending)
+        except asyncio.CancelledError:
+            # Stopping. The SMTP send can't be interrupted, so wait for its outcome and finish
+            # the job with it instead of dropping the job halfway.
+            await asyncio.wait([sending])
+            self._settle(job, sending, retry=False)
+            await self._notify(job)
+            raise
+        except Exception:
+            pass  # Recorded by _settle
+        if self._settle(job, sending, retry=True):
+            await self._notify(job)
+
+    def _settle(self, job: DeliveryJob, sending, retry: bool) -> bool:
+        """Records the outcome of a finished send. Returns False if the job was scheduled for a retry."""
+        error = sending.exception()
+        if error is None:
+            job.status, job.error = "sent", None
+            EMAILS_TOTAL.inc(result="sent")
+            return True
+        job.error = error
+        if retry and is_transient_error(error) and job.attempts < self.max_attempts:
+            delay = min(self.base_delay * 2 ** (job.attempts - 1), self.max_delay)
+            print(f"Delivery job {job.job_id} failed ({error}); retrying in {delay:.1f}s "
+                  f"(attempt {job.attempts}/{self.max_attempts}).")
+            job.status = "queued"
+            self._schedule_retry(job, delay)
+            return False
+        print(f"[ERROR] Delivery job {job.job_id} failed after {job.attempts} attempt(s): {error}")
+        job.status = "failed"
+        EMAILS_TOTAL.inc(result="failed")
+        return True
+
+    async def _notify(self, job: DeliveryJob):
+        if job.on_done is not None:
+            try:
+                await job.on_done(job)
+            except Exception as e:
+                print(f"Delivery callback for job {job.job_id} failed: {e}")
@@ -1,13 +1,13 @@
 # email_sender.py
 import os
 import smtplib
-import ssl
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from email.mime.application import MIMEApplication
-from pathlib import Path
+import threading
 from dotenv import load_dotenv
 
+import email_templates
+from smtp_pool import SMTPConnectionPool
+from metrics import EMAILS_TOTAL
+
 load_dotenv()
 
 # --- SMTP SERVER CONFIGURATION ---
@@ -19,172 +19,134 @@ DEFAULT_EMAIL_PASSWORD = os.environ.get("DEFAULT_EMAIL_PASSWORD")  # <-- Make su
 HR_EMAIL = os.environ.get("HR_EMAIL")
 HR_EMAIL_PASSWORD = os.environ.get("HR_EMAIL_PASSWORD")
 
+# --- CONNECTION POOL CONFIGURATION ---
+# Logged-in sessions kept open per sender account, and how long an unused one is kept
+SMTP_POOL_SIZE = int(os.environ.get("SMTP_POOL_SIZE", 2))
+SMTP_IDLE_TIMEOUT = float(os.environ.get("SMTP_IDLE_TIMEOUT", 240))
+
 # --- BCC CONFIGURATION ---
 # <-- CHANGE 1: Add your logging email address here.
 # This is where you will get a copy of every email sent by the bot.
 BCC_EMAIL = os.environ.get("BCC_EMAIL")
 
 
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _get_sender_credentials(sender_account: str) -> tuple[str, str]:
+    if sender_account == 'hr':
+        return HR_EMAIL, HR_EMAIL_PASSWORD
+    return DEFAULT_EMAIL, DEFAULT_EMAIL_PASSWORD
+
+
+def get_pool(sender_account: str = 'default') -> SMTPConnectionPool:
+    """Returns the connection pool for a sender account ('default' or 'hr'), creating it on first use."""
+    with _pools_lock:
+        if sender_account not in _pools:
+            sender_email, sender_password = _get_sender_credentials(sender_account)
+            _pools[sender_account] = SMTPConnectionPool(
+                SMTP_SERVER, SMTP_PORT, sender_email, sender_password,
+                size=SMTP_POOL_SIZE, idle_timeout=SMTP_IDLE_TIMEOUT
+            )
+        return _pools[sender_account]
+
+
+def use_pool(sender_account: str, pool: SMTPConnectionPool):
+    """Makes a sender account send through `pool`, e.g. one pointed at a local SMTP sink in benchmarks."""
+    with _pools_lock:
+        old_pool = _pools.get(sender_account)
+        _pools[sender_account] = pool
+    if old_pool is not None and old_pool is not pool:
+        old_pool.close()
+
+
+def close_pools():
+    """Logs out of every pooled SMTP session. Call this on shutdown."""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+
+
 def get_email_templates(letter_type, recipient_name, domain):
     """
     Returns the appropriate email subject and HTML body based on the letter type.
     """
-    # Template for Campus Ambassador
-    if letter_type.lower() == "campus ambassador":
-        subject = "Appointment Letter – Campus Ambassador at Persevex"
-        body = f"""
-        <html>
-        <body>
-            <p>Dear {recipient_name},</p>
-            <p>Greetings from Persevex!</p>
-            <p>We are excited to officially welcome you as a Campus Ambassador at Persevex. Please find attached your appointment letter, which outlines your key responsibilities, benefits, and the impact you can make as part of our team.</p>
-            <p>As a Campus Ambassador, you will play a vital role in building brand awareness, promoting our programs, and fostering student engagement at your institution. Your energy and initiative will be instrumental in expanding Persevex’s mission to empower learners across campuses.</p>
-            <p>If you have any questions or need further clarification, feel free to reach out to us at 📧 support@persevex.com.</p>
-            <p>We look forward to seeing your contributions and success in this role.</p>
-            <p>📣 Feel free to share this exciting opportunity on LinkedIn by posting about your new role, tagging @Persevex and using hashtags such as #Persevex #CampusAmbassador #Leadership #StudentOpportunity #EmpoweringLearners.</p>
-            <br>
-            <p>Best regards,<br>
-            Team Persevex<br>
-            📧 support@persevex.com<br>
-            🌐 www.persevex.com</p>
-        </body>
-        </html>
-        """
-        return subject, body
-
-    elif letter_type.lower() == "internship acceptance":
-        subject = "Internship Acceptance Letter at Persevex"
-        body = f"""
-        <html>
-        <body>
-            <p>Dear {recipient_name},</p>
-            <p>Congratulations once again!<br>
-            Please find attached your official internship acceptance letter for the <b>{domain} Intern</b> role at Persevex.</p>
-            <p>We’re excited to have you onboard and look forward to your contributions during this internship.</p>
-            <p>If you’re comfortable, we’d love for you to share this opportunity and your experience on LinkedIn by tagging @Persevex and helping others know about us.</p>
-            <br>
-            <p>Best regards,<br>
-            Shanmukh Shekar K C<br>
-            Administrator<br>
-            📧 support@persevex.com</p>
-        </body>
-        </html>
-        """
-        return subject, body
-    elif letter_type.lower() == "offer letter":
-        subject = f"Offer Letter for the position of Business Development Associate at Persevex."
-        body = f"""
-                <html>
-                <body style="font-family: Arial, sans-serif; line-height: 1.6;">
-                    <p>Dear {recipient_name},</p>
-                    <p>Greetings from Persevex Education Consultancy LLP!</p>
-                    <p>Congratulations once again! Please find attached your official Offer Letter for the position of <b>Business Development Associate</b> at Persevex.</p>
-                    <p>To proceed with your onboarding, kindly complete the following steps within <b>two working days</b>:</p>
-                    <ol>
-                        <li>Review and sign the offer letter (a digital or scanned signature is acceptable).</li>
-                        <li>Email the signed offer letter along with scanned copies of the following documents:
-                            <ul>
-                                <li>Academic certificates: Graduation (if applicable)</li>
-                                <li>A recent passport-sized photograph</li>
-                                <li>A government-issued ID (Aadhaar / Voter ID / Driving License)</li>
-                                <li>PAN Card and Bank Account details (Account Number and IFSC Code)</li>
-                            </ul>
-                        </li>
-                    </ol>
-                    <p>Please reply to this email with all the required documents attached.</p>
-                    <p><b><u>Office Location:</u></b><br>
-                    Persevex LLP<br>
-                    5A, 1st A Cross Road, Dollar Scheme Colony,<br>
-                    1st Stage, BTM Layout, Bengaluru, Karnataka – 560068</p>
-                    <p>We are thrilled to have you onboard and look forward to your contributions to the team.</p>
-                    <br>
-                    <p>Warm regards,<br>
-                    Bhumika Vijay Shinde<br>
-                    Persevex LLP</p>
-                </body>
-                </html>
-                """
-        return subject, body
-    else:
-        subject = "A Letter from Persevex"
-        body = f"""<p>Dear {recipient_name},</p><p>Please find your document attached.</p>"""
-        return subject, body
-
-
-# In email_sender.py
-
-# In email_sender.py
-
-def send_personalized_email(pdf_path: str, recipient_data: dict, sender_account: str = 'default'):
+    return email_templates.get_template(letter_type).render(recipient_name, domain)
+
+
+def render_message(pdf_bytes: bytes, recipient_data: dict, sender_email: str) -> bytes:
+    """
+    Builds the letter email (the HTML body for the letter type plus the PDF as an attachment)
+    as the bytes to send, from the cached skeleton for this letter type and sender.
+    """
+    if not pdf_bytes:
+        raise ValueError("The letter PDF is empty.")
+    skeleton = email_templates.get_skeleton(recipient_data["letter_type"], sender_email)
+    return skeleton.render(recipient_data["email"], recipient_data["name"], recipient_data["domain"], pdf_bytes)
+
+
+def deliver_email(pdf_bytes: bytes, recipient_data: dict, sender_account: str = 'default'):
+    """
+    Builds the letter email around the in-memory PDF and sends it over a pooled SMTP
+    session (Port 587 with STARTTLS).
+    Raises on failure; use is_transient_error() to decide whether a retry can help.
+    """
+    sender_email, _ = _get_sender_credentials(sender_account)
+    msg = render_message(pdf_bytes, recipient_data, sender_email)
+    recipient_name = recipient_data["name"]
+    recipient_email = recipient_data["email"]
+
+    # The 'all_recipients' list is still correct and necessary (BCC_EMAIL may be unset)
+    all_recipients = [email_templates.encode_address(address) for address in (recipient_email, BCC_EMAIL) if address]
+
+    print("Sending email...")
+
+    # This function call correctly sends to both recipients without
+    # adding the Bcc header to the visible message content.
+    # The message is already CRLF-terminated bytes, which smtplib sends as is.
+    get_pool(sender_account).sendmail(sender_email, all_recipients, msg)
+
+    print(f"Successfully sent email from {sender_email} to {recipient_name} via Port 587.")
+
+
+def is_transient_error(error: Exception) -> bool:
+    """True for failures a later retry may fix: dropped connections, timeouts and 4xx replies."""
+    # SMTPException subclasses OSError, so the SMTP cases have to be settled before the OSError check
+    if isinstance(error, smtplib.SMTPAuthenticationError):
+        return False
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(error, smtplib.SMTPException):
+        return False  # SMTPNotSupportedError, "no suitable authentication method" and the like
+    return isinstance(error, OSError)
+
+
+def send_personalized_email(pdf_bytes: bytes, recipient_data: dict, sender_account: str = 'default'):
     """
-    Connects to the SMTP server using the standard Port 587 with STARTTLS.
-    This is the most compatible method for most providers.
+    Sends the letter over a pooled SMTP session (Port 587 with STARTTLS).
+    Back-to-back sends from the same account reuse an already logged-in connection.
+    Returns True on success, False otherwise.
     """
-    server = None
+    sender_email, _ = _get_sender_credentials(sender_account)
     try:
-        if sender_account == 'hr':
-            sender_email = HR_EMAIL
-            sender_password = HR_EMAIL_PASSWORD
-        else:
-            sender_email = DEFAULT_EMAIL
-            sender_password = DEFAULT_EMAIL_PASSWORD
-
-        recipient_name = recipient_data["name"]
-        recipient_email = recipient_data["email"]
-        domain = recipient_data["domain"]
-        letter_type = recipient_data["letter_type"]
-
-        msg = MIMEMultipart()
-        msg["From"] = sender_email
-        msg["To"] = recipient_email
-
-        # --- THE FIX: DELETE THIS LINE ---
-        # msg["Bcc"] = BCC_EMAIL  <-- DELETE THIS LINE
-
-        subject, html_body = get_email_templates(letter_type, recipient_name, domain)
-        msg["Subject"] = subject
-        msg.attach(MIMEText(html_body, "html"))
-
-        # ... (PDF attachment logic remains the same)
-        pdf_path_obj = Path(pdf_path)
-        if not pdf_path_obj.is_file():
-            print(f"[ERROR] PDF file not found at: {pdf_path}")
-            return False
-        with open(pdf_path_obj, "rb") as f:
-            attachment = MIMEApplication(f.read(), _subtype="pdf")
-        attachment.add_header("Content-Disposition", "attachment", filename=f"{letter_type.replace(' ', '_')}.pdf")
-        msg.attach(attachment)
-
-        # The 'all_recipients' list is still correct and necessary
-        all_recipients = [recipient_email, BCC_EMAIL]
-
-        context = ssl.create_default_context()
-        print(f"Connecting to {SMTP_SERVER} on port {SMTP_PORT}...")
-        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-        print("Securing connection with STARTTLS...")
-        server.starttls(context=context)
-        print(f"Logging in as {sender_email}...")
-        server.login(sender_email, sender_password)
-        print("Sending email...")
-
-        # This function call correctly sends to both recipients without
-        # adding the Bcc header to the visible message content.
-        server.sendmail(sender_email, all_recipients, msg.as_string())
-
-        print(f"Successfully sent email from {sender_email} to {recipient_name} via Port 587.")
+        deliver_email(pdf_bytes, recipient_data, sender_account)
+        EMAILS_TOTAL.inc(result="sent")
         return True
 
     except smtplib.SMTPAuthenticationError:
+        EMAILS_TOTAL.inc(result="failed")
         print(
             f"[ERROR] Login failed for {sender_email}. This means the password or username is wrong, or the provider is blocking the login.")
         return False
     except Exception as e:
+        EMAILS_TOTAL.inc(result="failed")
         print(f"[ERROR] An error occurred while sending the email: {e}")
         return False
-    finally:
-        if server:
-            print("Closing connection.")
-            server.quit()
 
 # recipient_data = {
 #     "name": "Sayma Perween",
@@ -192,4 +154,5 @@ def send_personalized_email(pdf_path: str, recipient_data: dict, sender_account:
 #     "domain": "Marketing",            # Used only for internship template
 #     "letter_type": "campus ambassador"     # One of: campus ambassador / internship acceptance / offer letter
 # }
-# send_personalized_email('CA_Letter_Sayma_Perween.pdf', recipient_data)
\ No newline at end of file
+# pdf_bytes, _ = generate_campus_ambassador_pdf_with_preview(recipient_data['name'])
+# send_personalized_email(pdf_bytes, recipient_data)
\ No newline at end of file
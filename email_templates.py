@@ -0,0 +1,219 @@
+# email_templates.py
+"""
+The letter emails, compiled once per letter type.
+
+Each template's subject and HTML body are parsed into literal chunks and fields at import, and
+each (letter type, sender) pair gets a message skeleton: the complete MIME message, serialized
+once by the email package, with slots for the recipient, the HTML body and the PDF. Building a
+letter email is then base64 plus one join into the bytes handed to SMTP, instead of building
+and flattening a MIME tree for every recipient.
+"""
+
+import base64
+import string
+import uuid
+from email.errors import HeaderParseError
+from email.generator import BytesGenerator
+from email.headerregistry import Address
+from email.mime.multipart import MIMEMultipart
+from email.mime.nonmultipart import MIMENonMultipart
+from email.policy import compat32
+from functools import lru_cache
+from io import BytesIO
+
+CAMPUS_AMBASSADOR_BODY = """
+        <html>
+        <body>
+            <p>Dear {recipient_name},</p>
+            <p>Greetings from Persevex!</p>
+            <p>We are excited to officially welcome you as a Campus Ambassador at Persevex. Please find attached your appointment letter, which outlines your key responsibilities, benefits, and the impact you can make as part of our team.</p>
+            <p>As a Campus Ambassador, you will play a vital role in building brand awareness, promoting our programs, and fostering student engagement at your institution. Your energy and initiative will be instrumental in expanding Persevex’s mission to empower learners across campuses.</p>
+            <p>If you have any questions or need further clarification, feel free to reach out to us at 📧 support@persevex.com.</p>
+            <p>We look forward to seeing your contributions and success in this role.</p>
+            <p>📣 Feel free to share this exciting opportunity on LinkedIn by posting about your new role, tagging @Persevex and using hashtags such as #Persevex #CampusAmbassador #Leadership #StudentOpportunity #EmpoweringLearners.</p>
+            <br>
+            <p>Best regards,<br>
+            Team Persevex<br>
+            📧 support@persevex.com<br>
+            🌐 www.persevex.com</p>
+        </body>
+        </html>
+        """
+
+INTERNSHIP_ACCEPTANCE_BODY = """
+        <html>
+        <body>
+            <p>Dear {recipient_name},</p>
+            <p>Congratulations once again!<br>
+            Please find attached your official internship acceptance letter for the <b>{domain} Intern</b> role at Persevex.</p>
+            <p>We’re excited to have you onboard and look forward to your contributions during this internship.</p>
+            <p>If you’re comfortable, we’d love for you to share this opportunity and your experience on LinkedIn by tagging @Persevex and helping others know about us.</p>
+            <br>
+            <p>Best regards,<br>
+            Shanmukh Shekar K C<br>
+            Administrator<br>
+            📧 support@persevex.com</p>
+        </body>
+        </html>
+        """
+
+OFFER_LETTER_BODY = """
+                <html>
+                <body style="font-family: Arial, sans-serif; line-height: 1.6;">
+                    <p>Dear {recipient_name},</p>
+                    <p>Greetings from Persevex Education Consultancy LLP!</p>
+                    <p>Congratulations once again! Please find attached your official Offer Letter for the position of <b>Business Development Associate</b> at Persevex.</p>
+                    <p>To proceed with your onboarding, kindly complete the following steps within <b>two working days</b>:</p>
+                    <ol>
+                        <li>Review and sign the offer letter (a digital or scanned signature is acceptable).</li>
+                        <li>Email the signed offer letter along with scanned copies of the following documents:
+                            <ul>
+                                <li>Academic certificates: Graduation (if applicable)</li>
+                                <li>A recent passport-sized photograph</li>
+                                <li>A government-issued ID (Aadhaar / Voter ID / Driving License)</li>
+                                <li>PAN Card and Bank Account details (Account Number and IFSC Code)</li>
+                            </ul>
+                        </li>
+                    </ol>
+                    <p>Please reply to this email with all the required documents attached.</p>
+                    <p><b><u>Office Location:</u></b><br>
+                    Persevex LLP<br>
+                    5A, 1st A Cross Road, Dollar Scheme Colony,<br>
+                    1st Stage, BTM Layout, Bengaluru, Karnataka – 560068</p>
+                    <p>We are thrilled to have you onboard and look forward to your contributions to the team.</p>
+                    <br>
+                    <p>Warm regards,<br>
+                    Bhumika Vijay Shinde<br>
+                    Persevex LLP</p>
+                </body>
+                </html>
+                """
+
+DEFAULT_BODY = """<p>Dear {recipient_name},</p><p>Please find your document attached.</p>"""
+
+
+class CompiledTemplate:
+    """A str.format-style template split into literal chunks and field names once, up front."""
+
+    def __init__(self, text: str):
+        self.text = text
+        self._parts = [(literal, field) for literal, field, _, _ in string.Formatter().parse(text)]
+
+    def render(self, **fields) -> str:
+        pieces = []
+        for literal, field in self._parts:
+            pieces.append(literal)
+            if field is not None:
+                pieces.append(str(fields[field]))
+        return "".join(pieces)
+
+
+class EmailTemplate:
+    """The subject and HTML body for one letter type. Bodies use the fields {recipient_name} and {domain}."""
+
+    def __init__(self, subject: str, body: str):
+        self.subject = CompiledTemplate(subject)
+        self.body = CompiledTemplate(body)
+
+    def render(self, recipient_name: str, domain: str) -> tuple[str, str]:
+        """Returns (subject, html_body) for one recipient."""
+        return (self.subject.render(recipient_name=recipient_name, domain=domain),
+                self.body.render(recipient_name=recipient_name, domain=domain))
+
+
+TEMPLATES = {
+    "campus ambassador": EmailTemplate("Appointment Letter – Campus Ambassador at Persevex", CAMPUS_AMBASSADOR_BODY),
+    "internship acceptance": EmailTemplate("Internship Acceptance Letter at Persevex", INTERNSHIP_ACCEPTANCE_BODY),
+    "offer letter": EmailTemplate("Offer Letter for the position of Business Development Associate at Persevex.",
+                                  OFFER_LETTER_BODY),
+}
+DEFAULT_TEMPLATE = EmailTemplate("A Letter from Persevex", DEFAULT_BODY)
+# The bot's own spellings ("Campus Ambassador", ...) resolve without lower-casing on every send
+_LOOKUP = {**TEMPLATES, **{key.title(): template for key, template in TEMPLATES.items()}}
+
+
+def get_template(letter_type: str) -> EmailTemplate:
+    """Returns the template for a letter type (any capitalisation), or the generic one."""
+    template = _LOOKUP.get(letter_type)
+    if template is None:
+        template = TEMPLATES.get(letter_type.lower(), DEFAULT_TEMPLATE)
+    return template
+
+
+# Stand-ins for the per-recipient parts while the skeleton is serialized
+_TO_SLOT = "to-slot@skeleton.invalid"
+_HTML_SLOT = "HTMLSLOT"
+_PDF_SLOT = "PDFSLOT"
+
+
+class MessageSkeleton:
+    """
+    A letter email for one letter type and sender, pre-serialized with CRLF line endings.
+    render() fills in the recipient, the HTML body and the PDF and returns the bytes for SMTP.
+    """
+
+    def __init__(self, letter_type: str, sender_email: str):
+        self.template = get_template(letter_type)
+        # Both parts are base64, so no content can collide with a fixed boundary
+        boundary = f"===============persevex-{uuid.uuid4().hex}=="
+        msg = MIMEMultipart(boundary=boundary)
+        msg["From"] = sender_email
+        msg["To"] = _TO_SLOT
+        # The subject has no per-recipient fields, so it is encoded once here
+        msg["Subject"] = self.template.subject.render(recipient_name="", domain="")
+        html_part = MIMENonMultipart("text", "html", charset="utf-8")
+        html_part["Content-Transfer-Encoding"] = "base64"
+        html_part.set_payload(_HTML_SLOT)
+        msg.attach(html_part)
+        pdf_part = MIMENonMultipart("application", "pdf")
+        pdf_part["Content-Transfer-Encoding"] = "base64"
+        pdf_part.add_header("Content-Disposition", "attachment", filename=f"{letter_type.replace(' ', '_')}.pdf")
+        pdf_part.set_payload(_PDF_SLOT)
+        msg.attach(pdf_part)
+
+        buffer = BytesIO()
+        BytesGenerator(buffer, policy=compat32.clone(linesep="\r\n")).flatten(msg)
+        head, rest = buffer.getvalue().split(_TO_SLOT.encode(), 1)
+        middle, rest = rest.split(_HTML_SLOT.encode(), 1)
+        between, tail = rest.split(_PDF_SLOT.encode(), 1)
+        # The base64 blocks end with their own CRLF
+        self._chunks = (head, middle, between.removeprefix(b"\r\n"), tail.removeprefix(b"\r\n"))
+
+    def render(self, recipient_email: str, recipient_name: str, domain: str, pdf_bytes: bytes) -> bytes:
+        head, middle, between, tail = self._chunks
+        html = self.template.body.render(recipient_name=recipient_name, domain=domain)
+        return b"".join((
+            head, encode_address(recipient_email).encode("ascii"), middle,
+            _base64_lines(html.encode("utf-8")), between,
+            _base64_lines(pdf_bytes), tail,
+        ))
+
+
+def encode_address(address: str) -> str:
+    """
+    Validates an email address and returns it in the ASCII form used in headers and the SMTP
+    envelope: parsed and re-quoted by email.headerregistry, with the domain IDNA-encoded.
+    Raises ValueError for malformed addresses, CR/LF, or a non-ASCII local part, which would
+    need SMTPUTF8.
+    """
+    if "\r" in address or "\n" in address:
+        raise ValueError(f"Invalid email address {address!r}: contains a line break.")
+    address = address.strip()
+    if not address.rpartition("@")[2]:
+        # Caught here because the header parser fails on it with an IndexError
+        raise ValueError(f"Invalid email address {address!r}: missing domain.")
+    try:
+        parsed = Address(addr_spec=address)
+        return str(Address(username=parsed.username, domain=parsed.domain.encode("idna").decode("ascii")))
+    except (ValueError, HeaderParseError, UnicodeError) as e:
+        raise ValueError(f"Invalid email address {address!r}: {e}") from None
+
+
+def _base64_lines(data: bytes) -> bytes:
+    """Base64 in 76-character lines, each ending in CRLF as SMTP expects."""
+    return base64.encodebytes(data).replace(b"\n", b"\r\n")
+
+
+@lru_cache(maxsize=64)
+def get_skeleton(letter_type: str, sender_email: str) -> MessageSkeleton:
+    return MessageSkeleton(letter_type, sender_email)
@@ -0,0 +1,206 @@
+# expiry_scheduler.py
+
+import asyncio
+import heapq
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+
+def expiry_timestamp(expiry_date: str) -> float:
+    """The moment (Unix time) a subscription with this expiry_date ('YYYY-MM-DD') lapses: that day's local midnight."""
+    return datetime.strptime(expiry_date, "%Y-%m-%d").timestamp()
+
+
+class ExpiryScheduler:
+    """
+    Keeps upcoming subscription expiries in a min-heap and runs on the bot's job queue, waking
+    exactly when the earliest one is due instead of checking dates on every message.
+
+    - `on_expire([(user_id, expiry_date), ...])` is called the moment those subscriptions lapse.
+    - `reminder_lead` seconds before a lapse, the user is queued for a renewal reminder. Queued
+      reminders go out `reminder_batch_size` at a time every `reminder_interval` seconds via
+      `send_reminder(bot, user_id, expiry_date)`, then `on_reminded(user_id, expiry_date)` records
+      them so nobody is reminded twice for the same expiry. A reminder that failed on a network
+      error is not recorded; it is tried again `reminder_retry_delay` seconds later.
+
+    track() and untrack() may be called from any thread; they only take effect on the job queue
+    once start() has been called.
+    """
+
+    def __init__(self, on_expire, reminder_lead: float = 3 * 86400, reminder_batch_size: int = 20,
+                 reminder_interval: float = 1.0, reminder_retry_delay: float = 300):
+        self.on_expire = on_expire
+        self.reminder_lead = reminder_lead
+        self.reminder_batch_size = reminder_batch_size
+        self.reminder_interval = reminder_interval
+        self.reminder_retry_delay = reminder_retry_delay
+        self.send_reminder = None
+        self.on_reminded = None
+
+        # Both heaps hold (due_at, user_id, expiry_date). An entry whose expiry_date is no longer
+        # the user's current one (they renewed, or were untracked) is skipped when it comes up.
+        self._expiries = []
+        self._reminders = []
+        self._current = {}   # user_id -> expiry_date being tracked
+        self._reminded = {}  # user_id -> expiry_date the user was last reminded about
+        self._outbox = deque()  # (user_id, expiry_date) reminders waiting for their batch
+        self._lock = threading.Lock()
+
+        self._job_queue = None
+        self._loop = None
+        self._wake_job = None
+        self._wake_at = None
+        self._sender_job = None
+        self._paused_until = 0.0
+
+    def __len__(self):
+        return len(self._current)
+
+    def track(self, user_id: int, expiry_date: str, reminded_for: str = None) -> float:
+        """
+        Schedules an active subscription's expiry (and its reminder). Returns the expiry as Unix
+        time, so the caller can tell whether it has already passed. Re-tracking a user replaces
+        their previous expiry.
+        """
+        expires_at = expiry_timestamp(expiry_date)
+        with self._lock:
+            if reminded_for is not None:
+                self._reminded[user_id] = reminded_for
+            if self._current.get(user_id) == expiry_date:
+                return expires_at
+            self._current[user_id] = expiry_date
+            heapq.heappush(self._expiries, (expires_at, user_id, expiry_date))
+            if self._reminded.get(user_id) != expiry_date:
+                heapq.heappush(self._reminders, (expires_at - self.reminder_lead, user_id, expiry_date))
+        self._request_wake()
+        return expires_at
+
+    def untrack(self, user_id: int):
+        """Stops tracking a user (e.g. their status is no longer active). Their heap entries go stale."""
+        with self._lock:
+            self._current.pop(user_id, None)
+
+    # --- Job queue ---
+    def start(self, job_queue, send_reminder, on_reminded=None):
+        """Starts waking on `job_queue` (a telegram.ext.JobQueue). Call this from the running event loop."""
+        self._job_queue = job_queue
+        self._loop = asyncio.get_running_loop()
+        self.send_reminder = send_reminder
+        self.on_reminded = on_reminded
+        self._schedule_wake()
+
+    def stop(self):
+        # After the application stops, its job queue (and every job on it) is already gone
+        if self._job_queue is not None and self._job_queue.scheduler.running:
+            for job in (self._wake_job, self._sender_job):
+                if job is not None:
+                    job.schedule_removal()
+        self._wake_job = self._sender_job = self._wake_at = None
+        self._job_queue = None
+
+    def _request_wake(self):
+        if self._loop is None:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._schedule_wake()
+        elif not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._schedule_wake)
+
+    def _next_due(self):
+        with self._lock:
+            for heap in (self._expiries, self._reminders):
+                while heap and self._current.get(heap[0][1]) != heap[0][2]:
+                    heapq.heappop(heap)
+            candidates = [heap[0][0] for heap in (self._expiries, self._reminders) if heap]
+        return min(candidates) if candidates else None
+
+    def _schedule_wake(self):
+        """(Re)schedules the single wake-up job for the earliest due entry, unless one is already due sooner."""
+        if self._job_queue is None:
+            return
+        due_at = self._next_due()
+        if due_at is None or (self._wake_at is not None and self._wake_at <= due_at):
+            return
+        if self._wake_job is not None:
+            self._wake_job.schedule_removal()
+        self._wake_at = due_at
+        self._wake_job = self._job_queue.run_once(self._wake, when=max(0.0, due_at - time.time()),
+                                                  name="expiry-scheduler")
+
+    async def _wake(self, context):
+        self._wake_job = self._wake_at = None
+        now = time.time()
+        expired = []
+        with self._lock:
+            while self._expiries and self._expiries[0][0] <= now:
+                _, user_id, expiry_date = heapq.heappop(self._expiries)
+                if self._current.get(user_id) == expiry_date:
+                    del self._current[user_id]
+                    expired.append((user_id, expiry_date))
+            while self._reminders and self._reminders[0][0] <= now:
+                _, user_id, expiry_date = heapq.heappop(self._reminders)
+                if self._current.get(user_id) == expiry_date and self._reminded.get(user_id) != expiry_date:
+                    self._reminded[user_id] = expiry_date
+                    self._outbox.append((user_id, expiry_date))
+        if expired:
+            try:
+                self.on_expire(expired)
+            except Exception as e:
+                print(f"[ERROR] Could not expire {len(expired)} subscription(s): {e}")
+        if self._outbox and self._sender_job is None and self.send_reminder is not None:
+            await self._send_batch(context)
+            if self._outbox:
+                self._sender_job = self._job_queue.run_repeating(self._send_batch, interval=self.reminder_interval,
+                                                                 first=self.reminder_interval, name="renewal-reminders")
+        self._schedule_wake()
+
+    async def _send_batch(self, context):
+        if time.time() < self._paused_until:
+            return
+        batch = []
+        with self._lock:
+            while self._outbox and len(batch) < self.reminder_batch_size:
+                user_id, expiry_date = self._outbox.popleft()
+                # Skip users who renewed or lapsed while their reminder was waiting
+                if self._current.get(user_id) == expiry_date:
+                    batch.append((user_id, expiry_date))
+        results = await asyncio.gather(*(self.send_reminder(context.bot, user_id, expiry_date)
+                                         for user_id, expiry_date in batch), return_exceptions=True)
+        throttled, failed = [], []
+        for (user_id, expiry_date), result in zip(batch, results):
+            if isinstance(result, RetryAfter):
+                # Telegram asked us to slow down: try this one again once the wait is over
+                throttled.append((user_id, expiry_date))
+                retry_after = result.retry_after
+                seconds = retry_after.total_seconds() if hasattr(retry_after, "total_seconds") else retry_after
+                self._paused_until = time.time() + seconds
+                continue
+            if isinstance(result, Exception) and not isinstance(result, Forbidden):
+                # Forbidden means the user blocked the bot; there is nobody to retry for.
+                print(f"[ERROR] Renewal reminder to {user_id} failed: {result}")
+                if isinstance(result, NetworkError) and not isinstance(result, BadRequest):
+                    failed.append((user_id, expiry_date))
+                    continue
+            if self.on_reminded is not None:
+                self.on_reminded(user_id, expiry_date)
+        retry_at = time.time() + self.reminder_retry_delay
+        with self._lock:
+            # Back at the front in their original order, ahead of anything queued meanwhile
+            self._outbox.extendleft(reversed(throttled))
+            for user_id, expiry_date in failed:
+                if self._reminded.get(user_id) == expiry_date:
+                    del self._reminded[user_id]
+                heapq.heappush(self._reminders, (retry_at, user_id, expiry_date))
+        if failed:
+            self._schedule_wake()
+        if not self._outbox and self._sender_job is not None:
+            self._sender_job.schedule_removal()
+            self._sender_job = None
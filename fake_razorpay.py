@@ -0,0 +1,76 @@
+# fake_razorpay.py
+"""
+Posts signed Razorpay webhook events to a running bot, for trying out the webhook receiver locally.
+
+    python fake_razorpay.py --user 123456789
+    python fake_razorpay.py --user 123456789 --payment-id pay_test1 --repeat 2   # a redelivery
+    python fake_razorpay.py --user 123456789 --bad-signature                     # should get 401
+
+The secret defaults to RAZORPAY_WEBHOOK_SECRET, the same one the receiver uses.
+"""
+
+import argparse
+import json
+import time
+import uuid
+
+import httpx
+
+from razorpay_handler import SUBSCRIPTION_AMOUNT
+from razorpay_webhook import RAZORPAY_WEBHOOK_SECRET, WEBHOOK_PATH, WEBHOOK_PORT, sign_payload
+
+
+def build_payment_link_paid(user_id: int, payment_id: str = None, amount: int = SUBSCRIPTION_AMOUNT) -> dict:
+    """A payment_link.paid event shaped like the ones Razorpay sends."""
+    payment_id = payment_id or f"pay_{uuid.uuid4().hex[:14]}"
+    link_id = f"plink_{uuid.uuid4().hex[:14]}"
+    now = int(time.time())
+    return {
+        "entity": "event",
+        "account_id": "acc_fake",
+        "event": "payment_link.paid",
+        "contains": ["payment_link", "payment"],
+        "payload": {
+            "payment_link": {"entity": {
+                "id": link_id, "amount": amount, "amount_paid": amount, "currency": "INR", "status": "paid",
+                "notes": {"telegram_user_id": str(user_id)}, "short_url": f"https://rzp.io/i/{link_id[-6:]}",
+            }},
+            "payment": {"entity": {
+                "id": payment_id, "amount": amount, "currency": "INR", "status": "captured",
+                "notes": {"telegram_user_id": str(user_id)}, "created_at": now,
+            }},
+        },
+        "created_at": now,
+    }
+
+
+def post_event(url: str, event: dict, secret: str, bad_signature: bool = False) -> httpx.Response:
+    body = json.dumps(event).encode()
+    signature = sign_payload(body, secret)
+    if bad_signature:
+        signature = signature[::-1]
+    headers = {"Content-Type": "application/json", "X-Razorpay-Signature": signature,
+               "X-Razorpay-Event-Id": f"evt_{uuid.uuid4().hex[:14]}"}
+    return httpx.post(url, content=body, headers=headers, timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send signed fake Razorpay webhooks to the bot.")
+    parser.add_argument("--user", type=int, required=True, help="Telegram user id that paid")
+    parser.add_argument("--payment-id", help="Payment id (random by default)")
+    parser.add_argument("--url", default=f"http://127.0.0.1:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+    parser.add_argument("--secret", default=RAZORPAY_WEBHOOK_SECRET)
+    parser.add_argument("--repeat", type=int, default=1, help="Send the same event this many times")
+    parser.add_argument("--bad-signature", action="store_true")
+    args = parser.parse_args()
+    if not args.secret:
+        parser.error("No secret: pass --secret or set RAZORPAY_WEBHOOK_SECRET.")
+
+    event = build_payment_link_paid(args.user, args.payment_id)
+    for _ in range(args.repeat):
+        response = post_event(args.url, event, args.secret, bad_signature=args.bad_signature)
+        print(f"{response.status_code} {response.text}")
+
+
+if __name__ == "__main__":
+    main()
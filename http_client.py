@@ -0,0 +1,60 @@
+# http_client.py
+
+import os
+import httpx
+
+# Browser-like headers so the Apps Script endpoints don't block the request
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+# --- POOL CONFIGURATION ---
+DEFAULT_TIMEOUT = float(os.getenv('HTTP_TIMEOUT', 15))
+MAX_CONNECTIONS = int(os.getenv('HTTP_MAX_CONNECTIONS', 50))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('HTTP_MAX_KEEPALIVE', 20))
+KEEPALIVE_EXPIRY = float(os.getenv('HTTP_KEEPALIVE_EXPIRY', 60))
+
+_client = None
+_transport = None
+
+
+def _http2_available() -> bool:
+    """HTTP/2 needs the optional 'h2' package; fall back to HTTP/1.1 keep-alive without it."""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def use_transport(transport):
+    """Routes every request through a custom httpx transport (e.g. a MockTransport for local testing)."""
+    global _transport
+    _transport = transport
+
+
+def get_client() -> httpx.AsyncClient:
+    """Returns the shared AsyncClient, creating it on first use."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=_http2_available() and _transport is None,
+            follow_redirects=True,  # Apps Script answers with a redirect to googleusercontent.com
+            headers=DEFAULT_HEADERS,
+            timeout=httpx.Timeout(DEFAULT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=KEEPALIVE_EXPIRY,
+            ),
+            transport=_transport,
+        )
+    return _client
+
+
+async def close_client():
+    """Closes the pooled connections. Call this on shutdown."""
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
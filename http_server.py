@@ -0,0 +1,112 @@
+# http_server.py
+
+import asyncio
+from urllib.parse import urlsplit, parse_qs
+
+# Reason phrases for the status codes the handlers use
+REASONS = {200: "OK", 202: "Accepted", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found",
+           405: "Method Not Allowed", 408: "Request Timeout", 413: "Payload Too Large",
+           500: "Internal Server Error"}
+
+
+class HTTPRequest:
+    def __init__(self, method: str, target: str, headers: dict, body: bytes):
+        parts = urlsplit(target)
+        self.method = method
+        self.path = parts.path
+        self.query = parse_qs(parts.query)
+        self.headers = headers  # Lower-cased names
+        self.body = body
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str = ""):
+        super().__init__(message or REASONS.get(status, ""))
+        self.status = status
+
+
+class AsyncHTTPServer:
+    """
+    A minimal HTTP/1.1 server on asyncio streams, for small internal endpoints
+    (webhooks, metrics) that run inside the bot's event loop without extra dependencies.
+    Handlers are `async handler(request) -> (status, content_type, body_bytes)`.
+    Each connection serves one request and is then closed.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8080, max_body: int = 1024 * 1024,
+                 read_timeout: float = 10):
+        self.host = host
+        self.port = port
+        self.max_body = max_body
+        self.read_timeout = read_timeout
+        self._routes = {}
+        self._server = None
+
+    def route(self, method: str, path: str, handler):
+        self._routes[(method.upper(), path)] = handler
+
+    async def start(self):
+        if self._server is None:
+            self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+            # With port 0 the OS picks a free port; report the real one
+            self.port = self._server.sockets[0].getsockname()[1]
+            print(f"HTTP server listening on {self.host}:{self.port}.")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> HTTPRequest:
+        try:
+            request_line = (await reader.readline()).decode("latin-1").strip()
+            method, target, _version = request_line.split(" ", 2)
+        except ValueError:
+            raise HTTPError(400, "Malformed request line")
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1")
+            if line in ("\r\n", "\n", ""):
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            raise HTTPError(400, "Bad Content-Length")
+        if length > self.max_body:
+            raise HTTPError(413)
+        body = await reader.readexactly(length) if length else b""
+        return HTTPRequest(method.upper(), target, headers, body)
+
+    async def _dispatch(self, request: HTTPRequest) -> tuple:
+        handler = self._routes.get((request.method, request.path))
+        if handler is None:
+            if any(path == request.path for _, path in self._routes):
+                raise HTTPError(405)
+            raise HTTPError(404)
+        return await handler(request)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            try:
+                request = await asyncio.wait_for(self._read_request(reader), self.read_timeout)
+                status, content_type, body = await self._dispatch(request)
+            except HTTPError as e:
+                status, content_type, body = e.status, "text/plain; charset=utf-8", str(e).encode()
+            except (asyncio.TimeoutError, asyncio.IncompleteReadError):
+                status, content_type, body = 408, "text/plain; charset=utf-8", b"Request Timeout"
+            except Exception as e:
+                print(f"[ERROR] HTTP handler failed: {e}")
+                status, content_type, body = 500, "text/plain; charset=utf-8", b"Internal Server Error"
+            head = (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Length: {len(body)}\r\n"
+                    "Connection: close\r\n\r\n")
+            writer.write(head.encode("latin-1") + body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
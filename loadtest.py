@@ -0,0 +1,556 @@
+# loadtest.py
+"""
+Simulated-user load test for the bot's conversation flows.
+
+Drives the real ConversationHandler built by telegram_bot.build_application() with synthetic
+users. Every external service is replaced by a local stand-in with configurable latency:
+- the Telegram Bot API, with fake Updates in and recorded API calls out;
+- the Apps Script endpoints, through an httpx MockTransport;
+- Razorpay, through a fake requests session;
+- SMTP, through smtp_sink.
+Rendering runs for real in the render worker processes.
+
+    python loadtest.py --flows 500 --concurrency 100
+    python loadtest.py --ramp 10,25,50,100,200 --flows-per-user 2      # find the saturation point
+    python loadtest.py --flows 300 --record trace.jsonl                 # save the arrivals...
+    python loadtest.py --replay trace.jsonl --speed 2                   # ...and replay them at 2x
+
+A flow is timed from the user's first message until its outcome: the "Success" edit after
+the email went out for CA / Intern / Offer, or the payment button for the paywall.
+"""
+
+import argparse
+import asyncio
+import atexit
+import contextlib
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# Keep the run away from the real database, cache file, metrics port, webhook and mailboxes. Render
+# workers re-import this file, and they must share the parent's scratch folder.
+_ORIGINAL_CWD = os.getcwd()
+if multiprocessing.parent_process() is None:
+    _WORKDIR = tempfile.mkdtemp(prefix="letter-loadtest-")
+    atexit.register(shutil.rmtree, _WORKDIR, ignore_errors=True)
+    os.environ.update({
+        "DATABASE_FILE": os.path.join(_WORKDIR, "loadtest.db"),
+        "GOOGLE_SCRIPT_URL": "https://script.fake/exec",
+        "CLIENT_SCRIPT_URL": "https://client-script.fake/exec",
+        "METRICS_PORT": "0",
+        "RAZORPAY_WEBHOOK_SECRET": "",
+        "DEFAULT_EMAIL": "letters@loadtest.invalid",
+        "HR_EMAIL": "hr@loadtest.invalid",
+    })
+    os.chdir(_WORKDIR)
+
+import httpx  # noqa: E402
+import razorpay  # noqa: E402
+import requests  # noqa: E402
+from telegram import Update  # noqa: E402
+from telegram.request import BaseRequest  # noqa: E402
+
+import database_handler  # noqa: E402
+import email_sender  # noqa: E402
+import http_client  # noqa: E402
+import razorpay_handler  # noqa: E402
+import telegram_bot  # noqa: E402
+from delivery import DeliveryService  # noqa: E402
+from render_service import RenderService  # noqa: E402
+from smtp_pool import SMTPConnectionPool  # noqa: E402
+from smtp_sink import SMTPSink  # noqa: E402
+
+FLOWS = ("ca", "intern", "offer", "paywall")
+DEFAULT_MIX = "ca=0.3,intern=0.3,offer=0.3,paywall=0.1"
+# Students in the fake onboarding sheet, used by the Intern flow
+STUDENT_COUNT = 500
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Letter Bot", "username": "letter_bot"}
+
+
+class Latency:
+    """Injected delays in seconds. Each delay varies by up to +/- `jitter` (a fraction) per call."""
+
+    def __init__(self, telegram: float = 0.05, sheet: float = 0.3, razorpay_api: float = 0.4,
+                 smtp_login: float = 0.3, smtp_send: float = 0.2, jitter: float = 0.5):
+        self.telegram = telegram
+        self.sheet = sheet
+        self.razorpay_api = razorpay_api
+        self.smtp_login = smtp_login
+        self.smtp_send = smtp_send
+        self.jitter = jitter
+
+    def sample(self, base: float) -> float:
+        return max(0.0, base * (1 + random.uniform(-self.jitter, self.jitter)))
+
+
+# --- TELEGRAM BOT API STAND-IN ---
+class FakeBotAPI(BaseRequest):
+    """
+    Answers the bot's Bot API calls locally and records them per chat, so simulated users
+    can wait for the replies they expect.
+    """
+
+    def __init__(self, latency: Latency):
+        self.latency = latency
+        self.calls = 0
+        self._message_ids = itertools.count(1000)
+        self._logs = {}    # chat_id -> [(method, params, message)]
+        self._events = {}  # chat_id -> asyncio.Event, set whenever the chat gets a new call
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_request(self, url: str, method: str, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None) -> tuple[int, bytes]:
+        await asyncio.sleep(self.latency.sample(self.latency.telegram))
+        self.calls += 1
+        api_method = url.rsplit("/", 1)[-1]
+        params = request_data.parameters if request_data is not None else {}
+        result = self._handle(api_method, params)
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+    def _handle(self, api_method: str, params: dict):
+        if api_method == "getMe":
+            return dict(BOT_USER, can_join_groups=False, can_read_all_group_messages=False,
+                        supports_inline_queries=False)
+        if api_method in ("sendMessage", "sendPhoto", "editMessageText"):
+            chat_id = int(params["chat_id"])
+            message = {
+                "message_id": int(params.get("message_id") or next(self._message_ids)),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "from": BOT_USER,
+            }
+            if "text" in params:
+                message["text"] = params["text"]
+            if api_method == "sendPhoto":
+                message["photo"] = [{"file_id": "photo", "file_unique_id": "photo", "width": 1, "height": 1}]
+            if isinstance(params.get("reply_markup"), dict) and "inline_keyboard" in params["reply_markup"]:
+                message["reply_markup"] = params["reply_markup"]
+            self._logs.setdefault(chat_id, []).append((api_method, params, message))
+            self._events.setdefault(chat_id, asyncio.Event()).set()
+            return message
+        return True  # answerCallbackQuery and anything else the flows don't inspect
+
+    async def wait_for(self, chat_id: int, start: int, predicate, timeout: float) -> tuple[int, dict]:
+        """Waits for a call to `chat_id` at or after index `start` that matches. Returns (index, message)."""
+        deadline = time.monotonic() + timeout
+        event = self._events.setdefault(chat_id, asyncio.Event())
+        while True:
+            log = self._logs.get(chat_id, [])
+            for index in range(start, len(log)):
+                api_method, params, message = log[index]
+                if predicate(api_method, message):
+                    return index + 1, message
+            start = len(log)
+            event.clear()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise asyncio.TimeoutError
+            try:
+                await asyncio.wait_for(event.wait(), remaining)
+            except asyncio.TimeoutError:
+                raise asyncio.TimeoutError from None
+
+    def forget(self, chat_id: int):
+        self._logs.pop(chat_id, None)
+        self._events.pop(chat_id, None)
+
+
+def text_contains(*fragments):
+    def predicate(api_method, message):
+        return api_method in ("sendMessage", "editMessageText") and any(f in message.get("text", "") for f in fragments)
+    return predicate
+
+
+def keyboard_with(callback_data: str):
+    def predicate(api_method, message):
+        rows = message.get("reply_markup", {}).get("inline_keyboard", [])
+        return any(button.get("callback_data") == callback_data for row in rows for button in row)
+    return predicate
+
+
+# --- APPS SCRIPT, RAZORPAY AND SMTP STAND-INS ---
+def make_sheet_transport(latency: Latency, unpaid_users: set) -> httpx.MockTransport:
+    """The user sheet and the client's onboarding sheet. Users in `unpaid_users` are unknown to the sheet."""
+    students = [{"name": f"Intern {i}", "email": f"intern{i}@example.com", "month": "July",
+                 "domain": "Data Science"} for i in range(STUDENT_COUNT)]
+    by_name = {student["name"].lower(): student for student in students}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(latency.sample(latency.sheet))
+        params = request.url.params
+        action = params.get("action")
+        if action == "getUserStatus":
+            if int(params["user_id"]) in unpaid_users:
+                return httpx.Response(200, json={"status": "not_found"})
+            return httpx.Response(200, json={"status": "success",
+                                             "data": {"status": "active", "expiry_date": "2099-12-31"}})
+        if action == "listStudents":
+            return httpx.Response(200, json={"status": "success", "students": students,
+                                             "server_time": datetime.now().isoformat()})
+        if action == "findStudent":
+            student = by_name.get(params.get("name", "").lower())
+            if student:
+                return httpx.Response(200, json=dict(student, status="success"))
+            return httpx.Response(200, json={"status": "not_found", "message": "Student not found"})
+        return httpx.Response(200, json={"status": "error", "message": f"Unknown action {action}"})
+
+    return httpx.MockTransport(handler)
+
+
+class _FakeRazorpayResponse:
+    status_code = 200
+
+    def __init__(self, body: dict):
+        self._body = body
+
+    def json(self):
+        return self._body
+
+
+class FakeRazorpaySession(requests.Session):
+    """Stands in for the Razorpay API behind razorpay.Client: creating a payment link just takes a while."""
+
+    def __init__(self, latency: Latency):
+        super().__init__()
+        self.latency = latency
+        self._ids = itertools.count(1)
+
+    def post(self, url, data=None, **kwargs):
+        time.sleep(self.latency.sample(self.latency.razorpay_api))
+        link = json.loads(data) if isinstance(data, str) else dict(data or {})
+        link_id = f"plink_fake{next(self._ids)}"
+        return _FakeRazorpayResponse(dict(link, id=link_id, short_url=f"https://rzp.io/i/{link_id}", status="created"))
+
+
+# --- SIMULATED USERS ---
+class Simulator:
+    """Plays users through the conversation flows against the running application."""
+
+    def __init__(self, application, api: FakeBotAPI, unpaid_users: set, step_timeout: float = 120):
+        self.application = application
+        self.api = api
+        self.unpaid_users = unpaid_users
+        self.step_timeout = step_timeout
+        self._update_ids = itertools.count(1)
+
+    def _user(self, user_id: int) -> dict:
+        return {"id": user_id, "is_bot": False, "first_name": "Sim", "last_name": f"User {user_id}",
+                "username": f"sim{user_id}"}
+
+    async def _send_text(self, user_id: int, text: str):
+        message = {"message_id": next(self._update_ids), "date": int(time.time()),
+                   "chat": {"id": user_id, "type": "private"}, "from": self._user(user_id), "text": text}
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        await self._put({"update_id": next(self._update_ids), "message": message})
+
+    async def _press(self, user_id: int, message: dict, data: str):
+        query = {"id": str(next(self._update_ids)), "from": self._user(user_id), "chat_instance": str(user_id),
+                 "data": data, "message": message}
+        await self._put({"update_id": next(self._update_ids), "callback_query": query})
+
+    async def _put(self, data: dict):
+        await self.application.update_queue.put(Update.de_json(data, self.application.bot))
+
+    async def run_flow(self, user_id: int, flow: str) -> dict:
+        """Plays one flow. Returns {flow, user_id, ok, seconds, failed_step}."""
+        if flow == "paywall":
+            self.unpaid_users.add(user_id)
+        cursor = 0
+        step = "start"
+
+        async def expect(predicate, step_name):
+            nonlocal cursor, step
+            step = step_name
+            cursor, message = await self.api.wait_for(user_id, cursor, predicate, self.step_timeout)
+            return message
+
+        started = time.perf_counter()
+        try:
+            if flow == "ca":
+                await self._send_text(user_id, "Campus Ambassador Letter")
+                await expect(text_contains("full name"), "ask_name")
+                await self._send_text(user_id, f"Sim User {user_id}")
+                await expect(text_contains("email address"), "ask_email")
+                await self._send_text(user_id, f"sim{user_id}@example.com")
+                confirm = await expect(keyboard_with("send_ca"), "preview")
+                await self._press(user_id, confirm, "send_ca")
+            elif flow == "intern":
+                await self._send_text(user_id, "Internship Acceptance Letter")
+                await expect(text_contains("intern's full name"), "ask_name")
+                await self._send_text(user_id, f"Intern {random.randrange(STUDENT_COUNT)}")
+                confirm = await expect(keyboard_with("send_intern"), "preview")
+                await self._press(user_id, confirm, "send_intern")
+            elif flow == "offer":
+                await self._send_text(user_id, "Offer Letter")
+                await expect(text_contains("full name"), "ask_name")
+                await self._send_text(user_id, f"Sim User {user_id}")
+                await expect(text_contains("email address"), "ask_email")
+                await self._send_text(user_id, f"sim{user_id}@example.com")
+                await expect(text_contains("training start date"), "ask_date")
+                await self._send_text(user_id, "01-08-2026")
+                confirm = await expect(keyboard_with("send_offer"), "preview")
+                await self._press(user_id, confirm, "send_offer")
+            elif flow == "paywall":
+                await self._send_text(user_id, "/start")
+                await expect(keyboard_with("check_payment_status"), "paywall")
+            else:
+                raise ValueError(f"Unknown flow '{flow}'")
+
+            if flow != "paywall":
+                outcome = await expect(text_contains("Success!", "Failure!", "error"), "delivery")
+                if "Success!" not in outcome.get("text", ""):
+                    return {"flow": flow, "user_id": user_id, "ok": False,
+                            "seconds": time.perf_counter() - started, "failed_step": "delivery"}
+            return {"flow": flow, "user_id": user_id, "ok": True, "seconds": time.perf_counter() - started,
+                    "failed_step": None}
+        except asyncio.TimeoutError:
+            return {"flow": flow, "user_id": user_id, "ok": False, "seconds": time.perf_counter() - started,
+                    "failed_step": step}
+        finally:
+            self.api.forget(user_id)
+
+
+# --- LOAD PATTERNS ---
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for part in text.split(","):
+        flow, _, weight = part.partition("=")
+        if flow.strip() not in FLOWS:
+            raise ValueError(f"Unknown flow '{flow}' in --mix (choose from {', '.join(FLOWS)})")
+        mix[flow.strip()] = float(weight)
+    return mix
+
+
+async def run_closed_loop(simulator: Simulator, concurrency: int, total_flows: int, mix: dict,
+                          user_ids) -> tuple[list, list, float]:
+    """`concurrency` users at a time, each starting a new flow as soon as the last one ends."""
+    flows, weights = list(mix), list(mix.values())
+    remaining = itertools.count()
+    results, arrivals = [], []
+    started = time.perf_counter()
+
+    async def virtual_user():
+        while next(remaining) < total_flows:
+            user_id, flow = next(user_ids), random.choices(flows, weights)[0]
+            arrivals.append({"t": round(time.perf_counter() - started, 4), "user_id": user_id, "flow": flow})
+            results.append(await simulator.run_flow(user_id, flow))
+
+    await asyncio.gather(*(virtual_user() for _ in range(concurrency)))
+    return results, arrivals, time.perf_counter() - started
+
+
+async def run_trace(simulator: Simulator, events: list, speed: float = 1.0) -> tuple[list, float]:
+    """Starts each recorded flow at its original offset (divided by `speed`), however busy the bot is."""
+    started = time.perf_counter()
+
+    async def replay(event):
+        delay = event["t"] / speed - (time.perf_counter() - started)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return await simulator.run_flow(int(event["user_id"]), event["flow"])
+
+    results = await asyncio.gather(*(replay(event) for event in sorted(events, key=lambda e: e["t"])))
+    return list(results), time.perf_counter() - started
+
+
+# --- REPORTING ---
+def percentile(sorted_values: list, fraction: float) -> float:
+    if not sorted_values:
+        return float("nan")
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def summarize(results: list, elapsed: float) -> dict:
+    summary = {"elapsed": elapsed, "flows": len(results), "ok": sum(r["ok"] for r in results),
+               "throughput": sum(r["ok"] for r in results) / elapsed if elapsed else 0.0, "per_flow": {}}
+    for flow in FLOWS + ("all",):
+        selected = [r for r in results if flow == "all" or r["flow"] == flow]
+        if not selected:
+            continue
+        times = sorted(r["seconds"] for r in selected if r["ok"])
+        failed_steps = {}
+        for r in selected:
+            if not r["ok"]:
+                failed_steps[r["failed_step"]] = failed_steps.get(r["failed_step"], 0) + 1
+        summary["per_flow"][flow] = {
+            "count": len(selected), "ok": len(times), "failed_steps": failed_steps,
+            "p50": percentile(times, 0.50), "p95": percentile(times, 0.95), "p99": percentile(times, 0.99),
+        }
+    return summary
+
+
+def print_summary(summary: dict, out):
+    print(f"{summary['flows']} flows in {summary['elapsed']:.1f}s, {summary['ok']} ok, "
+          f"{summary['throughput']:.2f} flows/s", file=out)
+    print(f"{'flow':<10}{'count':>7}{'ok':>7}{'p50':>9}{'p95':>9}{'p99':>9}  failures", file=out)
+    for flow, stats in summary["per_flow"].items():
+        failures = ", ".join(f"{step}: {count}" for step, count in stats["failed_steps"].items()) or "-"
+        print(f"{flow:<10}{stats['count']:>7}{stats['ok']:>7}{stats['p50']:>8.2f}s{stats['p95']:>8.2f}s"
+              f"{stats['p99']:>8.2f}s  {failures}", file=out)
+
+
+def find_saturation(levels: list, min_efficiency: float = 0.25):
+    """
+    Where the bot saturates: the first (previous, current) pair of concurrency levels where
+    throughput grew by less than `min_efficiency` times the relative growth in users. Past that
+    point extra users mostly wait in queues. `levels` is [(concurrency, summary)].
+    """
+    for (previous_users, previous), (users, current) in zip(levels, levels[1:]):
+        user_growth = users / previous_users - 1
+        throughput_growth = current["throughput"] / previous["throughput"] - 1 if previous["throughput"] else 0.0
+        if user_growth > 0 and throughput_growth < min_efficiency * user_growth:
+            return previous_users, users
+    return None
+
+
+# --- HARNESS ---
+@contextlib.asynccontextmanager
+async def running_bot(latency: Latency, unpaid_users: set, render_workers: int, email_workers: int):
+    """Starts the real application wired to the local stand-ins, and tears everything down afterwards."""
+    http_client.use_transport(make_sheet_transport(latency, unpaid_users))
+    razorpay_handler.use_client(razorpay.Client(session=FakeRazorpaySession(latency), auth=("rzp_fake", "fake")))
+    database_handler._sheet_sync.send_batch = lambda operations: time.sleep(latency.sample(latency.sheet)) or True
+    sink = SMTPSink(login_delay=latency.smtp_login, send_delay=latency.smtp_send).start()
+    host, port = sink.address
+    for account in ("default", "hr"):
+        sender_email, _ = email_sender._get_sender_credentials(account)
+        email_sender.use_pool(account, SMTPConnectionPool(host, port, sender_email, "secret",
+                                                          size=email_workers, use_starttls=False))
+    telegram_bot.email_delivery = DeliveryService(workers=email_workers)
+    telegram_bot.render_service = RenderService(workers=render_workers, max_pending=10_000)
+
+    api = FakeBotAPI(latency)
+    application = telegram_bot.build_application(token="123456:LOADTEST", request=api)
+    await application.initialize()
+    await application.post_init(application)
+    await application.start()
+    try:
+        yield application, api
+    finally:
+        await application.stop()
+        await application.post_shutdown(application)
+        await application.shutdown()
+        sink.stop()
+
+
+async def main_async(args, out) -> int:
+    latency = Latency(args.telegram_latency, args.sheet_latency, args.razorpay_latency, args.smtp_login_latency,
+                      args.smtp_send_latency, args.jitter)
+    mix = parse_mix(args.mix)
+    unpaid_users = set()
+    user_ids = itertools.count(args.first_user_id)
+    report = {"config": vars(args), "runs": []}
+
+    async with running_bot(latency, unpaid_users, args.render_workers, args.email_workers) as (application, api):
+        simulator = Simulator(application, api, unpaid_users, step_timeout=args.step_timeout)
+        if args.replay:
+            with open(args.replay) as f:
+                events = [json.loads(line) for line in f if line.strip()]
+            results, elapsed = await run_trace(simulator, events, args.speed)
+            summary = summarize(results, elapsed)
+            print(f"Replayed {len(events)} flows from {args.replay} at {args.speed}x", file=out)
+            print_summary(summary, out)
+            report["runs"].append({"replay": args.replay, "summary": summary})
+        elif args.ramp:
+            levels = []
+            for concurrency in [int(level) for level in args.ramp.split(",")]:
+                results, _, elapsed = await run_closed_loop(
+                    simulator, concurrency, concurrency * args.flows_per_user, mix, user_ids)
+                summary = summarize(results, elapsed)
+                levels.append((concurrency, summary))
+                print(f"--- concurrency {concurrency} ---", file=out)
+                print_summary(summary, out)
+                report["runs"].append({"concurrency": concurrency, "summary": summary})
+            saturation = find_saturation(levels)
+            print("------------------------------------------------------", file=out)
+            print(f"{'users':>7}{'flows/s':>10}{'p95 (all)':>11}", file=out)
+            for concurrency, summary in levels:
+                print(f"{concurrency:>7}{summary['throughput']:>10.2f}{summary['per_flow']['all']['p95']:>10.2f}s",
+                      file=out)
+            if saturation is None:
+                print("No saturation within the tested levels; try higher ones.", file=out)
+            else:
+                print(f"Saturates between {saturation[0]} and {saturation[1]} concurrent users: "
+                      f"throughput barely grew while latency did.", file=out)
+            report["saturation"] = saturation
+        else:
+            results, arrivals, elapsed = await run_closed_loop(simulator, args.concurrency, args.flows, mix, user_ids)
+            summary = summarize(results, elapsed)
+            print_summary(summary, out)
+            report["runs"].append({"concurrency": args.concurrency, "summary": summary})
+            if args.record:
+                with open(args.record, "w") as f:
+                    for arrival in arrivals:
+                        f.write(json.dumps(arrival) + "\n")
+                print(f"Recorded {len(arrivals)} arrivals to {args.record}", file=out)
+        print(f"Bot API calls answered: {api.calls}", file=out)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+        print(f"Saved the report to {args.save}", file=out)
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Load test the bot's conversation flows with simulated users.")
+    load = parser.add_argument_group("load")
+    load.add_argument("--flows", type=int, default=200, help="Flows to run in total (default 200)")
+    load.add_argument("--concurrency", type=int, default=50, help="Users active at the same time (default 50)")
+    load.add_argument("--mix", default=DEFAULT_MIX, help=f"Flow weights (default {DEFAULT_MIX})")
+    load.add_argument("--ramp", help="Comma-separated concurrency levels to step through, e.g. 10,50,100")
+    load.add_argument("--flows-per-user", type=int, default=2, help="Flows per user at each --ramp level")
+    load.add_argument("--replay", help="Replay the arrivals in this JSONL trace instead of generating load")
+    load.add_argument("--speed", type=float, default=1.0, help="Replay speed-up factor")
+    load.add_argument("--record", help="Save this run's arrivals as a JSONL trace")
+    load.add_argument("--first-user-id", type=int, default=10_000_000)
+    load.add_argument("--step-timeout", type=float, default=120, help="Seconds to wait for each bot reply")
+
+    delays = parser.add_argument_group("injected latency (seconds)")
+    delays.add_argument("--telegram-latency", type=float, default=0.05)
+    delays.add_argument("--sheet-latency", type=float, default=0.3)
+    delays.add_argument("--razorpay-latency", type=float, default=0.4)
+    delays.add_argument("--smtp-login-latency", type=float, default=0.3)
+    delays.add_argument("--smtp-send-latency", type=float, default=0.2)
+    delays.add_argument("--jitter", type=float, default=0.5, help="Random +/- fraction applied to every delay")
+
+    bot = parser.add_argument_group("bot")
+    bot.add_argument("--render-workers", type=int, default=None, help="Render processes (default: one per core)")
+    bot.add_argument("--email-workers", type=int, default=8)
+    parser.add_argument("--save", help="Write the full report as JSON")
+    parser.add_argument("--verbose", action="store_true", help="Show the bot's own output")
+    args = parser.parse_args(argv)
+
+    # Paths on the command line are relative to where the command was run, not the scratch folder.
+    for name in ("replay", "record", "save"):
+        if getattr(args, name):
+            setattr(args, name, os.path.join(_ORIGINAL_CWD, getattr(args, name)))
+
+    out = sys.stdout
+    with contextlib.ExitStack() as stack:
+        if not args.verbose:
+            devnull = stack.enter_context(open(os.devnull, "w"))
+            stack.enter_context(contextlib.redirect_stdout(devnull))
+        return asyncio.run(main_async(args, out))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
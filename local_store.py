@@ -0,0 +1,522 @@
+# local_store.py
+
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+# The SQLite file that holds subscriptions, the activity log and the sync outbox
+DATABASE_FILE = 'bot_database.db'
+
+SCHEMA = [
+    # --- Users table ---
+    # This is where we store subscription and trial info
+    '''
+    CREATE TABLE IF NOT EXISTS users (
+        user_id INTEGER PRIMARY KEY,
+        username TEXT,
+        trial_start_date TEXT,
+        subscription_status TEXT NOT NULL,
+        subscription_expiry_date TEXT NOT NULL,
+        razorpay_subscription_id TEXT
+    );
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_users_expiry ON users (subscription_expiry_date);',
+
+    # --- Activity Log table ---
+    # The local copy of the live dashboard log
+    '''
+    CREATE TABLE IF NOT EXISTS activity_log (
+        log_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp TEXT NOT NULL,
+        letter_type TEXT,
+        recipient_name TEXT,
+        recipient_email TEXT,
+        sent_by TEXT,
+        status TEXT NOT NULL
+    );
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_activity_timestamp ON activity_log (timestamp);',
+
+    # --- Client Students table ---
+    # This is for the "Internship Acceptance" flow. The client's onboarding sheet
+    # is mirrored here by client_directory so name lookups never leave the process.
+    '''
+    CREATE TABLE IF NOT EXISTS client_students (
+        student_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL UNIQUE,
+        email TEXT,
+        month TEXT,
+        domain TEXT
+    );
+    ''',
+
+    # --- Sync State table ---
+    # Small key/value store for sync cursors (e.g. the last client sheet change we pulled)
+    '''
+    CREATE TABLE IF NOT EXISTS sync_state (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    );
+    ''',
+
+    # --- Sync Outbox table ---
+    # Every local write that must be replicated to the Google Sheet is queued here
+    # and sent in batches by the background sync, so the Sheet is never on the request path.
+    '''
+    CREATE TABLE IF NOT EXISTS sync_outbox (
+        op_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        action TEXT NOT NULL,
+        user_id INTEGER,
+        payload TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        created_at TEXT NOT NULL
+    );
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_outbox_user ON sync_outbox (user_id);',
+
+    # --- Sync Dead Letter table ---
+    # Outbox operations the Sheet kept failing on, moved aside so the ones behind them can sync
+    '''
+    CREATE TABLE IF NOT EXISTS sync_dead_letter (
+        op_id INTEGER PRIMARY KEY,
+        action TEXT NOT NULL,
+        user_id INTEGER,
+        payload TEXT NOT NULL,
+        attempts INTEGER NOT NULL,
+        created_at TEXT NOT NULL,
+        failed_at TEXT NOT NULL,
+        error TEXT
+    );
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_dead_letter_user ON sync_dead_letter (user_id);',
+
+    # --- Processed Payments table ---
+    # Razorpay payments already turned into access, so a redelivered webhook can't extend it twice
+    '''
+    CREATE TABLE IF NOT EXISTS processed_payments (
+        payment_id TEXT PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        processed_at TEXT NOT NULL
+    );
+    ''',
+]
+
+# Columns added after the original schema: (table, column, definition)
+MIGRATIONS = [
+    ('client_students', 'updated_at', 'TEXT'),
+    # When the status was last confirmed by the Sheet or written locally (Unix time)
+    ('users', 'checked_at', 'REAL'),
+    # The expiry date the user was last sent a renewal reminder for
+    ('users', 'reminded_for', 'TEXT'),
+    # When a failed outbox operation may be tried again (Unix time), and why it last failed
+    ('sync_outbox', 'next_attempt_at', 'REAL'),
+    ('sync_outbox', 'last_error', 'TEXT'),
+]
+
+# All queries are parameterised constants so sqlite3's statement cache keeps them prepared.
+SQL_GET_USER = 'SELECT subscription_status, subscription_expiry_date, checked_at FROM users WHERE user_id = ?'
+SQL_UPSERT_USER = '''
+    INSERT INTO users (user_id, username, trial_start_date, subscription_status, subscription_expiry_date, checked_at)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (user_id) DO UPDATE SET
+        username = COALESCE(excluded.username, users.username),
+        subscription_status = excluded.subscription_status,
+        subscription_expiry_date = excluded.subscription_expiry_date,
+        checked_at = excluded.checked_at
+'''
+SQL_DELETE_USER = 'DELETE FROM users WHERE user_id = ?'
+SQL_USER_CHANGED_SINCE = 'SELECT 1 FROM users WHERE user_id = ? AND checked_at >= ?'
+SQL_ACTIVE_SUBSCRIPTIONS = "SELECT user_id, subscription_expiry_date, reminded_for FROM users WHERE subscription_status = 'active'"
+SQL_MARK_EXPIRED = '''
+    UPDATE users SET subscription_status = 'expired'
+    WHERE user_id = ? AND subscription_expiry_date = ? AND subscription_status = 'active'
+'''
+SQL_MARK_REMINDED = 'UPDATE users SET reminded_for = ? WHERE user_id = ?'
+SQL_INSERT_ACTIVITY = '''
+    INSERT INTO activity_log (timestamp, letter_type, recipient_name, recipient_email, sent_by, status)
+    VALUES (?, ?, ?, ?, ?, ?)
+'''
+SQL_UPSERT_STUDENT = '''
+    INSERT INTO client_students (name, email, month, domain, updated_at)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (name) DO UPDATE SET
+        email = excluded.email,
+        month = excluded.month,
+        domain = excluded.domain,
+        updated_at = excluded.updated_at
+'''
+SQL_ALL_STUDENTS = 'SELECT name, email, month, domain FROM client_students'
+SQL_GET_STATE = 'SELECT value FROM sync_state WHERE key = ?'
+SQL_SET_STATE = 'INSERT INTO sync_state (key, value) VALUES (?, ?) ON CONFLICT (key) DO UPDATE SET value = excluded.value'
+SQL_ENQUEUE = 'INSERT INTO sync_outbox (action, user_id, payload, created_at) VALUES (?, ?, ?, ?)'
+# Operations due for sending, oldest first. One still waiting to be retried holds back the later
+# operations for the same user, so the Sheet always applies a user's changes in order.
+SQL_PENDING = '''
+    SELECT op_id, action, payload FROM sync_outbox AS op
+    WHERE COALESCE(next_attempt_at, 0) <= :now AND NOT EXISTS (
+        SELECT 1 FROM sync_outbox AS earlier
+        WHERE earlier.user_id = op.user_id AND earlier.op_id < op.op_id AND COALESCE(earlier.next_attempt_at, 0) > :now
+    )
+    ORDER BY op_id LIMIT :limit
+'''
+# Dead-lettered operations count too: the Sheet never received them, so it is behind for that user
+SQL_HAS_PENDING = '''
+    SELECT 1 FROM sync_outbox WHERE user_id = ?1
+    UNION ALL SELECT 1 FROM sync_dead_letter WHERE user_id = ?1
+    LIMIT 1
+'''
+SQL_DELETE_OPS = 'DELETE FROM sync_outbox WHERE op_id = ?'
+SQL_GET_ATTEMPTS = 'SELECT attempts FROM sync_outbox WHERE op_id = ?'
+SQL_DELAY_OP = 'UPDATE sync_outbox SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE op_id = ?'
+SQL_DEAD_LETTER_OP = '''
+    INSERT OR REPLACE INTO sync_dead_letter (op_id, action, user_id, payload, attempts, created_at, failed_at, error)
+    SELECT op_id, action, user_id, payload, ?, created_at, ?, ? FROM sync_outbox WHERE op_id = ?
+'''
+SQL_REPLAY_DEAD_LETTERS = '''
+    INSERT INTO sync_outbox (op_id, action, user_id, payload, attempts, created_at)
+    SELECT op_id, action, user_id, payload, 0, created_at FROM sync_dead_letter
+'''
+SQL_CLEAR_DEAD_LETTERS = 'DELETE FROM sync_dead_letter'
+SQL_RECORD_PAYMENT = 'INSERT OR IGNORE INTO processed_payments (payment_id, user_id, processed_at) VALUES (?, ?, ?)'
+
+
+class LocalStore:
+    """
+    SQLite-backed store for subscriptions and the activity log.
+    Reads are served locally; every write also queues an outbox operation
+    that SheetSync replicates to the Google Sheet in the background.
+    """
+
+    def __init__(self, path: str = DATABASE_FILE):
+        self._conn = sqlite3.connect(path, check_same_thread=False, cached_statements=64)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute('PRAGMA journal_mode=WAL;')
+            self._conn.execute('PRAGMA synchronous=NORMAL;')
+            for statement in SCHEMA:
+                self._conn.execute(statement)
+            for table, column, definition in MIGRATIONS:
+                columns = [row[1] for row in self._conn.execute(f'PRAGMA table_info({table});')]
+                if column not in columns:
+                    self._conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition};')
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _enqueue(self, action: str, user_id, payload: dict):
+        """Queues an operation for the Sheet. Must be called inside a transaction."""
+        self._conn.execute(SQL_ENQUEUE, (action, user_id, json.dumps(payload), datetime.now().isoformat()))
+
+    # --- Users ---
+    def get_user(self, user_id: int):
+        """Returns the user's status in the same shape as the Sheet's getUserStatus data, or None."""
+        entry = self.get_user_entry(user_id)
+        return entry[0] if entry is not None else None
+
+    def get_user_entry(self, user_id: int):
+        """
+        Returns (status data, checked_at) for the user, or None. checked_at is when the status was
+        last confirmed by the Sheet or written locally, or None for rows older than that column.
+        """
+        with self._lock:
+            row = self._conn.execute(SQL_GET_USER, (int(user_id),)).fetchone()
+        if row is None:
+            return None
+        return {"status": row[0], "expiry_date": row[1]}, row[2]
+
+    def save_user(self, user_id: int, user_data: dict, username: str = None, fetched_at: float = None) -> bool:
+        """
+        Stores status data fetched from the Sheet. Nothing is queued, the Sheet already has it.
+        Users with changes still waiting to be synced (or dead-lettered) are left alone, since their local copy is
+        newer than what the Sheet returned, and so are users whose row was written at or after
+        `fetched_at` (when the Sheet request was sent), since the response may predate that write.
+        Returns True if the data was stored.
+        """
+        with self._lock, self._conn:
+            if self._conn.execute(SQL_HAS_PENDING, (int(user_id),)).fetchone():
+                return False
+            if fetched_at is not None and self._conn.execute(SQL_USER_CHANGED_SINCE,
+                                                             (int(user_id), fetched_at)).fetchone():
+                return False
+            self._conn.execute(SQL_UPSERT_USER, (int(user_id), username, None, user_data['status'],
+                                                 user_data['expiry_date'], time.time()))
+        return True
+
+    def register_user(self, user_id: int, username: str) -> dict:
+        """Creates a new, not yet paid user locally and queues the registration for the Sheet."""
+        today = datetime.now().strftime("%Y-%m-%d")
+        user_data = {"status": "expired", "expiry_date": today}
+        with self._lock, self._conn:
+            self._conn.execute(SQL_UPSERT_USER, (int(user_id), username, today, user_data['status'],
+                                                 user_data['expiry_date'], time.time()))
+            self._enqueue('registerNewUser', int(user_id), {'user_id': int(user_id), 'username': username})
+        return user_data
+
+    def activate_subscription(self, user_id: int, days: int = 30, payment_id: str = None):
+        """
+        Extends the user's access by `days` (from today or their current expiry) and queues the update.
+        With a payment_id, each payment is applied only once; a repeat returns None and changes nothing.
+        """
+        with self._lock, self._conn:
+            if payment_id is not None:
+                cursor = self._conn.execute(SQL_RECORD_PAYMENT, (payment_id, int(user_id), datetime.now().isoformat()))
+                if cursor.rowcount == 0:
+                    return None
+            row = self._conn.execute(SQL_GET_USER, (int(user_id),)).fetchone()
+            start = datetime.now()
+            if row is not None:
+                current_expiry = datetime.strptime(row[1], "%Y-%m-%d")
+                start = max(start, current_expiry)
+            user_data = {"status": "active", "expiry_date": (start + timedelta(days=days)).strftime("%Y-%m-%d")}
+            self._conn.execute(SQL_UPSERT_USER, (int(user_id), None, None, user_data['status'],
+                                                 user_data['expiry_date'], time.time()))
+            self._enqueue('updateSubscription', int(user_id), {'user_id': int(user_id)})
+        return user_data
+
+    def forget_user(self, user_id: int) -> bool:
+        """
+        Drops the local copy of a user so the next read goes back to the Sheet.
+        Users with changes still waiting to be synced (or dead-lettered) are kept, since the Sheet is behind for them.
+        """
+        with self._lock, self._conn:
+            if self._conn.execute(SQL_HAS_PENDING, (int(user_id),)).fetchone():
+                return False
+            self._conn.execute(SQL_DELETE_USER, (int(user_id),))
+        return True
+
+    def active_subscriptions(self) -> list:
+        """Returns (user_id, expiry_date, reminded_for) for every user whose status is active."""
+        with self._lock:
+            return self._conn.execute(SQL_ACTIVE_SUBSCRIPTIONS).fetchall()
+
+    def mark_expired(self, expired: list):
+        """
+        Flips lapsed subscriptions, given as (user_id, expiry_date), to expired. Nothing is queued:
+        the Sheet works out expiry on its own. A user renewed in the meantime is left alone.
+        """
+        with self._lock, self._conn:
+            self._conn.executemany(SQL_MARK_EXPIRED, [(int(user_id), expiry_date) for user_id, expiry_date in expired])
+
+    def mark_reminded(self, user_id: int, expiry_date: str):
+        """Records that the user was reminded to renew before `expiry_date`."""
+        with self._lock, self._conn:
+            self._conn.execute(SQL_MARK_REMINDED, (expiry_date, int(user_id)))
+
+    # --- Activity log ---
+    def log_activity(self, letter_type: str, recipient_name: str, recipient_email: str, sent_by: str, status: str):
+        """Writes an activity row and queues it for the Sheet's dashboard."""
+        entry = {
+            'letter_type': letter_type,
+            'recipient_name': recipient_name,
+            'recipient_email': recipient_email,
+            'sent_by': sent_by,
+            'status': status
+        }
+        with self._lock, self._conn:
+            self._conn.execute(SQL_INSERT_ACTIVITY, (datetime.now().isoformat(), letter_type, recipient_name,
+                                                     recipient_email, sent_by, status))
+            self._enqueue('logActivity', None, entry)
+
+    def log_activity_batch(self, entries: list):
+        """
+        Writes a batch of activity entries in one transaction and queues them
+        for the Sheet as a single logActivity operation.
+        """
+        rows = [(entry['timestamp'], entry['letter_type'], entry['recipient_name'], entry['recipient_email'],
+                 entry['sent_by'], entry['status']) for entry in entries]
+        with self._lock, self._conn:
+            self._conn.executemany(SQL_INSERT_ACTIVITY, rows)
+            self._enqueue('logActivity', None, {'entries': entries})
+
+    # --- Client students ---
+    def save_students(self, students: list):
+        """Upserts rows from the client's onboarding sheet in one transaction."""
+        rows = [(student['name'], student.get('email'), student.get('month'), student.get('domain'),
+                 student.get('updated_at')) for student in students]
+        with self._lock, self._conn:
+            self._conn.executemany(SQL_UPSERT_STUDENT, rows)
+
+    def load_students(self) -> list:
+        """Returns every mirrored student as a dict with name, email, month and domain."""
+        with self._lock:
+            rows = self._conn.execute(SQL_ALL_STUDENTS).fetchall()
+        return [{'name': name, 'email': email, 'month': month, 'domain': domain} for name, email, month, domain in rows]
+
+    # --- Sync state ---
+    def get_state(self, key: str, default=None):
+        with self._lock:
+            row = self._conn.execute(SQL_GET_STATE, (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_state(self, key: str, value: str):
+        with self._lock, self._conn:
+            self._conn.execute(SQL_SET_STATE, (key, value))
+
+    # --- Sync outbox ---
+    def pending_operations(self, limit: int = 100) -> list:
+        """
+        Returns up to `limit` queued operations that are due, as (op_id, {'action': ..., **payload}) in
+        insertion order. Operations waiting to be retried, and later ones for the same user, are left out.
+        """
+        with self._lock:
+            rows = self._conn.execute(SQL_PENDING, {'now': time.time(), 'limit': limit}).fetchall()
+        return [(op_id, {'action': action, **json.loads(payload)}) for op_id, action, payload in rows]
+
+    def mark_synced(self, op_ids: list):
+        with self._lock, self._conn:
+            self._conn.executemany(SQL_DELETE_OPS, [(op_id,) for op_id in op_ids])
+
+    def mark_failed(self, op_ids: list, error: str, max_attempts: int, retry_delay: float) -> list:
+        """
+        Records an attempt the Sheet rejected for each operation. One that has now failed `max_attempts` times is
+        moved to the dead-letter table; the others wait retry_delay * 2^(attempts - 1) seconds before
+        they are tried again. Returns the op_ids that were dead-lettered.
+        """
+        dead = []
+        now = time.time()
+        with self._lock, self._conn:
+            for op_id in op_ids:
+                row = self._conn.execute(SQL_GET_ATTEMPTS, (op_id,)).fetchone()
+                if row is None:
+                    continue
+                attempts = row[0] + 1
+                if attempts >= max_attempts:
+                    self._conn.execute(SQL_DEAD_LETTER_OP, (attempts, datetime.now().isoformat(), error, op_id))
+                    self._conn.execute(SQL_DELETE_OPS, (op_id,))
+                    dead.append(op_id)
+                else:
+                    self._conn.execute(SQL_DELAY_OP, (attempts, now + retry_delay * 2 ** (attempts - 1), error, op_id))
+        return dead
+
+    def replay_dead_letters(self) -> int:
+        """
+        Moves every dead-lettered operation back into the outbox with a fresh attempt count, under
+        its original op_id so it keeps its place in its user's order. Returns how many were moved.
+        """
+        with self._lock, self._conn:
+            moved = self._conn.execute(SQL_REPLAY_DEAD_LETTERS).rowcount
+            self._conn.execute(SQL_CLEAR_DEAD_LETTERS)
+        return moved
+
+
+class SheetSync:
+    """
+    Background thread that drains the outbox to the Google Sheet in batches.
+    `send_batch` receives a list of operations and returns True once the Sheet has accepted them.
+
+    An operation the Sheet rejects is retried with exponential backoff starting at `interval`, and
+    after `max_attempts` rejections it is moved to the dead-letter table and logged, so one operation
+    the Sheet keeps rejecting can't hold back the outbox for good. Its user stays protected from
+    Sheet overwrites until it is replayed with LocalStore.replay_dead_letters().
+    When the Sheet can't be reached at all, no operation is charged an attempt: the whole sync backs
+    off instead, doubling from `interval` up to `max_backoff` seconds, until the Sheet answers again.
+    """
+
+    def __init__(self, store: LocalStore, send_batch, interval: float = 10, batch_size: int = 100,
+                 max_attempts: int = 5, max_backoff: float = 300):
+        self.store = store
+        self.send_batch = send_batch
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.max_backoff = max_backoff
+        self._outages = 0  # Consecutive rounds the Sheet couldn't be reached
+        self._retry_at = 0.0  # time.monotonic() before which the Sheet isn't tried again
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="sheet-sync", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 30):
+        """Stops the thread after a final drain of the outbox."""
+        if self._thread is None:
+            self.sync_once()
+            return
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def wake(self):
+        """Asks the thread to sync now instead of waiting for the next interval."""
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(max(self.interval, self._retry_at - time.monotonic()))
+            self._wake.clear()
+            if time.monotonic() >= self._retry_at:
+                self.sync_once()
+        self.sync_once()
+
+    def _send(self, pending: list):
+        """Returns None if the Sheet accepted the operations, otherwise why it didn't and whether it was reachable."""
+        try:
+            if self.send_batch([operation for _, operation in pending]):
+                return None
+            return "rejected by the Sheet", True
+        except Exception as e:
+            return str(e), False
+
+    def _unreachable(self, error: str):
+        self._outages += 1
+        delay = min(self.interval * 2 ** (self._outages - 1), self.max_backoff)
+        self._retry_at = time.monotonic() + delay
+        print(f"Sheet unreachable ({error}); trying again in {delay:.0f}s.")
+
+    def _fail(self, op_ids: list, error: str):
+        dead = self.store.mark_failed(op_ids, error, self.max_attempts, self.interval)
+        for op_id in dead:
+            print(f"[ERROR] Sheet sync gave up on outbox operation {op_id} after {self.max_attempts} attempts "
+                  f"({error}); it was moved to sync_dead_letter.")
+
+    def sync_once(self) -> int:
+        """
+        Sends everything currently due. Returns the number of operations replicated.
+        When the Sheet rejects a batch, its operations are sent one at a time, so only the ones it
+        actually refuses are held back. If the Sheet can't be reached, the sync stops and backs off
+        without charging the operations an attempt.
+        """
+        synced = 0
+        while True:
+            pending = self.store.pending_operations(self.batch_size)
+            if not pending:
+                return synced
+            failure = self._send(pending)
+            if failure is None:
+                self._outages = 0
+                self.store.mark_synced([op_id for op_id, _ in pending])
+                synced += len(pending)
+                continue
+            error, reachable = failure
+            if not reachable:
+                self._unreachable(error)
+                return synced
+            self._outages = 0
+            if len(pending) == 1:
+                self._fail([op_id for op_id, _ in pending], error)
+                return synced
+            held_users = set()
+            for op_id, operation in pending:
+                user_id = operation.get('user_id')
+                if user_id is not None and user_id in held_users:
+                    continue  # An earlier change for this user failed; keep them in order
+                failure = self._send([(op_id, operation)])
+                if failure is None:
+                    self.store.mark_synced([op_id])
+                    synced += 1
+                    continue
+                if not failure[1]:
+                    self._unreachable(failure[0])
+                    return synced
+                self._fail([op_id], failure[0])
+                if user_id is not None:
+                    held_users.add(user_id)
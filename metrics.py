@@ -0,0 +1,225 @@
+# metrics.py
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from http_server import AsyncHTTPServer
+
+# Local port for the Prometheus scrape endpoint (GET /metrics); 0 turns it off
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', 9108))
+
+# Latency buckets in seconds, from a cache lookup up to a slow Apps Script call
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+# In render worker processes observations are collected here and shipped back with each
+# result (see render_service), since the worker's own registry is never scraped.
+_forwarded = None
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labelnames: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        with _registry_lock:
+            if name in _registry:
+                raise ValueError(f"Metric '{name}' is already registered")
+            _registry[name] = self
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _record(self, value: float, labels: dict):
+        key = self._key(labels)
+        if _forwarded is not None:
+            _forwarded.append((self.name, key, value))
+            return
+        self._apply(key, value)
+
+    def _apply(self, key: tuple, value: float):
+        raise NotImplementedError
+
+    def _header(self) -> list:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        self._record(amount, labels)
+
+    def _apply(self, key: tuple, value: float):
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def expose(self) -> list:
+        lines = self._header()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        self._record(value, labels)
+
+    @contextmanager
+    def time(self, **labels):
+        """Observes how long the block takes, whether or not it raises."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _apply(self, key: tuple, value: float):
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [count per bucket (not cumulative), sum, count]
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def count(self, **labels) -> int:
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def expose(self) -> list:
+        lines = self._header()
+        with self._lock:
+            for key, (bucket_counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, bucket_counts):
+                    cumulative += bucket_count
+                    le = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                    lines.append(f"{self.name}_bucket{le} {cumulative}")
+                le = _format_labels(self.labelnames, key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{le} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+def render_prometheus() -> str:
+    """Every registered metric in the Prometheus text exposition format (version 0.0.4)."""
+    with _registry_lock:
+        metrics = list(_registry.values())
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.expose())
+    return "\n".join(lines) + "\n"
+
+
+# --- Forwarding from worker processes ---
+def start_forwarding():
+    """Call in a worker process: from now on observations are buffered for drain_forwarded()."""
+    global _forwarded
+    _forwarded = []
+
+
+def drain_forwarded() -> list:
+    """Returns and clears the observations buffered since the last call."""
+    global _forwarded
+    if _forwarded is None:
+        return []
+    events, _forwarded = _forwarded, []
+    return events
+
+
+def replay(events: list):
+    """Applies observations drained in another process to this process's metrics."""
+    for name, key, value in events:
+        metric = _registry.get(name)
+        if metric is not None:
+            metric._apply(tuple(key), value)
+
+
+# --- Scrape endpoint ---
+async def _handle_metrics(request) -> tuple:
+    return 200, "text/plain; version=0.0.4; charset=utf-8", render_prometheus().encode()
+
+
+def create_metrics_server(host: str = METRICS_HOST, port: int = METRICS_PORT):
+    """Returns an unstarted server for GET /metrics, or None if METRICS_PORT is 0."""
+    if not port:
+        return None
+    server = AsyncHTTPServer(host, port)
+    server.route("GET", "/metrics", _handle_metrics)
+    return server
+
+
+# --- Bot metrics ---
+SHEET_REQUEST_SECONDS = Histogram(
+    "sheet_request_seconds", "Time spent on Google Apps Script requests, by action.", ("action",))
+SHEET_REQUEST_ERRORS = Counter(
+    "sheet_request_errors_total", "Apps Script requests that failed or returned invalid data, by action.", ("action",))
+LETTER_RENDER_SECONDS = Histogram(
+    "letter_render_seconds", "Time to generate a letter PDF (and its preview, if asked for), by generator.",
+    ("generator", "preview"))
+PREVIEW_RENDER_SECONDS = Histogram(
+    "preview_render_seconds", "Time to make a preview image: 'composite' onto the cached template bitmap, "
+    "or the 'full' page render fallback in _create_preview_from_pdf.", ("method",))
+RENDER_JOB_SECONDS = Histogram(
+    "render_job_seconds", "Time from submitting a render job to getting its result, including queueing.", ("kind",))
+SMTP_STAGE_SECONDS = Histogram(
+    "smtp_stage_seconds", "Time spent in each SMTP stage: connect, starttls, login and send.", ("stage",))
+EMAILS_TOTAL = Counter(
+    "emails_total", "Letter emails by outcome (sent or failed).", ("result",))
+PAYMENT_LINK_SECONDS = Histogram(
+    "payment_link_seconds", "Time to create a Razorpay payment link via the API.")
+PAYMENT_LINKS_TOTAL = Counter(
+    "payment_links_total", "Payment link requests: served from the cache, created, or failed.", ("result",))
+STATUS_LOOKUPS_TOTAL = Counter(
+    "status_lookups_total", "User status lookups by where they were answered: memory (cache hit), "
+    "database, negative (recent not_found/error), coalesced (joined a Sheet call in flight) or "
+    "sheet (cache miss).", ("source",))
+STATUS_REVALIDATIONS_TOTAL = Counter(
+    "status_revalidations_total", "Known users' statuses re-read from the Sheet because they were stale: "
+    "background (served stale meanwhile) or blocking (past the hard TTL).", ("mode",))
+SUBSCRIPTIONS_EXPIRED_TOTAL = Counter(
+    "subscriptions_expired_total", "Subscriptions flipped to expired by the expiry scheduler.")
+RENEWAL_REMINDERS_TOTAL = Counter(
+    "renewal_reminders_total", "Renewal reminders by outcome (sent or failed).", ("result",))
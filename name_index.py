@@ -0,0 +1,65 @@
+# name_index.py
+
+from collections import Counter, defaultdict
+
+
+def normalize_name(name: str) -> str:
+    """Case- and whitespace-insensitive key used for name lookups."""
+    return ' '.join(name.lower().split())
+
+
+def trigrams(text: str) -> set:
+    """Character trigrams of the normalized text, padded so word starts and ends count too."""
+    padded = f"  {normalize_name(text)} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """
+    In-memory trigram index for approximate name matching.
+    Candidates are found through an inverted index (trigram -> keys) and ranked
+    by Jaccard similarity, so a query only touches names that share a trigram with it.
+    """
+
+    def __init__(self):
+        self._postings = defaultdict(set)
+        self._grams = {}
+        self._names = {}
+
+    def __len__(self):
+        return len(self._names)
+
+    def add(self, name: str):
+        """Indexes a name. Re-adding an existing name just replaces it."""
+        key = normalize_name(name)
+        self.remove(key)
+        grams = trigrams(key)
+        self._grams[key] = grams
+        self._names[key] = name
+        for gram in grams:
+            self._postings[gram].add(key)
+
+    def remove(self, name: str):
+        key = normalize_name(name)
+        for gram in self._grams.pop(key, ()):
+            self._postings[gram].discard(key)
+        self._names.pop(key, None)
+
+    def search(self, query: str, k: int = 5, min_score: float = 0.3) -> list:
+        """Returns up to `k` (name, score) pairs, best match first, scoring at least `min_score`."""
+        query_grams = trigrams(query)
+        if not query_grams:
+            return []
+
+        shared = Counter()
+        for gram in query_grams:
+            for key in self._postings.get(gram, ()):
+                shared[key] += 1
+
+        scored = []
+        for key, overlap in shared.items():
+            score = overlap / (len(query_grams) + len(self._grams[key]) - overlap)
+            if score >= min_score:
+                scored.append((score, key))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return [(self._names[key], round(score, 3)) for score, key in scored[:k]]
@@ -1,73 +1,137 @@
 # pdf_generator.py
 
 import fitz  # PyMuPDF
+from fitz import mupdf
 from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
 
+from template_registry import get_registry
+from preview_engine import get_preview_engine
+from metrics import LETTER_RENDER_SECONDS, PREVIEW_RENDER_SECONDS
 
-# --- HELPER FUNCTION FOR PREVIEW GENERATION ---
-def _create_preview_from_pdf(pdf_path: str) -> str:
+
+# --- HELPER FUNCTIONS FOR FILLING IN AND PREVIEWING TEMPLATES ---
+def _insert_fields(page: fitz.Page, fields: list):
+    """Writes each (coords, text, fontsize) field onto the page in black Helvetica."""
+    for coords, text, fontsize in fields:
+        page.insert_text(coords, text, fontsize=fontsize, fontname="helv", color=(0, 0, 0))
+
+
+def _stamp(template_key: str, fields: list) -> tuple[fitz.Document, bytes]:
+    """
+    Writes the fields onto the first page of the template's base document and returns
+    (document, pdf_bytes). The caller closes the document once it is done with the page.
+    """
+    registry = get_registry()
+    doc = registry.open(template_key)
+    _insert_fields(doc[0], fields)
+    return doc, _write_pdf(doc, size_hint=len(registry.get_bytes(template_key)) + 16 * 1024)
+
+
+def _write_pdf(doc: fitz.Document, size_hint: int = 64 * 1024) -> bytes:
+    """
+    Saves a stamped base document with deflate but no garbage collection: the base was
+    already cleaned up once by the template registry, and the text adds no unused objects.
+    MuPDF writes into its own buffer here; doc.tobytes() goes through a Python callback for
+    every small chunk of output, which costs more than writing the file itself.
+    """
+    try:
+        options = mupdf.PdfWriteOptions()
+        options.do_compress = 1
+        buffer = mupdf.FzBuffer(size_hint)
+        output = mupdf.FzOutput(buffer)
+        mupdf.pdf_write_document(mupdf.pdf_document_from_fz_document(doc.this), output, options)
+        output.fz_close_output()
+        return buffer.fz_buffer_extract()
+    except AttributeError:
+        # PyMuPDF builds without the low-level bindings
+        return doc.tobytes(garbage=0, deflate=True)
+
+
+def _create_preview_from_pdf(pdf_bytes: bytes) -> bytes:
     """
-    Takes a path to a PDF, saves its first page as a PNG image,
-    and returns the path to the new image.
+    Takes a PDF held in memory and returns its first page as PNG image bytes.
+    This full-page render is only the fallback for when _create_preview fails.
     """
-    preview_image_path = pdf_path.replace(".pdf", ".png")
     try:
-        doc = fitz.open(pdf_path)
-        page = doc[0]  # Get the first page
-        pix = page.get_pixmap(dpi=150)  # Render page to an image with good resolution
-        pix.save(preview_image_path)
-        doc.close()
-        return preview_image_path
+        with PREVIEW_RENDER_SECONDS.time(method="full"), fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+            page = doc[0]  # Get the first page
+            pix = page.get_pixmap(dpi=150)  # Render page to an image with good resolution
+            return pix.tobytes("png")
     except Exception as e:
         print(f"Error creating preview image: {e}")
-        return ""
+        return b""
 
 
-# --- UPDATED PDF GENERATION FUNCTIONS WITH PREVIEW ---
+def _create_preview(template_key: str, filled_page: fitz.Page, fields: list, pdf_bytes: bytes) -> bytes:
+    """Composites the filled-in fields onto the cached template bitmap (see preview_engine)."""
+    try:
+        with PREVIEW_RENDER_SECONDS.time(method="composite"):
+            return get_preview_engine().render(template_key, filled_page, fields)
+    except Exception as e:
+        print(f"Fast preview failed for '{template_key}', rendering the full page instead: {e}")
+        return _create_preview_from_pdf(pdf_bytes)
+
 
-def generate_campus_ambassador_pdf_with_preview(name: str) -> tuple[str, str]:
+# --- PDF GENERATION FUNCTIONS ---
+# The bot uses the *_with_preview versions, which return (pdf_bytes, preview_image_bytes);
+# the render-only versions return just the PDF bytes (used for batch rendering).
+
+def generate_campus_ambassador_pdf_with_preview(name: str) -> tuple[bytes, bytes]:
     """Generates the CA PDF and a preview image of the first page."""
-    # Step 1: Generate the full PDF as before
-    TEMPLATE_PATH = "templates/campus_ambassador.pdf"
-    output_path = f"CA_Letter_{name.replace(' ', '_')}.pdf"
+    with LETTER_RENDER_SECONDS.time(generator="campus_ambassador", preview="true"):
+        return _generate_campus_ambassador(name, with_preview=True)
 
+
+def generate_campus_ambassador_pdf(name: str) -> bytes:
+    """Generates only the CA PDF."""
+    with LETTER_RENDER_SECONDS.time(generator="campus_ambassador", preview="false"):
+        return _generate_campus_ambassador(name, with_preview=False)[0]
+
+
+def generate_internship_acceptance_pdf_with_preview(name: str, month: str, domain: str) -> tuple[bytes, bytes]:
+    """Generates the Internship PDF and a preview image."""
+    with LETTER_RENDER_SECONDS.time(generator="internship_acceptance", preview="true"):
+        return _generate_internship_acceptance(name, month, domain, with_preview=True)
+
+
+def generate_internship_acceptance_pdf(name: str, month: str, domain: str) -> bytes:
+    """Generates only the Internship PDF."""
+    with LETTER_RENDER_SECONDS.time(generator="internship_acceptance", preview="false"):
+        return _generate_internship_acceptance(name, month, domain, with_preview=False)[0]
+
+
+def generate_offer_letter_pdf_with_preview(name: str, training_from: str) -> tuple[bytes, bytes]:
+    """Generates the Offer Letter PDF and a preview image."""
+    with LETTER_RENDER_SECONDS.time(generator="offer_letter", preview="true"):
+        return _generate_offer_letter(name, training_from, with_preview=True)
+
+
+def generate_offer_letter_pdf(name: str, training_from: str) -> bytes:
+    """Generates only the Offer Letter PDF."""
+    with LETTER_RENDER_SECONDS.time(generator="offer_letter", preview="false"):
+        return _generate_offer_letter(name, training_from, with_preview=False)[0]
+
+
+def _generate_campus_ambassador(name: str, with_preview: bool) -> tuple[bytes, bytes]:
+    # Step 1: Generate the full PDF as before
     NAME_COORDS = (110, 244)
     DATE_COORDS = (423, 245)
     current_date = datetime.now().strftime("%B %d, %Y")
+    fields = [(NAME_COORDS, name, 18), (DATE_COORDS, current_date, 14)]
 
-    template_doc = fitz.open(TEMPLATE_PATH)
-    page_1 = template_doc[0]
-    page_1.insert_text(NAME_COORDS, name, fontsize=18, fontname="helv", color=(0, 0, 0))
-    page_1.insert_text(DATE_COORDS, current_date, fontsize=14, fontname="helv", color=(0, 0, 0))
-
-    output_doc = fitz.open()
-    output_doc.insert_pdf(template_doc, from_page=0, to_page=1)
-    output_doc.save(output_path, garbage=4, deflate=True)
-    template_doc.close()
-    output_doc.close()
+    doc, pdf_bytes = _stamp("campus_ambassador", fields)
 
-    # Step 2: Create the preview from the generated PDF
-    preview_path = _create_preview_from_pdf(output_path)
-    return output_path, preview_path
+    # Step 2: Create the preview from the filled-in page
+    preview_bytes = _create_preview("campus_ambassador", doc[0], fields, pdf_bytes) if with_preview else b""
+    doc.close()
+    return pdf_bytes, preview_bytes
 
 
-def generate_internship_acceptance_pdf_with_preview(name: str, month: str, domain: str) -> tuple[str, str]:
-    """Generates the Internship PDF and a preview image."""
+def _generate_internship_acceptance(name: str, month: str, domain: str, with_preview: bool) -> tuple[bytes, bytes]:
     # Step 1: Generate the full PDF as before
-    domain_to_template_map = {
-        "artificial intelligence": "templates/ai-internship.pdf", "machine learning": "templates/ml-internship.pdf",
-        "web development": "templates/wd-internship.pdf", "cybersecurity": "templates/cs-internship.pdf",
-        "data science": "templates/ds-internship.pdf", "digital marketing": "templates/dm-internship.pdf",
-        "human resource management": "templates/hr-internship.pdf", "finance": "templates/fi-internship.pdf",
-        "financial modeling & analysis": "templates/fi-internship.pdf",
-        "financial modeling & valuation": "templates/fi-internship.pdf",
-        "cloud computing": "templates/cc-internship.pdf",
-    }
-    clean_domain = domain.strip().lower()
-    template_path = domain_to_template_map.get(clean_domain)
-    if not template_path:
-        raise ValueError(f"No template found for domain: '{domain}'")
+    registry = get_registry()
+    template_key = registry.internship_template_for(domain)  # Raises ValueError for unknown domains
     try:
         current_year = datetime.now().year
         start_month_date = datetime.strptime(f"10 {month} {current_year}", "%d %B %Y")
@@ -77,27 +141,19 @@ def generate_internship_acceptance_pdf_with_preview(name: str, month: str, domai
     except ValueError:
         raise ValueError(f"Invalid month format from sheet: '{month}'")
 
-    output_path = f"Internship_Letter_{name.replace(' ', '_')}.pdf"
     NAME_COORDS, FROM_DATE_COORDS, TO_DATE_COORDS = (262, 307), (365, 560), (448, 560)
+    fields = [(NAME_COORDS, name, 12), (FROM_DATE_COORDS, from_date, 11), (TO_DATE_COORDS, to_date, 11)]
 
-    doc = fitz.open(template_path)
-    page = doc[0]
-    page.insert_text(NAME_COORDS, name, fontsize=12, fontname="helv", color=(0, 0, 0))
-    page.insert_text(FROM_DATE_COORDS, from_date, fontsize=11, fontname="helv", color=(0, 0, 0))
-    page.insert_text(TO_DATE_COORDS, to_date, fontsize=11, fontname="helv", color=(0, 0, 0))
-    doc.save(output_path, garbage=4, deflate=True)
-    doc.close()
+    doc, pdf_bytes = _stamp(template_key, fields)
 
     # Step 2: Create the preview
-    preview_path = _create_preview_from_pdf(output_path)
-    return output_path, preview_path
+    preview_bytes = _create_preview(template_key, doc[0], fields, pdf_bytes) if with_preview else b""
+    doc.close()
+    return pdf_bytes, preview_bytes
 
 
-def generate_offer_letter_pdf_with_preview(name: str, training_from: str) -> tuple[str, str]:
-    """Generates the Offer Letter PDF and a preview image."""
+def _generate_offer_letter(name: str, training_from: str, with_preview: bool) -> tuple[bytes, bytes]:
     # Step 1: Generate the full PDF as before
-    TEMPLATE_PATH = "templates/offer_letter.pdf"
-    output_path = f"Offer_Letter_{name.replace(' ', '_')}.pdf"
     NAME_COORDS, TODAY_DATE_COORDS = (91, 293), (94, 253)
     TRAINING_DATES_COORDS, INTERNSHIP_START_COORDS, INTERNSHIP_END_COORDS = (136, 374), (170, 401), (163, 428)
 
@@ -114,21 +170,17 @@ def generate_offer_letter_pdf_with_preview(name: str, training_from: str) -> tup
     except ValueError:
         raise ValueError("Invalid date format. Please use DD-MM-YYYY.")
 
-    template_doc = fitz.open(TEMPLATE_PATH)
-    page_1 = template_doc[0]
-    page_1.insert_text(NAME_COORDS, name, fontsize=10, fontname="helv", color=(0, 0, 0))
-    page_1.insert_text(TODAY_DATE_COORDS, todays_date, fontsize=10, fontname="helv", color=(0, 0, 0))
-    page_1.insert_text(TRAINING_DATES_COORDS, training_dates_text, fontsize=10, fontname="helv", color=(0, 0, 0))
-    page_1.insert_text(INTERNSHIP_START_COORDS, internship_start, fontsize=10, fontname="helv", color=(0, 0, 0))
-    page_1.insert_text(INTERNSHIP_END_COORDS, internship_end, fontsize=10, fontname="helv", color=(0, 0, 0))
+    fields = [
+        (NAME_COORDS, name, 10),
+        (TODAY_DATE_COORDS, todays_date, 10),
+        (TRAINING_DATES_COORDS, training_dates_text, 10),
+        (INTERNSHIP_START_COORDS, internship_start, 10),
+        (INTERNSHIP_END_COORDS, internship_end, 10),
+    ]
 
-    output_doc = fitz.open()
-    output_doc.insert_pdf(template_doc, from_page=0, to_page=2)
-    output_doc.save(output_path, garbage=4, deflate=True)
-    template_doc.close()
-    output_doc.close()
+    doc, pdf_bytes = _stamp("offer_letter", fields)
 
     # Step 2: Create the preview
-    preview_path = _create_preview_from_pdf(output_path)
-    return output_path, preview_path
-
+    preview_bytes = _create_preview("offer_letter", doc[0], fields, pdf_bytes) if with_preview else b""
+    doc.close()
+    return pdf_bytes, preview_bytes
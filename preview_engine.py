@@ -0,0 +1,217 @@
+# preview_engine.py
+
+import os
+import struct
+import threading
+import zlib
+from functools import lru_cache
+
+import fitz  # PyMuPDF
+
+from template_registry import get_registry
+
+# --- PREVIEW CONFIGURATION ---
+PREVIEW_DPI = int(os.getenv('PREVIEW_DPI', 150))
+PREVIEW_FORMAT = os.getenv('PREVIEW_FORMAT', 'png').lower()  # png, jpeg or webp
+PREVIEW_QUALITY = int(os.getenv('PREVIEW_QUALITY', 85))  # Used by jpeg and webp
+
+# Extra space (in points) around each text field, so the whole glyph box is repainted
+FIELD_PADDING = 4
+# PNG previews are compressed in bands of this many pixel rows (see PngBands)
+PNG_BAND_ROWS = 32
+
+try:
+    import PIL  # noqa: F401 - Optional, needed for WebP and used for faster JPEG encoding
+    HAS_PILLOW = True
+except ImportError:
+    HAS_PILLOW = False
+
+
+@lru_cache(maxsize=8)
+def _font(fontname: str) -> fitz.Font:
+    return fitz.Font(fontname)
+
+
+def field_rect(coords: tuple, text: str, fontsize: float, fontname: str = "helv") -> fitz.Rect:
+    """
+    The area (in PDF points) covered by text inserted at `coords` (its baseline start).
+    ASCII text is measured with the font page.insert_text() draws it in. Other characters go
+    through the base-14 font's single-byte encoding and can come out wider or narrower than the
+    font's metrics say, so they get 1em each, which no glyph of those fonts exceeds. (Running the
+    area to the edge of the page instead would re-render template artwork whose anti-aliasing
+    differs inside a clip.)
+    """
+    x, y = coords
+    width = _font(fontname).text_length(text, fontsize=fontsize) if text.isascii() else len(text) * fontsize
+    return fitz.Rect(x, y - fontsize, x + width, y + fontsize * 0.35) + (-FIELD_PADDING, -FIELD_PADDING,
+                                                                         FIELD_PADDING, FIELD_PADDING)
+
+
+def _png_chunk(tag: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+
+
+def _adler32_combine(adler1: int, adler2: int, length2: int) -> int:
+    """The Adler-32 of two byte strings joined, from their separate checksums (as zlib's adler32_combine)."""
+    base = 65521
+    remainder = length2 % base
+    sum1 = adler1 & 0xFFFF
+    sum2 = (remainder * sum1) % base
+    sum1 = (sum1 + (adler2 & 0xFFFF) + base - 1) % base
+    sum2 = (sum2 + (adler1 >> 16) + (adler2 >> 16) + base - remainder) % base
+    return sum1 | (sum2 << 16)
+
+
+class PngBands:
+    """
+    PNG encoder for previews of one template bitmap. The image data is deflated in bands of
+    `band_rows` rows, each ending on a full flush so it can be reused on its own. The bands of
+    the blank template are compressed once; a preview only recompresses the bands its text
+    fields touch and splices in the cached rest, so encoding costs a few milliseconds instead
+    of deflating the whole page.
+    """
+
+    def __init__(self, base: fitz.Pixmap, band_rows: int = PNG_BAND_ROWS, level: int = 6, patch_level: int = 1):
+        if base.alpha or base.n != 3:
+            raise ValueError("PngBands needs an RGB pixmap without alpha.")
+        self.width, self.height = base.width, base.height
+        self.band_rows = band_rows
+        # The cached bands are compressed well once; the few recompressed per preview, quickly
+        self.level = level
+        self.patch_level = patch_level
+        self._header = b"\x89PNG\r\n\x1a\n" + _png_chunk(b"IHDR", struct.pack(">IIBBBBB", self.width, self.height,
+                                                                            8, 2, 0, 0, 0))
+        self._bands = [self._compress_band(base, band, level) for band in range(self.band_count)]
+
+    @property
+    def band_count(self) -> int:
+        return -(-self.height // self.band_rows)
+
+    def bands_for(self, irect) -> range:
+        """The bands covering the pixel rows of `irect` (an IRect or a Pixmap.irect tuple)."""
+        irect = fitz.IRect(irect)
+        top, bottom = max(irect.y0, 0), min(irect.y1, self.height)
+        if bottom <= top:
+            return range(0)
+        return range(top // self.band_rows, (bottom - 1) // self.band_rows + 1)
+
+    def _compress_band(self, pix: fitz.Pixmap, band: int, level: int) -> tuple[bytes, int, int]:
+        stride = self.width * 3
+        samples = pix.samples_mv
+        first, last = band * self.band_rows, min((band + 1) * self.band_rows, self.height)
+        # Each row is prefixed with filter type 0 (None)
+        raw = b"".join(b"\x00" + samples[row * stride:(row + 1) * stride] for row in range(first, last))
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+        return compressor.compress(raw) + compressor.flush(zlib.Z_FULL_FLUSH), zlib.adler32(raw), len(raw)
+
+    def encode(self, pix: fitz.Pixmap, dirty_bands) -> bytes:
+        """Encodes `pix`, which must equal the base bitmap outside `dirty_bands`, as PNG."""
+        dirty_bands = set(dirty_bands)
+        parts = [b"\x78\x9c"]  # zlib header
+        checksum = 1
+        for band, cached in enumerate(self._bands):
+            data, adler, length = self._compress_band(pix, band, self.patch_level) if band in dirty_bands else cached
+            parts.append(data)
+            checksum = _adler32_combine(checksum, adler, length)
+        parts.append(b"\x03\x00")  # Empty final block
+        parts.append(struct.pack(">I", checksum))
+        return self._header + _png_chunk(b"IDAT", b"".join(parts)) + _png_chunk(b"IEND", b"")
+
+
+class PreviewEngine:
+    """
+    Renders letter previews by compositing instead of rasterizing whole pages.
+    The first page of each template is rasterized once per DPI and cached. A preview is a
+    copy of that bitmap with only the per-letter text fields re-rendered (as small clips of
+    the filled-in page) and pasted on top, then encoded as PNG, JPEG or WebP. PNG previews
+    reuse the template's compressed image data for everything outside the fields (PngBands).
+    """
+
+    def __init__(self, registry=None, dpi: int = PREVIEW_DPI, image_format: str = PREVIEW_FORMAT,
+                 quality: int = PREVIEW_QUALITY):
+        if image_format == "jpg":
+            image_format = "jpeg"
+        if image_format not in ("png", "jpeg", "webp"):
+            raise ValueError(f"Unsupported preview format: '{image_format}'")
+        if image_format == "webp" and not HAS_PILLOW:
+            raise ValueError("WebP previews need the Pillow package.")
+        self.registry = registry or get_registry()
+        self.dpi = dpi
+        self.image_format = image_format
+        self.quality = quality
+
+        self._bases = {}
+        self._png_bands = {}
+        self._lock = threading.Lock()
+
+    def base_pixmap(self, template_key: str, dpi: int = None) -> fitz.Pixmap:
+        """The blank template's first page at `dpi`, rasterized on first use and cached."""
+        dpi = dpi or self.dpi
+        cache_key = (template_key, dpi)
+        with self._lock:
+            base = self._bases.get(cache_key)
+            if base is None:
+                with self.registry.open(template_key) as doc:
+                    base = doc[0].get_pixmap(dpi=dpi, alpha=False)
+                self._bases[cache_key] = base
+        return base
+
+    def png_bands(self, template_key: str, dpi: int = None) -> PngBands:
+        """The PNG encoder for the template's base bitmap at `dpi`, built on first use and cached."""
+        dpi = dpi or self.dpi
+        cache_key = (template_key, dpi)
+        bands = self._png_bands.get(cache_key)
+        if bands is None:
+            bands = PngBands(self.base_pixmap(template_key, dpi))
+            with self._lock:
+                bands = self._png_bands.setdefault(cache_key, bands)
+        return bands
+
+    def prepare(self, template_key: str):
+        """Builds everything a preview of the template needs up front (e.g. in a new worker process)."""
+        self.base_pixmap(template_key)
+        if self.image_format == "png":
+            self.png_bands(template_key)
+
+    def render(self, template_key: str, filled_page: fitz.Page, fields: list, dpi: int = None) -> bytes:
+        """
+        Returns the encoded preview of `filled_page`, the template's first page with `fields`
+        already inserted. `fields` is a list of (coords, text, fontsize) tuples.
+        """
+        dpi = dpi or self.dpi
+        pix = fitz.Pixmap(self.base_pixmap(template_key, dpi), 0)  # Writable copy of the cached bitmap
+        # One display list for all the clips; page.get_pixmap() would rebuild it for each field
+        display_list = filled_page.get_displaylist()
+        matrix = fitz.Matrix(dpi / 72, dpi / 72)
+        patched = []
+        for coords, text, fontsize in fields:
+            clip = field_rect(coords, text, fontsize) & filled_page.rect
+            if clip.is_empty:
+                continue
+            patch = display_list.get_pixmap(matrix=matrix, clip=clip, alpha=False)
+            pix.copy(patch, patch.irect)
+            patched.append(patch.irect)
+        if self.image_format == "png":
+            bands = self.png_bands(template_key, dpi)
+            return bands.encode(pix, [band for irect in patched for band in bands.bands_for(irect)])
+        return self.encode(pix)
+
+    def encode(self, pix: fitz.Pixmap) -> bytes:
+        if self.image_format == "png":
+            return pix.tobytes("png")
+        if HAS_PILLOW:
+            return pix.pil_tobytes(format=self.image_format.upper(), quality=self.quality)
+        return pix.tobytes("jpeg", jpg_quality=self.quality)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_preview_engine() -> PreviewEngine:
+    """Returns the shared preview engine, creating it on first use."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = PreviewEngine()
+    return _engine
@@ -1,29 +1,93 @@
 # razorpay_handler.py
 import os
 import time
+import asyncio
+import threading
 import razorpay
+import requests
 from dotenv import load_dotenv
 
+from metrics import PAYMENT_LINK_SECONDS, PAYMENT_LINKS_TOTAL
+
 load_dotenv()
 
 # --- RAZORPAY CONFIGURATION ---
 RAZORPAY_KEY_ID = os.environ.get("RAZORPAY_KEY_ID")
 RAZORPAY_KEY_SECRET = os.environ.get("RAZORPAY_KEY_SECRET")
+# Seconds to wait for the Razorpay API
+RAZORPAY_TIMEOUT = float(os.environ.get("RAZORPAY_TIMEOUT", 15))
+# The price of 30 days of access, in the currency's smallest unit (paise for INR)
+SUBSCRIPTION_AMOUNT = int(os.environ.get("SUBSCRIPTION_AMOUNT", 999 * 100))
+SUBSCRIPTION_CURRENCY = os.environ.get("SUBSCRIPTION_CURRENCY", "INR")
+
+# How long a payment link stays valid
+PAYMENT_LINK_TTL = 86400
+# A cached link is only shown again if it has at least this many seconds left,
+# so nobody is sent to a link that expires while they are paying.
+PAYMENT_LINK_MIN_REMAINING = 15 * 60
+
+
+_client = None
+_client_lock = threading.Lock()
+
+# telegram_user_id -> {"short_url", "expire_by", "link_id"}
+_payment_links = {}
+_links_lock = threading.Lock()
+
+
+def get_client() -> razorpay.Client:
+    """Returns the shared Razorpay client. Its session keeps connections to the API open between calls."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            session = requests.Session()
+            session.mount("https://", requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=10))
+            _client = razorpay.Client(session=session, auth=(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET))
+    return _client
+
+
+def use_client(client):
+    """Replaces the shared Razorpay client (e.g. with one backed by a local fake in load tests)."""
+    global _client
+    with _client_lock:
+        _client = client
+
+
+def get_cached_payment_link(user_id: int):
+    """Returns the user's unexpired payment link URL, or None."""
+    with _links_lock:
+        link = _payment_links.get(str(user_id))
+        if link is None:
+            return None
+        if link["expire_by"] - time.time() < PAYMENT_LINK_MIN_REMAINING:
+            del _payment_links[str(user_id)]
+            return None
+    PAYMENT_LINKS_TOTAL.inc(result="cached")
+    return link["short_url"]
+
+
+def invalidate_payment_link(user_id: int):
+    """Forgets the user's cached payment link. Call this once their payment has gone through."""
+    with _links_lock:
+        _payment_links.pop(str(user_id), None)
 
 
 def create_payment_link(user_id: int):
     """
-    Creates a ONE-TIME Razorpay Payment Link for ₹999 for 30 days of access.
+    Creates a ONE-TIME Razorpay Payment Link for SUBSCRIPTION_AMOUNT (₹999 by default) for 30 days of access.
+    The link is cached per user until it is close to expiring (or the user pays),
+    so showing the paywall again returns the same link without calling Razorpay.
     """
-    try:
-        client = razorpay.Client(auth=(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET))
+    cached_url = get_cached_payment_link(user_id)
+    if cached_url:
+        return cached_url
 
-        # The amount is now hardcoded to ₹999
-        amount_in_paise = 999 * 100
+    try:
+        expire_by = int(time.time()) + PAYMENT_LINK_TTL
 
         link_data = {
-            "amount": amount_in_paise,
-            "currency": "INR",
+            "amount": SUBSCRIPTION_AMOUNT,
+            "currency": SUBSCRIPTION_CURRENCY,
             "accept_partial": False,
             "description": "30-Day Access to Telegram Bot",
             "notes": {
@@ -36,12 +100,31 @@ def create_payment_link(user_id: int):
             },
             "reminder_enable": False,
             # Link expires after 1 day
-            "expire_by": int(time.time()) + 86400
+            "expire_by": expire_by
         }
-        payment_link = client.payment_link.create(link_data)
+        with PAYMENT_LINK_SECONDS.time():
+            payment_link = get_client().payment_link.create(link_data, timeout=RAZORPAY_TIMEOUT)
 
-        return payment_link.get('short_url')
+        short_url = payment_link.get('short_url')
+        PAYMENT_LINKS_TOTAL.inc(result="created" if short_url else "error")
+        if short_url:
+            with _links_lock:
+                _payment_links[str(user_id)] = {
+                    "short_url": short_url,
+                    "expire_by": payment_link.get('expire_by') or expire_by,
+                    "link_id": payment_link.get('id'),
+                }
+        return short_url
 
     except Exception as e:
+        PAYMENT_LINKS_TOTAL.inc(result="error")
         print(f"Error creating Razorpay one-time payment link: {e}")
-        return None
\ No newline at end of file
+        return None
+
+
+async def create_payment_link_async(user_id: int):
+    """Async version of create_payment_link. Cached links are returned without leaving the event loop."""
+    cached_url = get_cached_payment_link(user_id)
+    if cached_url:
+        return cached_url
+    return await asyncio.to_thread(create_payment_link, user_id)
@@ -0,0 +1,122 @@
+# razorpay_webhook.py
+
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+from dotenv import load_dotenv
+
+import database_handler
+import razorpay_handler
+from http_server import AsyncHTTPServer, HTTPError
+
+load_dotenv()
+
+# --- WEBHOOK CONFIGURATION ---
+# The secret set for this webhook in the Razorpay dashboard. The receiver only starts when it is set.
+RAZORPAY_WEBHOOK_SECRET = os.environ.get("RAZORPAY_WEBHOOK_SECRET")
+WEBHOOK_HOST = os.environ.get("WEBHOOK_HOST", "127.0.0.1")
+WEBHOOK_PORT = int(os.environ.get("WEBHOOK_PORT", 8080))
+WEBHOOK_PATH = "/razorpay/webhook"
+
+
+def sign_payload(body: bytes, secret: str) -> str:
+    """The X-Razorpay-Signature value for a request body: hex HMAC-SHA256 keyed with the webhook secret."""
+    return hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def verify_signature(body: bytes, signature: str, secret: str) -> bool:
+    return bool(signature) and hmac.compare_digest(sign_payload(body, secret), signature)
+
+
+def parse_payment_event(event: dict):
+    """
+    Returns (telegram_user_id, payment_id, amount, currency) for a payment_link.paid event, or
+    None for any other event. The user id comes from the notes set by create_payment_link; the
+    amount (in paise) and currency are what the payment actually collected.
+    """
+    if event.get("event") != "payment_link.paid":
+        return None
+    payload = event.get("payload", {})
+    link = payload.get("payment_link", {}).get("entity", {})
+    payment = payload.get("payment", {}).get("entity", {})
+    user_id = (link.get("notes") or {}).get("telegram_user_id")
+    payment_id = payment.get("id") or link.get("id")
+    if not user_id or not payment_id:
+        raise ValueError("payment_link.paid event without a telegram_user_id or payment id")
+    amount = payment.get("amount", link.get("amount_paid"))
+    currency = payment.get("currency") or link.get("currency")
+    return int(user_id), payment_id, amount, currency
+
+
+class RazorpayWebhook:
+    """
+    Receives Razorpay webhooks and activates subscriptions as soon as a payment link is paid,
+    instead of waiting for the user to press "I've Paid".
+    Requests with a missing or wrong signature are rejected with 401. Each payment is applied
+    once, so Razorpay's redeliveries are acknowledged without extending access again.
+    Only payments of exactly `amount` in `currency` (the subscription price) grant access; others,
+    such as a link made for a different amount or a partial payment, are logged and acknowledged.
+    `on_activated(user_id, status_data)` is awaited in the background after a new activation.
+    """
+
+    def __init__(self, secret: str, on_activated=None, activate=database_handler.update_user_subscription_async,
+                 amount: int = razorpay_handler.SUBSCRIPTION_AMOUNT,
+                 currency: str = razorpay_handler.SUBSCRIPTION_CURRENCY):
+        if not secret:
+            raise ValueError("The Razorpay webhook needs its secret.")
+        self.secret = secret
+        self.on_activated = on_activated
+        self.activate = activate
+        self.amount = amount
+        self.currency = currency
+        self._tasks = set()
+
+    async def handle(self, request) -> tuple:
+        if not verify_signature(request.body, request.headers.get("x-razorpay-signature", ""), self.secret):
+            print("Rejected a Razorpay webhook with an invalid signature.")
+            raise HTTPError(401, "Invalid signature")
+        try:
+            event = json.loads(request.body)
+            payment = parse_payment_event(event)
+        except ValueError as e:
+            raise HTTPError(400, str(e))
+        if payment is None:
+            return 200, "text/plain; charset=utf-8", b"ignored"
+
+        user_id, payment_id, amount, currency = payment
+        if amount != self.amount or currency != self.currency:
+            print(f"[ERROR] Ignored Razorpay payment {payment_id} for user {user_id}: it was for {amount} {currency}, "
+                  f"the subscription costs {self.amount} {self.currency}.")
+            return 200, "text/plain; charset=utf-8", b"ignored"
+        if not await self.activate(user_id, payment_id):
+            print(f"Razorpay payment {payment_id} for user {user_id} was already applied.")
+            return 200, "text/plain; charset=utf-8", b"duplicate"
+
+        print(f"Subscription activated for user {user_id} by Razorpay payment {payment_id}.")
+        razorpay_handler.invalidate_payment_link(user_id)
+        if self.on_activated is not None:
+            # Reply to Razorpay right away; telling the user shouldn't hold up the acknowledgement.
+            task = asyncio.get_running_loop().create_task(self._notify(user_id))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return 200, "text/plain; charset=utf-8", b"ok"
+
+    async def _notify(self, user_id: int):
+        try:
+            status_data = await database_handler.get_user_status_async(user_id)
+            await self.on_activated(user_id, status_data)
+        except Exception as e:
+            print(f"Could not notify user {user_id} about their activation: {e}")
+
+
+def create_webhook_server(on_activated=None, secret: str = RAZORPAY_WEBHOOK_SECRET, host: str = WEBHOOK_HOST,
+                          port: int = WEBHOOK_PORT):
+    """Returns an unstarted server with the webhook route, or None if no webhook secret is configured."""
+    if not secret:
+        return None
+    webhook = RazorpayWebhook(secret, on_activated=on_activated)
+    server = AsyncHTTPServer(host, port)
+    server.route("POST", WEBHOOK_PATH, webhook.handle)
+    return server
@@ -0,0 +1,205 @@
+# render_service.py
+
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import metrics
+import pdf_generator
+from preview_engine import get_preview_engine
+from template_registry import TEMPLATES, get_registry
+
+# Letter kind -> generator. Each returns (pdf_bytes, preview_bytes).
+RENDERERS = {
+    "ca": pdf_generator.generate_campus_ambassador_pdf_with_preview,
+    "intern": pdf_generator.generate_internship_acceptance_pdf_with_preview,
+    "offer": pdf_generator.generate_offer_letter_pdf_with_preview,
+}
+# Letter kind -> render-only generator, returning just the PDF bytes (used for bulk sends).
+PDF_RENDERERS = {
+    "ca": pdf_generator.generate_campus_ambassador_pdf,
+    "intern": pdf_generator.generate_internship_acceptance_pdf,
+    "offer": pdf_generator.generate_offer_letter_pdf,
+}
+
+
+class RenderError(Exception):
+    """Base class for render jobs that did not produce a letter."""
+
+
+class RenderBusy(RenderError):
+    """The job queue is full."""
+
+
+class RenderTimeout(RenderError):
+    """The job did not finish within the per-job timeout."""
+
+
+class RenderCancelled(RenderError):
+    """The job was cancelled by its owner."""
+
+
+def _init_worker():
+    """Runs once in each worker process: load the templates and prepare their preview bases."""
+    metrics.start_forwarding()
+    get_registry()
+    engine = get_preview_engine()
+    for template_key in TEMPLATES:
+        engine.prepare(template_key)
+    metrics.drain_forwarded()
+
+
+def _render(kind: str, kwargs: dict, preview: bool = True) -> tuple[tuple[bytes, bytes], list]:
+    """Returns the letter plus the metrics observed while rendering it, for the parent to record."""
+    try:
+        if not preview:
+            return (PDF_RENDERERS[kind](**kwargs), b""), metrics.drain_forwarded()
+        return RENDERERS[kind](**kwargs), metrics.drain_forwarded()
+    except Exception:
+        metrics.drain_forwarded()  # Don't let a failed job's timings leak into the next result
+        raise
+
+
+class RenderService:
+    """
+    Runs the CPU-bound PyMuPDF work in a pool of worker processes, so renders from many
+    users spread over all cores and never block the bot's event loop.
+    At most `max_pending` jobs may be queued or running (further jobs are rejected with
+    RenderBusy), each job has a timeout, and a job can be cancelled through its owner key.
+
+    Background jobs (bulk sends) don't count against `max_pending`: they have their own allowance
+    of `max_background` jobs and wait for room instead of being rejected, so batches can neither
+    crowd out interactive users nor fail because the service is busy.
+
+    A job that timed out or was cancelled while running still occupies its worker, so it keeps
+    counting against `max_pending` until it ends; if every worker is stuck on such jobs, the pool
+    is replaced. A pool broken by a crashed worker (out of memory, a crash inside MuPDF) is
+    replaced too, and the jobs it failed are tried once more on the new one.
+    """
+
+    def __init__(self, workers: int = None, max_pending: int = None, timeout: float = 60,
+                 max_background: int = None):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.workers * 4
+        self.max_background = max_background or self.workers
+        self.timeout = timeout
+
+        self._executor = None
+        self._pending = 0
+        self._background_slots = asyncio.Semaphore(self.max_background)
+        self._jobs = {}  # owner -> (future, cancel flag)
+        self._abandoned = set()  # Running jobs nobody waits for any more (concurrent futures)
+
+    def start(self):
+        if self._executor is None:
+            # 'spawn' keeps the workers clean of the bot's threads and open sockets.
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+
+    def stop(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _replace_pool(self, old: ProcessPoolExecutor):
+        """Swaps in a fresh pool for `old`, unless that already happened, and kills old's workers."""
+        if self._executor is not old:
+            return
+        self._executor = None
+        self.start()
+        # ProcessPoolExecutor has no public way to stop a worker that is stuck in a job
+        for process in list((getattr(old, "_processes", None) or {}).values()):
+            process.terminate()
+        old.shutdown(wait=False)
+
+    async def render(self, kind: str, owner=None, timeout: float = None, preview: bool = True,
+                     background: bool = False, **kwargs) -> tuple[bytes, bytes]:
+        """
+        Renders a letter in a worker process and returns (pdf_bytes, preview_bytes).
+        `owner` (e.g. the Telegram user id) lets cancel() stop the job later.
+        With preview=False no preview is made and preview_bytes is empty.
+        With background=True the job waits for one of the background slots instead of
+        raising RenderBusy; the timeout starts once it has one.
+        """
+        if kind not in RENDERERS:
+            raise ValueError(f"Unknown letter kind: '{kind}'")
+        if background:
+            async with self._background_slots:
+                return await self._run(kind, owner, timeout, preview, kwargs)
+        if self._pending + len(self._abandoned) >= self.max_pending:
+            raise RenderBusy("The letter generator is busy right now. Please try again in a moment.")
+        self._pending += 1
+        try:
+            return await self._run(kind, owner, timeout, preview, kwargs)
+        finally:
+            self._pending -= 1
+
+    async def _run(self, kind: str, owner, timeout: float, preview: bool, kwargs: dict) -> tuple[bytes, bytes]:
+        started = time.perf_counter()
+        job = {"future": None, "cancelled": False}
+        if owner is not None:
+            self.cancel(owner)  # A user only ever waits on their latest letter
+            self._jobs[owner] = job
+        try:
+            result, observations = await self._submit(job, kind, timeout, preview, kwargs)
+            metrics.replay(observations)
+            metrics.RENDER_JOB_SECONDS.observe(time.perf_counter() - started, kind=kind)
+            if job["cancelled"]:
+                # Cancelled after the worker finished but before this coroutine resumed
+                raise RenderCancelled("The letter was cancelled.")
+            return result
+        except asyncio.TimeoutError:
+            raise RenderTimeout("Generating the letter took too long. Please try again.")
+        except asyncio.CancelledError:
+            if job["cancelled"]:
+                raise RenderCancelled("The letter was cancelled.")
+            raise
+        finally:
+            if owner is not None and self._jobs.get(owner) is job:
+                del self._jobs[owner]
+
+    async def _submit(self, job: dict, kind: str, timeout: float, preview: bool, kwargs: dict):
+        """Runs the job on the pool, once more on a new pool if a crashed worker broke the first."""
+        for attempt in range(2):
+            self.start()
+            executor = self._executor
+            try:
+                work = executor.submit(_render, kind, kwargs, preview)
+                job["future"] = asyncio.wrap_future(work)
+                return await asyncio.wait_for(job["future"], timeout or self.timeout)
+            except BrokenProcessPool:
+                self._replace_pool(executor)
+                if attempt:
+                    raise RenderError("The letter generator crashed. Please try again.") from None
+                print(f"[ERROR] A render worker died; retrying the {kind} letter on a new pool.")
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                self._abandon(work, executor)
+                raise
+
+    def _abandon(self, work, executor: ProcessPoolExecutor):
+        """Keeps a job nobody waits for counted while it still holds a worker."""
+        if work.cancel() or work.done():  # Dropped before it started, or already over
+            return
+        self._abandoned.add(work)
+        work.add_done_callback(self._abandoned.discard)  # Runs in the pool's thread; set.discard is atomic
+        if len(self._abandoned) >= self.workers:
+            print(f"[ERROR] All {self.workers} render workers are stuck on abandoned jobs; replacing the pool.")
+            self._replace_pool(executor)
+
+    def cancel(self, owner) -> bool:
+        """
+        Cancels the owner's job; whoever is awaiting render() gets RenderCancelled straight away.
+        A job that hasn't started is dropped; one that is already running finishes in its worker
+        (counted against capacity until then) but its result is discarded. Returns False if the
+        owner has no render in progress.
+        """
+        job = self._jobs.pop(owner, None)
+        if job is None:
+            return False
+        job["cancelled"] = True
+        if job["future"] is not None:
+            job["future"].cancel()
+        return True
@@ -0,0 +1,37 @@
+# single_flight.py
+
+import asyncio
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent async calls that share a key: the first caller starts the call and
+    everyone who asks for the same key while it is in flight awaits that same result.
+    Nothing is cached; once the call finishes, the next caller starts a new one.
+    """
+
+    def __init__(self):
+        self._calls = {}  # key -> asyncio.Future of the call in flight
+
+    def in_flight(self, key) -> bool:
+        return key in self._calls
+
+    def start(self, key, func) -> asyncio.Future:
+        """Starts `func()` for `key` unless a call is already in flight, without waiting for it."""
+        future = self._calls.get(key)
+        if future is None:
+            future = asyncio.ensure_future(func())
+            self._calls[key] = future
+            future.add_done_callback(lambda done: self._forget(key, done))
+        return future
+
+    async def do(self, key, func):
+        """
+        Returns the result of `await func()`, sharing it with concurrent callers for `key`.
+        A caller that gets cancelled does not cancel the call for the others.
+        """
+        return await asyncio.shield(self.start(key, func))
+
+    def _forget(self, key, future):
+        if self._calls.get(key) is future:
+            del self._calls[key]
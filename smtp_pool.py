@@ -0,0 +1,131 @@
+# smtp_pool.py
+
+import smtplib
+import ssl
+import threading
+import time
+from collections import deque
+
+from metrics import SMTP_STAGE_SECONDS
+
+
+class SMTPConnectionPool:
+    """
+    A small pool of logged-in SMTP sessions for one sender account.
+    Sessions are reused between sends so the TCP connect, STARTTLS and LOGIN
+    handshake is only paid once per connection instead of once per email.
+    Idle sessions older than `idle_timeout` are closed, sessions that sat idle for
+    more than `health_check_after` seconds are checked with NOOP before reuse, and a
+    send that finds the server gone is retried once on a fresh connection.
+    """
+
+    def __init__(self, host: str, port: int, username: str, password: str, size: int = 2,
+                 idle_timeout: float = 240, health_check_after: float = 15, use_starttls: bool = True,
+                 timeout: float = 30):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.health_check_after = health_check_after
+        self.use_starttls = use_starttls
+        self.timeout = timeout
+
+        self._idle = deque()  # (server, last_used) pairs, most recently used on the right
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _connect(self) -> smtplib.SMTP:
+        print(f"Connecting to {self.host} on port {self.port}...")
+        with SMTP_STAGE_SECONDS.time(stage="connect"):
+            server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.use_starttls:
+                print("Securing connection with STARTTLS...")
+                with SMTP_STAGE_SECONDS.time(stage="starttls"):
+                    server.starttls(context=ssl.create_default_context())
+            print(f"Logging in as {self.username}...")
+            with SMTP_STAGE_SECONDS.time(stage="login"):
+                server.login(self.username, self.password)
+        except Exception:
+            self._close(server)
+            raise
+        return server
+
+    @staticmethod
+    def _close(server: smtplib.SMTP):
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    @staticmethod
+    def _is_healthy(server: smtplib.SMTP) -> bool:
+        try:
+            return server.noop()[0] == 250
+        except smtplib.SMTPException:
+            return False
+        except OSError:
+            return False
+
+    def _take_idle(self):
+        """Returns a reusable idle session, closing any that expired or failed the health check."""
+        now = time.monotonic()
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                server, last_used = self._idle.pop()
+            idle_for = now - last_used
+            if idle_for > self.idle_timeout:
+                self._close(server)
+                continue
+            if idle_for > self.health_check_after and not self._is_healthy(server):
+                self._close(server)
+                continue
+            return server
+
+    def acquire(self) -> smtplib.SMTP:
+        """Returns a logged-in session, waiting if all `size` sessions are in use."""
+        self._slots.acquire()
+        try:
+            return self._take_idle() or self._connect()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, server: smtplib.SMTP, discard: bool = False):
+        """Returns a session to the pool, or closes it when `discard` is set."""
+        if discard:
+            self._close(server)
+        else:
+            with self._lock:
+                self._idle.append((server, time.monotonic()))
+        self._slots.release()
+
+    def sendmail(self, from_addr: str, to_addrs: list, msg):
+        """Sends a message over a pooled session, reconnecting once if the server dropped it."""
+        for attempt in range(2):
+            server = self.acquire()
+            try:
+                with SMTP_STAGE_SECONDS.time(stage="send"):
+                    result = server.sendmail(from_addr, to_addrs, msg)
+            except smtplib.SMTPServerDisconnected:
+                self.release(server, discard=True)
+                if attempt == 1:
+                    raise
+                print("SMTP session was disconnected, reconnecting...")
+                continue
+            except Exception:
+                self.release(server, discard=True)
+                raise
+            self.release(server)
+            return result
+
+    def close(self):
+        """Closes every idle session. Call this on shutdown."""
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for server, _ in idle:
+            self._close(server)
@@ -0,0 +1,95 @@
+# smtp_sink.py
+
+import socketserver
+import threading
+import time
+
+
+class _SinkHandler(socketserver.StreamRequestHandler):
+    """Speaks just enough SMTP (no STARTTLS) for smtplib to log in and send."""
+
+    def handle(self):
+        sink = self.server.sink
+        sink._count("connections")
+        self._reply("220 smtp-sink ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode("latin-1").strip().split(" ", 1)[0].upper()
+            if command in ("EHLO", "HELO"):
+                self._reply("250-smtp-sink", "250-AUTH PLAIN LOGIN", "250 SIZE 52428800")
+            elif command == "AUTH":
+                sink._pause(sink.login_delay)
+                self._reply("235 Authentication successful")
+            elif command == "DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                size = 0
+                while True:
+                    data_line = self.rfile.readline()
+                    if not data_line or data_line == b".\r\n":
+                        break
+                    size += len(data_line)
+                sink._pause(sink.send_delay)
+                sink._count("messages", size)
+                self._reply("250 Queued")
+            elif command == "QUIT":
+                self._reply("221 Bye")
+                return
+            else:
+                # MAIL, RCPT, RSET, NOOP
+                self._reply("250 OK")
+
+    def _reply(self, *lines):
+        self.wfile.write("".join(f"{line}\r\n" for line in lines).encode("latin-1"))
+        self.wfile.flush()
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class SMTPSink:
+    """
+    A local SMTP server that accepts and discards every message, for benchmarks and load
+    tests. `login_delay` and `send_delay` (seconds) simulate a slow provider.
+    Pair it with SMTPConnectionPool(..., use_starttls=False).
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, login_delay: float = 0.0, send_delay: float = 0.0):
+        self.login_delay = login_delay
+        self.send_delay = send_delay
+        self.connections = 0
+        self.messages = 0
+        self.bytes_received = 0
+        self._lock = threading.Lock()
+        self._server = _Server((host, port), _SinkHandler)
+        self._server.sink = self
+        self._thread = None
+
+    @property
+    def address(self) -> tuple:
+        return self._server.server_address
+
+    def _count(self, what: str, size: int = 0):
+        with self._lock:
+            if what == "connections":
+                self.connections += 1
+            else:
+                self.messages += 1
+                self.bytes_received += size
+
+    @staticmethod
+    def _pause(delay: float):
+        if delay > 0:
+            time.sleep(delay)
+
+    def start(self) -> "SMTPSink":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="smtp-sink", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
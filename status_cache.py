@@ -0,0 +1,178 @@
+# status_cache.py
+
+import atexit
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class StatusCache:
+    """
+    In-memory cache of user statuses with TTL expiry and LRU eviction.
+    The JSON file is only a warm-start snapshot: it is read once on startup and
+    written back every `flush_interval` seconds (at most) and on shutdown,
+    so a lookup never touches the disk.
+    """
+
+    def __init__(self, path: str, max_size: int = 10000, ttl: float = 6 * 3600, flush_interval: float = 60):
+        self.path = path
+        self.max_size = max_size
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+
+        # user_id (str) -> (stored_at, data); ordered from least to most recently used
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self._dirty = False
+        self._last_flush = time.monotonic()
+        self._load()
+
+    def _load(self):
+        """Loads the snapshot written by a previous run, dropping anything already past its TTL."""
+        try:
+            with open(self.path, 'r') as f:
+                snapshot = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+
+        now = time.time()
+        # Older versions of the bot stored a flat {user_id: data} mapping with no timestamps.
+        entries = snapshot.get("entries") if "entries" in snapshot else {k: [now, v] for k, v in snapshot.items()}
+        for key, (stored_at, data) in sorted(entries.items(), key=lambda item: item[1][0]):
+            if now - stored_at < self.ttl:
+                self._entries[key] = (stored_at, data)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def get(self, user_id):
+        """Returns the cached data for a user, or None if it is missing or past its TTL."""
+        entry = self.get_entry(user_id)
+        return entry[0] if entry is not None else None
+
+    def get_entry(self, user_id):
+        """Returns (data, stored_at) for a user, or None if it is missing or past its TTL."""
+        key = str(user_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, data = entry
+            if time.time() - stored_at >= self.ttl:
+                del self._entries[key]
+                self._dirty = True
+                return None
+            self._entries.move_to_end(key)
+            return data, stored_at
+
+    def set(self, user_id, data: dict, stored_at: float = None):
+        """
+        Stores data for a user, evicting the least recently used entry if the cache is full.
+        `stored_at` (Unix time) backdates data that was already this old, e.g. read from the database.
+        """
+        key = str(user_id)
+        with self._lock:
+            self._entries[key] = (time.time() if stored_at is None else stored_at, data)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            self._dirty = True
+        self.maybe_flush()
+
+    def invalidate(self, user_id) -> bool:
+        """Drops a single user from the cache. Returns True if an entry was removed."""
+        key = str(user_id)
+        with self._lock:
+            if self._entries.pop(key, None) is None:
+                return False
+            self._dirty = True
+        self.maybe_flush()
+        return True
+
+    def __len__(self):
+        return len(self._entries)
+
+    def maybe_flush(self):
+        """Writes the snapshot if there are unsaved changes and the flush interval has passed."""
+        if self._dirty and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Writes the snapshot to disk atomically, so a crash mid-write never leaves a corrupt file."""
+        with self._lock:
+            if not self._dirty:
+                return
+            snapshot = {"entries": {key: [stored_at, data] for key, (stored_at, data) in self._entries.items()}}
+            self._dirty = False
+            self._last_flush = time.monotonic()
+
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(snapshot, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Could not write status cache snapshot: {e}")
+            self._dirty = True
+
+
+class NegativeCache:
+    """
+    Remembers, for a short while, lookups that did not find a status: users the Sheet doesn't
+    know (`not_found`) for `ttl` seconds and failed lookups for `error_ttl` seconds. Repeated
+    messages from such users then don't go back to the Sheet every time. Memory only.
+    """
+
+    def __init__(self, ttl: float = 60, error_ttl: float = 10, max_size: int = 10000):
+        self.ttl = ttl
+        self.error_ttl = error_ttl
+        self.max_size = max_size
+        # user_id (str) -> (expires_at, result); ordered from oldest to newest
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        """Returns the remembered result for a user, or None if there is none or it has expired."""
+        key = str(user_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, result = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                return None
+            return result
+
+    def set(self, user_id, result: dict):
+        """Remembers a `not_found` or `error` result; other results are ignored."""
+        ttl = {"not_found": self.ttl, "error": self.error_ttl}.get(result.get("status"))
+        if not ttl:
+            return
+        key = str(user_id)
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.monotonic() + ttl, result)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id) -> bool:
+        """Forgets a user's result. Returns True if there was one."""
+        with self._lock:
+            return self._entries.pop(str(user_id), None) is not None
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def create_status_cache(path: str) -> StatusCache:
+    """Builds the cache from environment settings and makes sure it is saved when the process exits."""
+    cache = StatusCache(
+        path,
+        max_size=int(os.getenv('STATUS_CACHE_MAX_SIZE', 10000)),
+        ttl=float(os.getenv('STATUS_CACHE_TTL', 6 * 3600)),
+        flush_interval=float(os.getenv('STATUS_CACHE_FLUSH_INTERVAL', 60)),
+    )
+    atexit.register(cache.flush)
+    return cache
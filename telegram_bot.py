@@ -9,10 +9,18 @@ from telegram.ext import (
     MessageHandler, filters, ContextTypes, CallbackQueryHandler
 )
 
-from email_sender import send_personalized_email
-import pdf_generator
+from email_sender import close_pools
+from delivery import DeliveryService
+import template_registry
+from render_service import RenderService, RenderCancelled
+from batch_render import parse_records
+from bulk_send import BulkSend, validate_rows, render_kwargs
+from update_processor import PerUserUpdateProcessor
 import database_handler
+import http_client
 import razorpay_handler
+import razorpay_webhook
+import metrics
 import os
 from dotenv import load_dotenv
 
@@ -20,6 +28,26 @@ from dotenv import load_dotenv
 load_dotenv()
 
 TELEGRAM_BOT_TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN")
+# Number of emails sent in parallel by the delivery workers
+EMAIL_WORKERS = int(os.environ.get("EMAIL_WORKERS", 4))
+# Worker processes for PDF rendering (defaults to one per CPU core) and the per-letter time limit
+RENDER_WORKERS = int(os.environ.get("RENDER_WORKERS", 0)) or None
+RENDER_TIMEOUT = float(os.environ.get("RENDER_TIMEOUT", 60))
+# Largest CSV accepted by the bulk send flow, and how often its progress message is edited
+BULK_MAX_ROWS = int(os.environ.get("BULK_MAX_ROWS", 1000))
+BULK_MAX_FILE_SIZE = 2 * 1024 * 1024
+BULK_PROGRESS_INTERVAL = float(os.environ.get("BULK_PROGRESS_INTERVAL", 3))
+# Updates handled at the same time across all users (each user's own updates still run one by one)
+CONCURRENT_UPDATES = int(os.environ.get("CONCURRENT_UPDATES", 64))
+
+# Sends letters in the background so handlers never wait on SMTP
+email_delivery = DeliveryService(workers=EMAIL_WORKERS)
+# Renders letters in worker processes so PyMuPDF never blocks the event loop
+render_service = RenderService(workers=RENDER_WORKERS, timeout=RENDER_TIMEOUT)
+# Receives Razorpay's payment webhooks; created on startup when RAZORPAY_WEBHOOK_SECRET is set
+webhook_server = None
+# Serves /metrics for Prometheus on METRICS_PORT
+metrics_server = None
 
 
 # State Definitions
@@ -28,7 +56,8 @@ TELEGRAM_BOT_TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN")
     GET_CA_NAME, GET_CA_EMAIL, CONFIRM_CA,
     GET_INTERN_NAME, CONFIRM_INTERN,
     GET_OFFER_NAME, GET_OFFER_EMAIL, GET_OFFER_TRAINING_DATE, CONFIRM_OFFER,
-) = range(11)
+    GET_BULK_FILE, CONFIRM_BULK,
+) = range(13)
 
 
 # --- THE GATEKEEPER ---
@@ -40,13 +69,13 @@ async def gatekeeper_check(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     user_id = update.effective_user.id
     username = update.effective_user.username or update.effective_user.first_name
 
-    status_data = database_handler.get_user_status(user_id)
+    status_data = await database_handler.get_user_status_async(user_id)
     status = status_data.get("status")
 
     # --- THIS IS THE KEY CHANGE ---
     # If the user is new, register them and immediately show the paywall.
     if status == "not_found":
-        database_handler.register_new_user(user_id, username)
+        await database_handler.register_new_user_async(user_id, username)
         await context.bot.send_message(
             chat_id=user_id,
             text="Welcome! To get started and access all features, please subscribe for ₹999/month."
@@ -82,7 +111,7 @@ async def show_paywall(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
 
     # --- THIS IS THE CORRECTED FUNCTION CALL ---
     # It now calls our new, clean function with no extra arguments.
-    payment_url = razorpay_handler.create_payment_link(user_id)
+    payment_url = await razorpay_handler.create_payment_link_async(user_id)
 
     if payment_url:
         # --- TEXT AND BUTTONS ARE NOW CORRECT ---
@@ -106,15 +135,36 @@ async def show_paywall(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
         return CHOOSING_ACTION
 
 
+async def send_renewal_reminder(bot, user_id: int, expiry_date: str) -> None:
+    """Sent by the expiry scheduler shortly before a subscription lapses, with a link to renew early."""
+    try:
+        payment_url = await razorpay_handler.create_payment_link_async(user_id)
+        keyboard = None
+        if payment_url:
+            keyboard = InlineKeyboardMarkup([[InlineKeyboardButton("Renew: ₹999 for 30 more days", url=payment_url)]])
+        await bot.send_message(
+            chat_id=user_id,
+            text=f"⏳ Your access ends on {expiry_date}. Renew now and the 30 days are added on top of "
+                 "your remaining time, so nothing is lost.",
+            reply_markup=keyboard
+        )
+    except Exception:
+        metrics.RENEWAL_REMINDERS_TOTAL.inc(result="failed")
+        raise
+    metrics.RENEWAL_REMINDERS_TOTAL.inc(result="sent")
+
+
 async def handle_payment_confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handles the 'I've Paid' button click."""
     query = update.callback_query
     await query.answer(text="Checking your status, please wait...")
 
     database_handler.clear_user_cache(update.effective_user.id)
-    status_data = database_handler.get_user_status(update.effective_user.id)
+    status_data = await database_handler.get_user_status_async(update.effective_user.id)
 
     if status_data.get("status") == "active":
+        # The old link has been paid; the next paywall (after this subscription ends) needs a new one.
+        razorpay_handler.invalidate_payment_link(update.effective_user.id)
         # Remove the paywall buttons and show a confirmation.
         await query.edit_message_text(
             text=f"✅ Payment confirmed! Your subscription is now active until {status_data.get('expiry_date')}.\n\nWhat would you like to do?"
@@ -137,7 +187,7 @@ async def show_main_options(update: Update, context: ContextTypes.DEFAULT_TYPE)
     if update.callback_query:
         chat_id = update.callback_query.message.chat_id
 
-    keyboard = [["Campus Ambassador Letter"], ["Internship Acceptance Letter"], ["Offer Letter"]]
+    keyboard = [["Campus Ambassador Letter"], ["Internship Acceptance Letter"], ["Offer Letter"], ["Bulk Send (CSV)"]]
     await context.bot.send_message(
         chat_id=chat_id,
         text="Please choose an action:",
@@ -158,6 +208,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
 
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Universal cancel command for text input."""
+    render_service.cancel(update.effective_user.id)
     context.user_data.clear()
     await update.message.reply_text("Operation cancelled.", reply_markup=ReplyKeyboardRemove())
     # Re-run the start command to check status and show appropriate menu/paywall
@@ -185,6 +236,8 @@ async def route_action(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
         return await start_intern_flow(update, context)
     elif user_choice == "Offer Letter":
         return await start_offer_letter_flow(update, context)
+    elif user_choice == "Bulk Send (CSV)":
+        return await start_bulk_flow(update, context)
     # If text doesn't match, just show the main options again.
     return await show_main_options(update, context)
 
@@ -197,7 +250,10 @@ def get_user_display_name(update: Update) -> str:
 
 # --- UNIFIED FINAL PROCESSING FUNCTION ---
 async def process_and_send_letter(update: Update, context: ContextTypes.DEFAULT_TYPE, letter_type: str):
-    """A single function to email the pre-generated PDF and log the activity."""
+    """
+    Hands the pre-generated PDF to the email delivery workers and returns straight away.
+    The status message is updated and the activity logged once delivery finishes.
+    """
     query = update.callback_query
     await query.answer()
 
@@ -205,56 +261,71 @@ async def process_and_send_letter(update: Update, context: ContextTypes.DEFAULT_
     if not await gatekeeper_check(update, context):
         await query.edit_message_text(
             text="Sorry, your subscription status changed. Please complete the payment to send letters.")
-        # Clean up temporary files
-        if 'pdf_path' in context.user_data and os.path.exists(context.user_data['pdf_path']):
-            os.remove(context.user_data['pdf_path'])
-        if 'preview_path' in context.user_data and os.path.exists(context.user_data['preview_path']):
-            os.remove(context.user_data['preview_path'])
         context.user_data.clear()
         return AWAITING_PAYMENT_CONFIRMATION
 
-    await query.edit_message_text(text="Processing and sending...")
+    await query.edit_message_text(text="Queued for sending...")
 
     user_display_name = get_user_display_name(update)
-    data = context.user_data
-    pdf_path = data.get('pdf_path')
-    email_sent = False
-    recipient_data = {}
+    # The conversation moves on immediately, so the job keeps its own copy of the data.
+    data = dict(context.user_data)
+    context.user_data.clear()
+    pdf_bytes = data.get('pdf_bytes')
+    chat_id = query.message.chat_id
+    message_id = query.message.message_id
+
+    async def on_delivery_done(job):
+        recipient_data = job.recipient_data
+        if job.status == "sent":
+            text = f"✅ Success! The letter has been sent to {data['name']}."
+            log_status = "✅ Sent"
+        else:
+            text = f"⚠️ Failure! The email to {data['name']} could not be sent: {job.error}"
+            log_status = "⚠️ Failed"
+        try:
+            await context.bot.edit_message_text(chat_id=chat_id, message_id=message_id, text=text)
+        except BadRequest:
+            await context.bot.send_message(chat_id=chat_id, text=text)
+        await database_handler.log_activity_async(recipient_data['letter_type'], data['name'], data['email'], user_display_name, log_status)
 
     try:
-        if not pdf_path or not os.path.exists(pdf_path):
-            raise FileNotFoundError("The generated PDF file could not be found. Please restart the process.")
+        if not pdf_bytes:
+            raise ValueError("The generated PDF could not be found. Please restart the process.")
 
         if letter_type == "CA":
             recipient_data = {"name": data['name'], "email": data['email'], "domain": "Community", "letter_type": "Campus Ambassador"}
-            email_sent = send_personalized_email(pdf_path, recipient_data)
+            await email_delivery.submit(pdf_bytes, recipient_data, on_done=on_delivery_done)
         elif letter_type == "Intern":
             recipient_data = {"name": data['name'], "email": data['email'], "domain": data['domain'], "letter_type": "Internship Acceptance"}
-            email_sent = send_personalized_email(pdf_path, recipient_data)
+            await email_delivery.submit(pdf_bytes, recipient_data, on_done=on_delivery_done)
         elif letter_type == "Offer":
             recipient_data = {"name": data['name'], "email": data['email'], "domain": "General", "letter_type": "Offer Letter"}
-            email_sent = send_personalized_email(pdf_path, recipient_data, sender_account='hr')
-
-        if email_sent:
-            await context.bot.send_message(chat_id=update.effective_chat.id, text=f"✅ Success! The letter has been sent to {data['name']}.")
-            database_handler.log_activity(recipient_data['letter_type'], data['name'], data['email'], user_display_name, "✅ Sent")
-        else:
-            await context.bot.send_message(chat_id=update.effective_chat.id, text=f"⚠️ Failure! The email to {data['name']} could not be sent. Please check credentials and console logs.")
-            database_handler.log_activity(recipient_data['letter_type'], data['name'], data['email'], user_display_name, "⚠️ Failed")
+            await email_delivery.submit(pdf_bytes, recipient_data, sender_account='hr', on_done=on_delivery_done)
 
     except Exception as e:
         await context.bot.send_message(chat_id=update.effective_chat.id, text=f"An unexpected error occurred: {e}")
-        database_handler.log_activity(data.get('letter_type', 'Unknown'), data.get('name', 'N/A'), data.get('email', 'N/A'), user_display_name, f"❌ Error: {e}")
+        await database_handler.log_activity_async(data.get('letter_type', 'Unknown'), data.get('name', 'N/A'), data.get('email', 'N/A'), user_display_name, f"❌ Error: {e}")
 
+    # Don't wait for the email; show the main menu again right away.
+    return await show_main_options(update, context)
+
+
+# --- Rendering with a Cancel button ---
+async def render_with_status(update: Update, message, text: str, kind: str, **kwargs) -> tuple[bytes, bytes]:
+    """
+    Renders a letter with its preview while `text` is shown with a Cancel button. The button and
+    /cancel reach cancel_final_confirmation / cancel while the render is still running, which
+    stops it; RenderCancelled is raised here then.
+    """
+    keyboard = InlineKeyboardMarkup([[InlineKeyboardButton("❌ Cancel", callback_data="cancel_final")]])
+    status_message = await message.reply_text(text, reply_markup=keyboard)
+    try:
+        return await render_service.render(kind, owner=update.effective_user.id, **kwargs)
     finally:
-        # Clean up temporary files
-        if 'pdf_path' in data and os.path.exists(data['pdf_path']):
-            os.remove(data['pdf_path'])
-        if 'preview_path' in data and os.path.exists(data['preview_path']):
-            os.remove(data['preview_path'])
-        context.user_data.clear()
-        # After sending, show the main menu again.
-        return await show_main_options(update, context)
+        try:
+            await status_message.edit_reply_markup(reply_markup=None)
+        except BadRequest:
+            pass  # Already edited by the cancel handler
 
 
 # --- Conversational Flow Steps ---
@@ -270,18 +341,21 @@ async def get_ca_name(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
 
 async def get_ca_email(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     context.user_data['email'] = update.message.text.strip()
-    await update.message.reply_text("Generating preview...")
     try:
-        pdf_path, preview_path = pdf_generator.generate_campus_ambassador_pdf_with_preview(context.user_data['name'])
-        context.user_data['pdf_path'] = pdf_path
-        context.user_data['preview_path'] = preview_path
-        with open(preview_path, 'rb') as photo_file:
-            await update.message.reply_photo(photo=photo_file)
+        pdf_bytes, preview_bytes = await render_with_status(
+            update, update.message, "Generating preview...", "ca", name=context.user_data['name']
+        )
+        context.user_data['pdf_bytes'] = pdf_bytes
+        await update.message.reply_photo(photo=preview_bytes)
         summary = (f"This is a preview. Shall I proceed and send the full letter to **{context.user_data['email']}**?")
         keyboard = [[InlineKeyboardButton("✅ Yes, Send Now", callback_data="send_ca")],
                     [InlineKeyboardButton("❌ No, Cancel", callback_data="cancel_final")]]
         await update.message.reply_text(summary, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='Markdown')
         return CONFIRM_CA
+    except RenderCancelled:
+        # The user cancelled while the letter was rendering; the cancel handler already replied
+        # and moved the conversation on, so leave its state alone.
+        return None
     except Exception as e:
         await update.message.reply_text(f"An error occurred while generating the preview: {e}")
         return await show_main_options(update, context)
@@ -296,27 +370,63 @@ async def start_intern_flow(update: Update, context: ContextTypes.DEFAULT_TYPE)
 async def process_intern_name(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     name = update.message.text.strip()
     await update.message.reply_text(f"Searching for '{name}'...")
-    student_data = database_handler.fetch_student_from_client_sheet(name)
+    student_data = await database_handler.find_student_async(name)
     if not student_data:
-        await update.message.reply_text(f"Could not find '{name}' in the Onboarding sheet.")
-        return await show_main_options(update, context)
+        suggestions = database_handler.suggest_students(name)
+        if not suggestions:
+            await update.message.reply_text(f"Could not find '{name}' in the Onboarding sheet.")
+            return await show_main_options(update, context)
+        # Offer the closest names instead of sending the user back to retype it.
+        context.user_data['intern_candidates'] = suggestions
+        keyboard = [[InlineKeyboardButton(candidate, callback_data=f"pick_intern:{i}")]
+                    for i, candidate in enumerate(suggestions)]
+        keyboard.append([InlineKeyboardButton("❌ None of these", callback_data="cancel_final")])
+        await update.message.reply_text(
+            f"Could not find '{name}' in the Onboarding sheet. Did you mean one of these? You can also type the name again.",
+            reply_markup=InlineKeyboardMarkup(keyboard)
+        )
+        return GET_INTERN_NAME
+    return await send_intern_preview(update, context, student_data)
+
+
+async def pick_intern_candidate(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Handles a tap on one of the suggested intern names."""
+    query = update.callback_query
+    await query.answer()
+    candidates = context.user_data.get('intern_candidates', [])
+    index = int(query.data.split(":", 1)[1])
+    student_data = await database_handler.find_student_async(candidates[index]) if index < len(candidates) else None
+    if not student_data:
+        await query.edit_message_text(text="That suggestion is no longer available. Please type the intern's name again.")
+        return GET_INTERN_NAME
+    await query.edit_message_text(text=f"Selected '{student_data['name']}'.")
+    return await send_intern_preview(update, context, student_data)
+
+
+async def send_intern_preview(update: Update, context: ContextTypes.DEFAULT_TYPE, student_data: dict) -> int:
+    """Generates the internship letter for a resolved student and asks for confirmation."""
+    # Reached from a typed name or from a tapped suggestion
+    message = update.message or update.callback_query.message
+    context.user_data.pop('intern_candidates', None)
     context.user_data.update(student_data)
-    await update.message.reply_text("Generating preview...")
     try:
-        pdf_path, preview_path = pdf_generator.generate_internship_acceptance_pdf_with_preview(
+        pdf_bytes, preview_bytes = await render_with_status(
+            update, message, "Generating preview...", "intern",
             name=student_data['name'], month=student_data['month'], domain=student_data['domain']
         )
-        context.user_data['pdf_path'] = pdf_path
-        context.user_data['preview_path'] = preview_path
-        with open(preview_path, 'rb') as photo_file:
-            await update.message.reply_photo(photo=photo_file)
+        context.user_data['pdf_bytes'] = pdf_bytes
+        await message.reply_photo(photo=preview_bytes)
         summary = (f"This is a preview. Shall I proceed and send the full letter to **{student_data['email']}**?")
         keyboard = [[InlineKeyboardButton("✅ Yes, Send Now", callback_data="send_intern")],
                     [InlineKeyboardButton("❌ No, Cancel", callback_data="cancel_final")]]
-        await update.message.reply_text(summary, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='Markdown')
+        await message.reply_text(summary, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='Markdown')
         return CONFIRM_INTERN
+    except RenderCancelled:
+        # The user cancelled while the letter was rendering; the cancel handler already replied
+        # and moved the conversation on, so leave its state alone.
+        return None
     except Exception as e:
-        await update.message.reply_text(f"An error occurred while generating the preview: {e}")
+        await message.reply_text(f"An error occurred while generating the preview: {e}")
         return await show_main_options(update, context)
 
 
@@ -340,51 +450,233 @@ async def get_offer_email(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 
 async def get_offer_training_date(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     context.user_data['training_from'] = update.message.text.strip()
-    await update.message.reply_text("Generating preview...")
     try:
-        pdf_path, preview_path = pdf_generator.generate_offer_letter_pdf_with_preview(
+        pdf_bytes, preview_bytes = await render_with_status(
+            update, update.message, "Generating preview...", "offer",
             name=context.user_data['name'], training_from=context.user_data['training_from']
         )
-        context.user_data['pdf_path'] = pdf_path
-        context.user_data['preview_path'] = preview_path
-        with open(preview_path, 'rb') as photo_file:
-            await update.message.reply_photo(photo=photo_file)
+        context.user_data['pdf_bytes'] = pdf_bytes
+        await update.message.reply_photo(photo=preview_bytes)
         summary = (
             f"This is a preview. The full letter will be sent from the **HR email** to **{context.user_data['email']}**. Shall I proceed?")
         keyboard = [[InlineKeyboardButton("✅ Yes, Send Now", callback_data="send_offer")],
                     [InlineKeyboardButton("❌ No, Cancel", callback_data="cancel_final")]]
         await update.message.reply_text(summary, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='Markdown')
         return CONFIRM_OFFER
+    except RenderCancelled:
+        # The user cancelled while the letter was rendering; the cancel handler already replied
+        # and moved the conversation on, so leave its state alone.
+        return None
     except Exception as e:
         await update.message.reply_text(f"An error occurred while generating the preview: {e}")
         return await show_main_options(update, context)
 
 
+async def start_bulk_flow(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    context.user_data.clear()
+    await update.message.reply_text(
+        "Let's send letters in bulk. Please upload a CSV file with these columns:\n"
+        "letter_type, name, email, month, domain, training_date\n\n"
+        "letter_type is CA, Intern or Offer. Internship letters need month and domain; "
+        f"offer letters need training_date (DD-MM-YYYY). Up to {BULK_MAX_ROWS} rows.",
+        reply_markup=ReplyKeyboardRemove()
+    )
+    return GET_BULK_FILE
+
+
+async def process_bulk_file(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Validates every row of the uploaded CSV and shows a preview of the first letter."""
+    document = update.message.document
+    if not (document.file_name or "").lower().endswith(".csv"):
+        await update.message.reply_text("Please upload a .csv file, or /cancel to stop.")
+        return GET_BULK_FILE
+    if document.file_size and document.file_size > BULK_MAX_FILE_SIZE:
+        await update.message.reply_text("That file is too large. Please split it into smaller files.")
+        return GET_BULK_FILE
+
+    try:
+        telegram_file = await document.get_file()
+        content = await telegram_file.download_as_bytearray()
+        rows = parse_records(bytes(content).decode("utf-8-sig"), "csv")
+    except Exception as e:
+        await update.message.reply_text(f"Could not read that file: {e}")
+        return GET_BULK_FILE
+    if not rows:
+        await update.message.reply_text("That file has no rows. Please upload a CSV with a header and at least one row.")
+        return GET_BULK_FILE
+    if len(rows) > BULK_MAX_ROWS:
+        await update.message.reply_text(f"That file has {len(rows)} rows; the limit is {BULK_MAX_ROWS}. Please split it.")
+        return GET_BULK_FILE
+
+    records, errors = validate_rows(rows)
+    if errors:
+        shown = "\n".join(errors[:20])
+        more = f"\n...and {len(errors) - 20} more." if len(errors) > 20 else ""
+        await update.message.reply_text(
+            f"Found {len(errors)} problem(s) in the file. Nothing has been sent.\n\n{shown}{more}\n\n"
+            "Please fix the file and upload it again, or /cancel to stop."
+        )
+        return GET_BULK_FILE
+
+    sample = records[0]
+    try:
+        _, preview_bytes = await render_with_status(update, update.message,
+                                                    "All rows look good. Generating a sample preview...",
+                                                    sample["kind"], **render_kwargs(sample))
+    except RenderCancelled:
+        # The user cancelled while the letter was rendering; the cancel handler already replied
+        # and moved the conversation on, so leave its state alone.
+        return None
+    except Exception as e:
+        await update.message.reply_text(f"An error occurred while generating the preview: {e}")
+        return await show_main_options(update, context)
+
+    context.user_data['bulk_records'] = records
+    counts = {}
+    for record in records:
+        counts[record['kind']] = counts.get(record['kind'], 0) + 1
+    breakdown = ", ".join(f"{count} {label}" for kind, label in (("ca", "CA"), ("intern", "Internship"), ("offer", "Offer"))
+                          if (count := counts.get(kind)))
+    await update.message.reply_photo(photo=preview_bytes, caption=f"Sample: the letter for {sample['name']}.")
+    keyboard = [[InlineKeyboardButton(f"✅ Yes, Send All {len(records)}", callback_data="send_bulk")],
+                [InlineKeyboardButton("❌ No, Cancel", callback_data="cancel_final")]]
+    await update.message.reply_text(
+        f"Ready to send {len(records)} letters ({breakdown}). Shall I proceed?",
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+    return CONFIRM_BULK
+
+
+def _bulk_progress_text(batch: BulkSend) -> str:
+    if batch.finished_at is None:
+        return f"📤 Sending letters... {batch.done}/{batch.total} done ({batch.sent} sent, {len(batch.failed)} failed)."
+    text = (f"✅ Bulk send finished in {batch.finished_at - batch.started_at:.0f}s: "
+            f"{batch.sent} of {batch.total} letters sent.")
+    if batch.failed:
+        failures = "\n".join(f"• {record['name']} <{record['email']}>: {error}" for record, error in batch.failed[:20])
+        more = f"\n...and {len(batch.failed) - 20} more." if len(batch.failed) > 20 else ""
+        text += f"\n\n⚠️ {len(batch.failed)} failed:\n{failures}{more}"
+    return text
+
+
+async def process_bulk_send(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Starts the confirmed bulk send in the background and reports progress in one message."""
+    query = update.callback_query
+    await query.answer()
+
+    if not await gatekeeper_check(update, context):
+        await query.edit_message_text(
+            text="Sorry, your subscription status changed. Please complete the payment to send letters.")
+        context.user_data.clear()
+        return AWAITING_PAYMENT_CONFIRMATION
+
+    records = context.user_data.pop('bulk_records', None)
+    context.user_data.clear()
+    if not records:
+        await query.edit_message_text(text="This batch is no longer available. Please upload the file again.")
+        return await show_main_options(update, context)
+
+    user_display_name = get_user_display_name(update)
+    chat_id = query.message.chat_id
+    message_id = query.message.message_id
+
+    async def on_progress(batch):
+        try:
+            await context.bot.edit_message_text(chat_id=chat_id, message_id=message_id, text=_bulk_progress_text(batch))
+        except BadRequest as e:
+            if "Message is not modified" not in e.message:
+                raise
+
+    async def run_batch():
+        batch = BulkSend(records, render_service, email_delivery, on_progress=on_progress,
+                         max_in_flight=render_service.workers * 2, progress_interval=BULK_PROGRESS_INTERVAL)
+        await batch.run()
+        status = f"✅ Sent {batch.sent}/{batch.total}"
+        if batch.failed:
+            status += f", ⚠️ {len(batch.failed)} failed"
+        await database_handler.log_activity_async("Bulk Send", f"{batch.total} recipients", "-", user_display_name, status)
+
+    await query.edit_message_text(text=f"📤 Sending letters... 0/{len(records)} done.")
+    context.application.create_task(run_batch(), update=update)
+    # Don't wait for the batch; show the main menu again right away.
+    return await show_main_options(update, context)
+
+
 async def cancel_final_confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handles the final 'No, Cancel' button click."""
     query = update.callback_query
     await query.answer()
+    render_service.cancel(update.effective_user.id)
     try:
         await query.edit_message_text(text="Operation cancelled.")
     except BadRequest as e:
         # Ignore error if the message was not modified
         if "Message is not modified" not in e.message:
             raise
-    # Clean up temporary files
-    if 'pdf_path' in context.user_data and os.path.exists(context.user_data['pdf_path']):
-        os.remove(context.user_data['pdf_path'])
-    if 'preview_path' in context.user_data and os.path.exists(context.user_data['preview_path']):
-        os.remove(context.user_data['preview_path'])
     context.user_data.clear()
     # Show the main menu again.
     return await show_main_options(update, context)
 
 
+# --- Application Lifecycle ---
+async def on_startup(application: Application) -> None:
+    """Starts the background services the handlers rely on."""
+    # Load and validate every letter template now, so a broken one stops the bot at startup.
+    template_registry.get_registry()
+    database_handler.start_background_sync()
+    if application.job_queue is None:
+        raise RuntimeError("Subscription expiry needs the job queue: pip install \"python-telegram-bot[job-queue]\"")
+    database_handler.start_expiry_scheduler(application.job_queue, send_renewal_reminder)
+    email_delivery.start()
+    render_service.start()
+
+    async def on_payment_activated(user_id: int, status_data: dict):
+        await application.bot.send_message(
+            chat_id=user_id,
+            text=f"✅ Payment received! Your subscription is now active until {status_data.get('expiry_date')}.\n\n"
+                 "Send /start to continue."
+        )
+
+    global webhook_server, metrics_server
+    webhook_server = razorpay_webhook.create_webhook_server(on_activated=on_payment_activated)
+    if webhook_server is not None:
+        await webhook_server.start()
+    metrics_server = metrics.create_metrics_server()
+    if metrics_server is not None:
+        await metrics_server.start()
+
+
+async def on_shutdown(application: Application) -> None:
+    """Finishes queued emails and persists local state before the process exits."""
+    if webhook_server is not None:
+        await webhook_server.stop()
+    if metrics_server is not None:
+        await metrics_server.stop()
+    render_service.stop()
+    await email_delivery.stop()
+    await database_handler.shutdown()
+    await http_client.close_client()
+    close_pools()
+
+
 # --- Main Application Setup ---
-def main() -> None:
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+def build_application(token: str = TELEGRAM_BOT_TOKEN, request=None) -> Application:
+    """
+    Builds the bot with all its handlers. `request` replaces the HTTP layer used to talk
+    to the Bot API (the load test passes a local fake here).
+    """
+    builder = (
+        Application.builder()
+        .token(token)
+        .concurrent_updates(PerUserUpdateProcessor(CONCURRENT_UPDATES))
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+    )
+    if request is not None:
+        builder = builder.request(request).updater(None)
+    application = builder.build()
 
-    action_buttons_regex = "^(Campus Ambassador Letter|Internship Acceptance Letter|Offer Letter)$"
+    action_buttons_regex = "^(Campus Ambassador Letter|Internship Acceptance Letter|Offer Letter|Bulk Send \\(CSV\\))$"
 
     conv_handler = ConversationHandler(
         entry_points=[
@@ -404,13 +696,19 @@ def main() -> None:
             GET_CA_EMAIL: [MessageHandler(filters.TEXT & ~filters.COMMAND, get_ca_email)],
             CONFIRM_CA: [CallbackQueryHandler(lambda u, c: process_and_send_letter(u, c, "CA"), pattern="^send_ca$")],
 
-            GET_INTERN_NAME: [MessageHandler(filters.TEXT & ~filters.COMMAND, process_intern_name)],
+            GET_INTERN_NAME: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, process_intern_name),
+                CallbackQueryHandler(pick_intern_candidate, pattern="^pick_intern:"),
+            ],
             CONFIRM_INTERN: [CallbackQueryHandler(lambda u, c: process_and_send_letter(u, c, "Intern"), pattern="^send_intern$")],
 
             GET_OFFER_NAME: [MessageHandler(filters.TEXT & ~filters.COMMAND, get_offer_name)],
             GET_OFFER_EMAIL: [MessageHandler(filters.TEXT & ~filters.COMMAND, get_offer_email)],
             GET_OFFER_TRAINING_DATE: [MessageHandler(filters.TEXT & ~filters.COMMAND, get_offer_training_date)],
             CONFIRM_OFFER: [CallbackQueryHandler(lambda u, c: process_and_send_letter(u, c, "Offer"), pattern="^send_offer$")],
+
+            GET_BULK_FILE: [MessageHandler(filters.Document.ALL, process_bulk_file)],
+            CONFIRM_BULK: [CallbackQueryHandler(process_bulk_send, pattern="^send_bulk$")],
         },
         fallbacks=[
             CommandHandler("cancel", cancel),
@@ -419,7 +717,11 @@ def main() -> None:
     )
     application.add_handler(conv_handler)
     application.add_handler(CommandHandler("refresh", refresh_status))
-    application.run_polling()
+    return application
+
+
+def main() -> None:
+    build_application().run_polling()
 
 
 if __name__ == "__main__":
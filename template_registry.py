@@ -0,0 +1,121 @@
+# template_registry.py
+
+import os
+import threading
+import fitz  # PyMuPDF
+
+# Folder holding the letter templates, next to this file
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+
+# Template key -> (file name, number of pages the letters use; the rest are dropped on load)
+TEMPLATES = {
+    "campus_ambassador": ("campus_ambassador.pdf", 2),
+    "offer_letter": ("offer_letter.pdf", 3),
+    "ai-internship": ("ai-internship.pdf", 1),
+    "ml-internship": ("ml-internship.pdf", 1),
+    "wd-internship": ("wd-internship.pdf", 1),
+    "cs-internship": ("cs-internship.pdf", 1),
+    "ds-internship": ("ds-internship.pdf", 1),
+    "dm-internship": ("dm-internship.pdf", 1),
+    "hr-internship": ("hr-internship.pdf", 1),
+    "fi-internship": ("fi-internship.pdf", 1),
+    "cc-internship": ("cc-internship.pdf", 1),
+}
+
+# Internship domain (as written in the onboarding sheet) -> template key.
+# Keys are matched after normalize_domain(), so case, extra spaces and "&" vs "and" don't matter.
+INTERNSHIP_DOMAINS = {
+    "artificial intelligence": "ai-internship",
+    "machine learning": "ml-internship",
+    "web development": "wd-internship",
+    "cybersecurity": "cs-internship",
+    "cyber security": "cs-internship",
+    "data science": "ds-internship",
+    "digital marketing": "dm-internship",
+    "human resource management": "hr-internship",
+    "human resources": "hr-internship",
+    "finance": "fi-internship",
+    "financial modeling & analysis": "fi-internship",
+    "financial modeling & valuation": "fi-internship",
+    "cloud computing": "cc-internship",
+}
+
+
+def normalize_domain(domain: str) -> str:
+    return ' '.join(domain.lower().replace('&', ' and ').split())
+
+
+def _build_base(template: fitz.Document, pages_needed: int) -> bytes:
+    """Copies the pages the letters use into a new document, then garbage-collects and deflates it once."""
+    with fitz.open() as base:
+        base.insert_pdf(template, from_page=0, to_page=pages_needed - 1)
+        return base.tobytes(garbage=4, deflate=True)
+
+
+class TemplateRegistry:
+    """
+    Holds every letter template in memory.
+    All files are read and checked once by load(); after that, documents are
+    opened from the in-memory bytes, so rendering a letter never touches the disk.
+
+    What is kept is not the file itself but a base document made from it: only the
+    pages the letters use, already garbage-collected and deflated. A letter is this
+    base plus its text, so it can be saved without cleaning up the whole file again.
+    """
+
+    def __init__(self, template_dir: str = TEMPLATE_DIR):
+        self.template_dir = template_dir
+        self._data = {}
+        self._domains = {normalize_domain(domain): key for domain, key in INTERNSHIP_DOMAINS.items()}
+
+    def load(self):
+        """Reads and validates every template. Raises ValueError listing all broken templates."""
+        data, problems = {}, []
+        for key, (file_name, pages_needed) in TEMPLATES.items():
+            path = os.path.join(self.template_dir, file_name)
+            try:
+                with open(path, "rb") as f:
+                    content = f.read()
+                with fitz.open(stream=content, filetype="pdf") as doc:
+                    if doc.page_count < pages_needed:
+                        problems.append(f"{file_name}: has {doc.page_count} page(s), needs {pages_needed}")
+                        continue
+                    base = _build_base(doc, pages_needed)
+            except Exception as e:
+                problems.append(f"{file_name}: {e}")
+                continue
+            data[key] = base
+        if problems:
+            raise ValueError("Invalid letter templates: " + "; ".join(problems))
+        self._data = data
+        print(f"Loaded {len(data)} letter templates into memory.")
+
+    def get_bytes(self, key: str) -> bytes:
+        """Returns the template's base document (see the class docstring)."""
+        return self._data[key]
+
+    def open(self, key: str) -> fitz.Document:
+        """Opens a fresh, independent copy of a template's base document from memory."""
+        return fitz.open(stream=self._data[key], filetype="pdf")
+
+    def internship_template_for(self, domain: str) -> str:
+        """Returns the template key for an internship domain, or raises ValueError."""
+        key = self._domains.get(normalize_domain(domain))
+        if not key:
+            raise ValueError(f"No template found for domain: '{domain}'")
+        return key
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> TemplateRegistry:
+    """Returns the shared registry, loading the templates on first use."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            registry = TemplateRegistry()
+            registry.load()
+            _registry = registry
+    return _registry
@@ -0,0 +1,65 @@
+# update_processor.py
+
+import asyncio
+from telegram.ext import BaseUpdateProcessor
+
+
+def update_owner(update: object):
+    """The key updates are serialized on: the sending user, else the chat, else None."""
+    user = getattr(update, "effective_user", None)
+    if user is not None:
+        return ("user", user.id)
+    chat = getattr(update, "effective_chat", None)
+    if chat is not None:
+        return ("chat", chat.id)
+    return None
+
+
+def is_cancel_update(update: object) -> bool:
+    """True for a /cancel command or a tap on a Cancel button (callback data starting with 'cancel_')."""
+    message = getattr(update, "message", None)
+    text = getattr(message, "text", None) or ""
+    if text.startswith("/"):
+        return text.split(maxsplit=1)[0].split("@", 1)[0] == "/cancel"
+    query = getattr(update, "callback_query", None)
+    return query is not None and (query.data or "").startswith("cancel_")
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """
+    Processes updates from different users concurrently, but one at a time per user.
+    A user's updates therefore run in the order they arrived and their conversation state and
+    user_data are never touched by two handlers at once, while other users are not held up.
+    Up to `max_concurrent_updates` updates are in progress overall (including ones waiting
+    for their user's earlier update to finish).
+
+    Updates matching `skip_queue` (by default /cancel and Cancel buttons) don't wait their turn,
+    so a user can cancel a letter while their earlier update is still rendering it.
+    """
+
+    def __init__(self, max_concurrent_updates: int = 64, skip_queue=is_cancel_update):
+        super().__init__(max_concurrent_updates)
+        self.skip_queue = skip_queue
+        self._locks = {}  # owner -> [lock, number of updates holding or waiting for it]
+
+    async def do_process_update(self, update: object, coroutine) -> None:
+        owner = update_owner(update)
+        if owner is None or self.skip_queue(update):
+            await coroutine
+            return
+
+        entry = self._locks.setdefault(owner, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                await coroutine
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[owner]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass